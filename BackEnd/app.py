@@ -18,31 +18,31 @@
 #Expected output: The expected output is a JSON response that contains the requested data or a success/error message.
 #Expected extensions or revisions: As of right now (5.4.25), there are no expected extensions or revisions.
 
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, jsonify, session, Response, stream_with_context
 from flask_cors import CORS
-from flask_bcrypt import Bcrypt
-from main import general_search, get_token, artist_search, track_search, album_search
-from sqlalchemy import create_engine
+import click
+from main import general_search_async, get_token, get_token_async, artist_search_async, track_search_async, album_search_async, broad_search_results_async, entities_search_async, stream_album_tracks, cache_stats, song_writer, search_index
+from spotify_client import run_on_loop, client_stats
+from db_engine import engine, pool_stats
+from migrations import upgrade, currentVersion
+from explain_check import runCheck
+from cache import TTLCache
+from session_store import make_session_interface
+from password_hashing import hash_password, check_password, needs_rehash, hash_pool, PasswordHashBusy
+from datetime import timedelta
+import hashlib
 from datetime import datetime
-from db import insertComment, insertSong, insertUser, selectUserFromEmail, checkUserExistence, selectTagsFromSong, selectUserFromID, selectTagsFromSong, insertTag, selectUsersTag, selectUsersTags, selectUsersComments, selectUserIDFromUsername, selectSong, deleteComment, selectPostsFromSong
-from sqlalchemy.exc import IntegrityError
+from db import insertComment, insertUser, selectUserFromEmail, checkUserExistence, selectTagsFromSong, insertTag, selectUsersTag, deleteComment, selectPostsPage, selectReplyCounts, updateUserPassword, selectUsersTagsWithSongs, selectUsersCommentsWithSongs, rebuildTagCounts
 from dotenv import load_dotenv
 import os
+import base64
+import json
 
-#Credentials for the MySQL database which will be used in the database connection string below
 load_dotenv()
-db_password = os.getenv("DB_PASSWORD")
-db_user = 'root'
-db_host = '127.0.0.1'
-db_port = '3306'
-db_name = 'play_back_db'
-
-#Creates an engine that connects to the MySQL database using SQLAlchemy. Used to manipulate database.
-engine = create_engine(f"mysql+pymysql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}")
+#The engine that connects to the MySQL database is shared with main.py and db.py, see db_engine.py.
 
 #Creates a Flask application instance, which is the main entry point for the backend of the PlayBack application.
 app = Flask(__name__)
-bcrypt = Bcrypt(app)
 CORS(app, supports_credentials=True)
 #Set the date format for displaying dates in comments and posts.
 string_format = "%b-%d-%y %I%p"
@@ -54,32 +54,67 @@ app.config['SESSION_COOKIE_NAME'] = 'playback-session'
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'None'
 app.config['SESSION_COOKIE_SECURE'] = True
-app.config['PERMANENT_SESSION_LIFETIME']
+app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(seconds=int(os.getenv("SESSION_LIFETIME", 31 * 24 * 3600)))
+#Server side session store, see session_store.py. SESSION_BACKEND is "sqlite" or "memory", memory sessions are only
+#seen by the process that made them, so it only works when the backend runs as a single process.
+app.config['SESSION_BACKEND'] = os.getenv("SESSION_BACKEND", "sqlite")
+app.config['SESSION_SQLITE_PATH'] = os.getenv("SESSION_SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions.sqlite3"))
+app.config['SESSION_MAX_ENTRIES'] = int(os.getenv("SESSION_MAX_ENTRIES", 100000))
+app.config['SESSION_CACHE_SIZE'] = int(os.getenv("SESSION_CACHE_SIZE", 10000))
+app.config['SESSION_SWEEP_INTERVAL'] = float(os.getenv("SESSION_SWEEP_INTERVAL", 60))
+app.config['SESSION_TOUCH_INTERVAL'] = float(os.getenv("SESSION_TOUCH_INTERVAL", 60))
+#Seconds a session read from SQLite is served from memory, by default as long as the touch interval so the file is
+#read about once per touch instead of on every request
+app.config['SESSION_CACHE_TTL'] = float(os.getenv("SESSION_CACHE_TTL", app.config['SESSION_TOUCH_INTERVAL']))
+app.session_interface = make_session_interface(app.config)
+#Comment paging, a request may ask for a smaller or larger page but never more than the maximum
+app.config['POSTS_PAGE_SIZE'] = int(os.getenv("POSTS_PAGE_SIZE", 50))
+app.config['POSTS_MAX_PAGE_SIZE'] = int(os.getenv("POSTS_MAX_PAGE_SIZE", 200))
+#User activity paging, and how many rows the streaming activity endpoint reads from the database at a time
+app.config['ACTIVITY_PAGE_SIZE'] = int(os.getenv("ACTIVITY_PAGE_SIZE", 50))
+app.config['ACTIVITY_MAX_PAGE_SIZE'] = int(os.getenv("ACTIVITY_MAX_PAGE_SIZE", 200))
+app.config['ACTIVITY_STREAM_BATCH_SIZE'] = int(os.getenv("ACTIVITY_STREAM_BATCH_SIZE", 500))
+#Cache-Control sent with each cacheable endpoint. Spotify data is the same for everyone so browsers and the CDN may keep it,
+#tags include the user's own tag so only the browser may keep them, and must check they are still current first.
+app.config['ARTIST_CACHE_CONTROL'] = os.getenv("ARTIST_CACHE_CONTROL", "public, max-age=3600")
+app.config['ALBUM_CACHE_CONTROL'] = os.getenv("ALBUM_CACHE_CONTROL", "public, max-age=21600")
+app.config['TRACK_CACHE_CONTROL'] = os.getenv("TRACK_CACHE_CONTROL", "public, max-age=21600")
+app.config['TAGS_CACHE_CONTROL'] = os.getenv("TAGS_CACHE_CONTROL", "private, no-cache")
+#Most IDs one request to /tracks, /albums, or /artists may ask for
+app.config['BATCH_MAX_IDS'] = int(os.getenv("BATCH_MAX_IDS", 100))
+
+#Serialized entity responses with their ETags, so a repeat view of a cached entity is not serialized and hashed again
+etag_cache = TTLCache("etag", int(os.getenv("ETAG_CACHE_TTL", 86400)), int(os.getenv("ETAG_CACHE_SIZE", 6000)))
 
 
 # Purpose: To return a list of 5 search results based on the search value and type in the request.
 # Author: Ryan 
 # Date Written: 3.10.25
-# Last Revised: 4.5.25
+# Last Revised: 10.18.26
 # Called By: The front end search bar component on the homepage (searchbar.tsx).
 # System Context: Supplies the user will a small list that dynamically updates as the user types in the search bar.
 # Data Structures: The search inputs are in a JSON format, and the results are returned as a JSON object.
-# Algorithms Used: N/A
+# Algorithms Used: The Spotify request is awaited on the shared Spotify event loop, see run_on_loop in spotify_client.py.
 # Inputs: Search value and type (artist, album, or track) from the request body.
 # Outputs: A list of data from the Spotify API about the five most relevant search results based on the search value and type.
+# The list is empty when nothing was found, and also when the search failed, with a 502 status, so the search bar can
+# always list what it gets back.
 # Future Changes: As of 4.5.25, there are no expected changes to this function. It is working as intended.
 @app.route('/search', methods = ['POST'])
-def search():
+async def search():
     print("SEARCH ENDPOINT HIT")
 
     try:
         #Generates an API token and gets the search value and type from the request body.
-        token = get_token()
+        token = await get_token_async()
         data = request.get_json()
         search_value = data.get("search", "")
-        result = general_search(token, search_value, data.get("type", "artist"), 5)
+        result = await run_on_loop(general_search_async(token, search_value, data.get("type", "artist"), 5))
+        if result is None:
+
+            return jsonify([]), 502
 
-        return result
+        return jsonify(result)
     
     except Exception as e:
 
@@ -89,30 +124,27 @@ def search():
 # Purpose: To find the 10 most relevant results of the three different types, artist, album, and track, based on the search value provided in the request.
 # Author: Ryan  
 # Date Written: 5.1.25
-# Last Revised: 5.5.25
+# Last Revised: 10.18.26
 # Called By: Broad search bar component on the homepage (BroadSearch.jsx).
 # System Context: If the user is having trouble finding what they are looking for when using the search bar,
 # they can use the broad search bar to find more results.
 # Data Structures: Stores the search value in a string and returns the results in a dictionary with three keys.
 # with values that are lists of data from the Spotify API.
-# Algorithms Used: N/A
+# Algorithms Used: The three searches are awaited together on the shared Spotify event loop in main.broad_search_results_async.
 # Inputs: A search value from the front end.
 # Outputs: Three lists of 10 results of each type of media from the Spotify API, artist, album, and track.
-# Future Changes: As of 5.5.25, there are no expected changes to this function. It is working as intended.
+# Future Changes: N/A
 @app.route('/broadsearch/<search>',methods = ["GET"])
-def broad_search(search):
+async def broad_search(search):
     print("BROAD SEARCH ENDPOINT HIT")
 
     try:
         #Generates an API token and gets the search value from the request.
-        token = get_token()
+        token = await get_token_async()
         search_value = search
 
-        return jsonify({
-
-                "artists" : general_search(token, search_value, "artist",10),
-                "albums" : general_search(token, search_value, "album",10),
-                "tracks" : general_search(token, search_value, "track",10),})
+        #The three types are searched at the same time, a type that fails comes back empty with its message under errors
+        return jsonify(await run_on_loop(broad_search_results_async(token, search_value, 10)))
     
     except Exception as e:
 
@@ -122,13 +154,14 @@ def broad_search(search):
 # Purpose: Creates a database entry for a new tag associated with a song.
 # Author: Ryan
 # Date Written: 4.20.25
-# Last Revised: 5.4.25
+# Last Revised: 10.18.26
 # Called By: The tag creation component that is part of the pagetemplate component(tags.jsx).
 # System Context: Stores tags in the database that are associated with a song and a user.
 # Data Structures: JSON data structure is being recieved by request and sent in response.
 # Algorithms Used: N/A
 # Inputs: A tag value and a song ID from the request and a user ID from the session.
-# Outputs: JSON response indicating success or failure of the tag creation.
+# Outputs: JSON response indicating success or failure of the tag creation, and whether the tag was created, changed, or
+# left as it was along with its old value.
 # Future Changes: As of 5.4.25, there are no expected changes to this function. It is working as intended.
 @app.route('/createtag',methods=["POST"])
 def create_tag():
@@ -142,10 +175,13 @@ def create_tag():
         with engine.connect() as conn:
 
             if session["userID"]:
-                #Checks if the tag already exists for the song and user, if not, inserts the new tag into the database.
-                insertTag(conn, tag, song, session["userID"])
+                #Creates the users tag on the song, or changes it if they already have one.
+                result = insertTag(conn, tag, song, session["userID"])
+                if isinstance(result, str):
 
-                return jsonify({"message" : "Tag Created Successfully"}), 200
+                    return jsonify({"error" : result}), 500
+
+                return jsonify({"message" : "Tag Created Successfully", "result" : result}), 200
             
             else:
 
@@ -156,31 +192,64 @@ def create_tag():
         return jsonify({"error": f"Error with tag creation: {e}"}), 400
     
 
+# Purpose: Builds a JSON response with an ETag and Cache-Control header, or a 304 when the client already has it.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The artist, album, track, and gettags endpoints.
+# System Context: Lets browsers and the CDN revalidate a page's data instead of downloading it again.
+# Data Structures: etag_cache holds key -> (payload, body, ETag) for entity payloads.
+# Algorithms Used: The payload is serialized with sorted keys so the same data always gives the same bytes, and the ETag
+# is the SHA-1 of those bytes. When a key is given and etag_cache holds the body for the same payload object, which is
+# what the entity caches in main.py hand back until they reload an entry, the body and ETag are reused as they are.
+# Werkzeug's make_conditional compares the ETag with If-None-Match and turns the response into a 304 when they match.
+# Inputs: The payload dictionary, the Cache-Control value, and optionally a key for etag_cache.
+# Outputs: A Flask response.
+# Future Changes: N/A
+def conditional_json(payload, cache_control, key=None):
+    cached, state = etag_cache.get(key) if key is not None else (None, None)
+    if state and cached[0] is payload:
+        body, etag = cached[1], cached[2]
+    else:
+        body = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        etag = hashlib.sha1(body.encode()).hexdigest()
+        if key is not None:
+            etag_cache.set(key, (payload, body, etag))
+    response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+
+    return response.make_conditional(request)
+
+
 # Purpose: Gets the tag data associated with a song from the data base and returns in a JSON format.
 # Author: Ryan  
 # Date Written: 4.20.25
-# Last Revised: 5.4.25
+# Last Revised: 10.18.26
 # Called By: The tags component that is part of the pagetemplate component(tags.jsx).
 # System Context: Fills out the numbers that are below the tags on the media pages to show totals. Also gets the users current tag associated with the song.
 # Data Structures: JSON data structure is being recieved by request and sent in response.
-# Algorithms Used: N/A
-# Inputs: A song ID from the request and a user ID from the session.
+# Algorithms Used: The response carries an ETag, see conditional_json. A GET with a matching If-None-Match gets a 304.
+# Inputs: A song ID from the query string of a GET or the body of a POST, and a user ID from the session.
 # Outputs: A JSON response that has the tag sum data from the database and the users current tag.
-# Future Changes: As of 5.4.25, there are no expected changes to this function. It is working as intended.
-@app.route('/gettags', methods=["POST"])
+# Future Changes: N/A
+@app.route('/gettags', methods=["GET", "POST"])
 def get_tags():
     print("GET TAGS ENDPOINT HIT")
 
     try:
-        #Gets the song ID from the request body.
-        data = request.get_json()
-        song = data.get("songID")
+        #Gets the song ID from the query string, or from the request body for the older POST form.
+        song = request.args.get("songID") if request.method == "GET" else request.get_json().get("songID")
         with engine.connect() as conn:
             #Not only gets the tag data, but also gets the tag associated with the user so they can see what tag they have with this song
             result = selectTagsFromSong(conn, song)
             result.setdefault("exists", selectUsersTag(conn, song, session["userID"]))
 
-            return result
+        response = conditional_json(result, app.config['TAGS_CACHE_CONTROL'])
+        #The user's own tag is in the response, so a cached copy is only good for the same session
+        response.vary.add("Cookie")
+
+        return response
         
     except Exception as e:
 
@@ -255,68 +324,242 @@ def deletepost():
         return jsonify({"error" : f"Error deleting comment: {e}"}), 400
 
 
-# Purpose: Used to get all the posts associated with a song, and return them to the front end only if a user has commented.
+# Purpose: Turns the position of the last row on a page into an opaque cursor string.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The paginated endpoints, such as comment_page and the user activity pages.
+# System Context: The front end sends the cursor back to get the next page.
+# Data Structures: N/A
+# Algorithms Used: The values of the sort key are joined with "|" and base64 encoded so they are safe in a URL or JSON.
+# Dates are written in ISO format.
+# Inputs: The sort key values of the last row on the page, such as its date_commented and commentID.
+# Outputs: The cursor string.
+# Future Changes: N/A
+def encode_cursor(*values):
+    text = "|".join(value.isoformat() if isinstance(value, datetime) else str(value) for value in values)
+
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+# Purpose: Reads a cursor made by encode_cursor back into the position of a row.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The paginated endpoints, such as comment_page and the user activity pages.
+# System Context: Turns the cursor the front end sent back into the keyset the next page starts after.
+# Data Structures: A tuple with one value per part of the sort key.
+# Algorithms Used: N/A
+# Inputs: The cursor string, or None for the first page, and one function per part of the sort key that turns its text
+# back into a value, such as datetime.fromisoformat or int.
+# Outputs: The tuple of values, or None. Raises ValueError for a cursor that was not made by encode_cursor.
+# Future Changes: N/A
+def decode_cursor(cursor, *types):
+    if not cursor:
+        return None
+    try:
+        parts = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", len(types) - 1)
+        if len(parts) != len(types):
+            raise ValueError(cursor)
+
+        return tuple(convert(part) for convert, part in zip(types, parts))
+
+    except Exception:
+
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+# Purpose: Reads the page size a request asked for and keeps it between 1 and a maximum.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The paginated endpoints, such as comment_page and the user activity pages.
+# System Context: Stops one request from asking for every row at once.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: The requested page size or None, the default page size, and the largest page size allowed.
+# Outputs: The page size to use. Raises ValueError when it is not a number.
+# Future Changes: N/A
+def page_size(requested, default, maximum):
+    if requested is None:
+        return default
+
+    return max(1, min(int(requested), maximum))
+
+
+# Purpose: Loads one page of the comments on a song that reply to the same parent, with the reply count of each one.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: get_posts and get_replies
+# System Context: The comment thread is sent one level at a time. The top level comes from get_posts and the replies to
+# a comment from get_replies when the user opens them, so a deep thread does not make the first page any larger.
+# Data Structures: JSON data structure is being recieved by request and sent in response. A dictionary of reply counts
+# and a list of comment dictionaries are used to build the response.
+# Algorithms Used: Keyset pagination, a single joined query returns the page of comments that comes after the cursor with
+# their usernames already attached, and one grouped query counts the replies to every comment on the page. A single
+# pass over the page then formats each comment and attaches its reply count. One extra row is asked for so the
+# function knows whether there is another page without counting the comments.
+# Inputs: The request body with a songID, and optionally a cursor from the previous page and a page_size, and the ID of
+# the parent comment (None for the top level).
+# Outputs: A tuple of the response body and status code. The body holds the page of comments, a boolean indicating
+# if the user has commented, and the cursor for the next page, which is None on the last page.
+# Future Changes: N/A
+def comment_page(data, parent):
+    songID = data.get("last_segment")
+    userID = session.get("userID")
+    try:
+        after = decode_cursor(data.get("cursor"), datetime.fromisoformat, int)
+        limit = page_size(data.get("page_size"), app.config['POSTS_PAGE_SIZE'], app.config['POSTS_MAX_PAGE_SIZE'])
+
+    except ValueError as e:
+
+        return {"error": f"{e}"}, 400
+
+    with engine.connect() as conn:
+        #Returns a page of the comments with the username of each poster already attached.
+        results = selectPostsPage(conn, songID, userID, after, limit, parent)
+        if isinstance(results, str):
+
+            return {"error": results}, 500
+        #Every row carries whether the user has commented on the song, so no rows means they have not.
+        user_in = userID is not None and len(results) > 0 and bool(results[0].posted)
+        #If not, no posts are returned, with a boolean indicating that the user has not commented.
+        if not user_in:
+
+            return {"posted" : False , "data" : [], "next_cursor" : None}, 200
+
+        page = results[:limit]
+        reply_counts = selectReplyCounts(conn, [item.commentID for item in page])
+        if isinstance(reply_counts, str):
+
+            return {"error": reply_counts}, 500
+
+    next_cursor = encode_cursor(page[-1].date_commented, page[-1].commentID) if len(results) > limit else None
+    submit = []
+    #Loops through the results once, formatting them into a list of dictionaries with their reply counts.
+    for item in page:
+        submit.append({
+            "id" : item.commentID,
+            "content" : item.content,
+            "date" : item.date_commented.strftime(string_format),
+            "username" : item.username,
+            "parent_comment" : item.parent_commentID,
+            "reply_count" : reply_counts.get(item.commentID, 0)})
+
+    return {"posted" : True , "data" : submit, "next_cursor" : next_cursor}, 200
+
+
+# Purpose: Used to get one page of the top-level posts associated with a song, and return them to the front end only if a user has commented.
 # Author: Ryan
 # Date Written: 4.25.25
-# Last Revised: 5.4.25
+# Last Revised: 10.18.26
 # Called By: The comment_form.jsx component that is used in the pagetemplate component.
-# System Context: Responsible for retrieving all the comments associated with a song and returning them to the front end.
-# Data Structures: JSON data structure is being recieved by request and sent in response. An intermediary
-# list is used to store the posts before they are returned.
-# Algorithms Used: A simple for loop is used to iterate through the results and format them into a list of dictionaries.
-# Inputs: A songID and from the request body.
-# Outputs: A JSON response containing the posts associated with the song, along with a boolean indicating if the user has commented.
-# Future Changes: As of 5.4.25, there are no expected changes to this function. It is working as intended.
+# System Context: Responsible for retrieving the comments associated with a song and returning them to the front end.
+# Replies are not included, each comment says how many it has and they are loaded through get_replies.
+# Data Structures: JSON data structure is being recieved by request and sent in response.
+# Algorithms Used: See comment_page.
+# Inputs: A songID, and optionally a cursor from the previous page and a page_size, from the request body.
+# Outputs: A JSON response containing a page of posts associated with the song, a boolean indicating if the user has commented,
+# and the cursor for the next page, which is None on the last page.
+# Future Changes: N/A
 @app.route("/getposts", methods=["POST"])
 def get_posts():
     print("GET POSTS ENDPOINT HIT")
 
     try:
 
-        data = request.get_json()
-        songID = data.get("last_segment")
-        #Value that will track if user has commented on the song
-        user_in = False
-        with engine.connect() as conn:
-            #This function will return all the posts associated with a song in an iterable.
-            results = selectPostsFromSong(conn, songID)
-            submit = []
-            #Loops through the results and formats them into a list of dictionaries.
-            for item in results:
-                submit.append({
-                    "id" : item[0],
-                    "content" : item[1],
-                    "date" : item[2].strftime(string_format),
-                    "username" : selectUserFromID(conn,item[3]),
-                    "parent_comment" : item[5]})
-                #Checks if the user has commented on the song, if they have, user_in is set to True.
-                if selectUserFromID(conn,item[3]) == session.get("username"):
-                    user_in = True
-        #If the user has commented, the function will return a JSON response with the posts and a boolean indicating that the user has commented.
-        if user_in:
-
-            return {"posted" : True , "data" : submit}, 200
-        #If not the data will be returned with a boolean indicating that the user has not commented.
-        else:
-
-            return {"posted" : False , "data" : []}, 200
+        return comment_page(request.get_json(), None)
         
     except Exception as e:
 
         return jsonify({"error": f"Error fetching posts: {e}"}), 500
 
 
+# Purpose: Used to get one page of the direct replies to a comment.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The comment_form.jsx component, when a user opens the replies to a comment.
+# System Context: Loads a comment thread one level at a time as the user expands it.
+# Data Structures: JSON data structure is being recieved by request and sent in response.
+# Algorithms Used: See comment_page.
+# Inputs: A songID and the ID of the comment whose replies are wanted, and optionally a cursor from the previous page and
+# a page_size, from the request body.
+# Outputs: A JSON response in the same format as get_posts.
+# Future Changes: N/A
+@app.route("/getreplies", methods=["POST"])
+def get_replies():
+    print("GET REPLIES ENDPOINT HIT")
+
+    try:
+
+        data = request.get_json()
+        if data.get("comment_id") is None:
+
+            return jsonify({"error": "comment_id is required"}), 400
+
+        return comment_page(data, data.get("comment_id"))
+
+    except Exception as e:
+
+        return jsonify({"error": f"Error fetching replies: {e}"}), 500
+
+
+# Purpose: Formats a row from selectUsersTagsWithSongs for the user page.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The user activity endpoints.
+# System Context: Keeps the full, paginated, and streamed user activity responses in the same format.
+# Data Structures: A dictionary.
+# Algorithms Used: N/A
+# Inputs: A tag row.
+# Outputs: The dictionary sent to the front end.
+# Future Changes: N/A
+def format_activity_tag(tag):
+
+    return {"vibe" : tag.tag,
+            "songid" : tag.songID,
+            "song_name" : tag.name,
+            "song_url" : tag.image,
+            "type" : tag.type}
+
+
+# Purpose: Formats a row from selectUsersCommentsWithSongs for the user page.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The user activity endpoints.
+# System Context: Keeps the full, paginated, and streamed user activity responses in the same format.
+# Data Structures: A dictionary.
+# Algorithms Used: N/A
+# Inputs: A comment row.
+# Outputs: The dictionary sent to the front end.
+# Future Changes: N/A
+def format_activity_comment(comment):
+
+    return {"content" : comment.content,
+            "date" : comment.date_commented.strftime(string_format),
+            "songid" : comment.songID,
+            "song_name" : comment.name,
+            "song_url" : comment.image,
+            "type" : comment.type}
+
+
 # Purpose: Fetches user comment activity including comments and tags associated with a user.
 # Author: Ryan
 # Date Written: 5.2.25  
-# Last Revised: 5.4.25
+# Last Revised: 10.18.26
 # Called By: The UserPage.jsx component
 # System Context: Allows the user to see their comment activity on the platform, including comments and tags they have created.
+# Users with a long history should use the paginated or streamed endpoints below instead.
 # Data Structures: Returns a json, which is a dictionary with two keys, "tags" and "comments". Each key has a list of dictionaries as its value.
-# Algorithms Used: Basic iteration through tags and comments objects from sqlalchemy medthods.
+# Algorithms Used: Basic iteration through tags and comments objects from sqlalchemy medthods. Each collection is loaded
+# with one query that joins it to Users and Songs.
 # Inputs: A username from the URL.
 # Outputs: A JSON response containing the user's comment activity, including tags and comments.
-# Future Changes: As of 5.4.25, there are no expected changes to this function. It is working as intended.
+# Future Changes: N/A
 @app.route('/useractivity/<user>', methods=['GET'])
 def user_comment_activity(user):
     print("USER ACTIVITY ENDPOINT HIT")
@@ -325,26 +568,17 @@ def user_comment_activity(user):
         #gets the username from the URL
         username = user
         with engine.connect() as conn:
-            #Gets the userID from the username
-            userID = selectUserIDFromUsername(conn, username)
-            #User comments and tags stored in iterables
-            comments_list = selectUsersComments(conn, userID)
-            tags_list = selectUsersTags(conn, userID)
+            #User comments and tags, each already joined to the song they are on
+            tags_list = selectUsersTagsWithSongs(conn, username)
+            comments_list = selectUsersCommentsWithSongs(conn, username)
+            for rows in (tags_list, comments_list):
+                if isinstance(rows, str):
+
+                    return jsonify({"error": rows}), 500
+                
             #Uses list comprehensions to format the comments and tags into a dictionary that can be returned to the front end.
-            #Admittably, this is a bit of a hacky way to do it, but its more easier to understand this way.
-            results_dict = {"tags": [{
-                                    "vibe" : tag[0],
-                                    "songid" : tag[1],
-                                    "song_name" : selectSong(conn, tag[1])[1],
-                                    "song_url" : selectSong(conn, tag[1])[2],
-                                    "type" : selectSong(conn, tag[1])[3]}for tag in tags_list],
-                            "comments": [{
-                                    "content" : comment[1], 
-                                    "date" : comment[2].strftime(string_format),
-                                    "songid" : comment[4],
-                                    "song_name" : selectSong(conn, comment[4])[1],
-                                    "song_url" : selectSong(conn, comment[4])[2],
-                                    "type" : selectSong(conn,comment[4])[2]} for comment in comments_list]}
+            results_dict = {"tags": [format_activity_tag(tag) for tag in tags_list],
+                            "comments": [format_activity_comment(comment) for comment in comments_list]}
             
             return results_dict
         
@@ -352,6 +586,126 @@ def user_comment_activity(user):
 
         return jsonify({"error": f"Error fetching user comment activity: {e}"}), 500
 
+
+# Purpose: Returns one page of the tags a user has made.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The front end, for users whose activity is too long to load at once.
+# System Context: The paginated version of the "tags" section of /useractivity/<user>.
+# Data Structures: A JSON dictionary with the list of tags and the cursor for the next page.
+# Algorithms Used: Keyset pagination on songID, see selectUsersTagsWithSongs. One extra row is asked for so the function
+# knows whether there is another page.
+# Inputs: A username from the URL, and optionally a cursor and limit from the query string.
+# Outputs: A JSON response with "tags" and "next_cursor", which is None on the last page.
+# Future Changes: N/A
+@app.route('/useractivity/<user>/tags', methods=['GET'])
+def user_tag_activity(user):
+    print("USER TAG ACTIVITY ENDPOINT HIT")
+
+    try:
+        try:
+            after = decode_cursor(request.args.get("cursor"), str)
+            limit = page_size(request.args.get("limit"), app.config['ACTIVITY_PAGE_SIZE'], app.config['ACTIVITY_MAX_PAGE_SIZE'])
+
+        except ValueError as e:
+
+            return jsonify({"error": f"{e}"}), 400
+
+        with engine.connect() as conn:
+            results = selectUsersTagsWithSongs(conn, user, after[0] if after else None, limit)
+            if isinstance(results, str):
+
+                return jsonify({"error": results}), 500
+
+        page = results[:limit]
+        next_cursor = encode_cursor(page[-1].songID) if len(results) > limit else None
+
+        return {"tags" : [format_activity_tag(tag) for tag in page], "next_cursor" : next_cursor}, 200
+
+    except Exception as e:
+
+        return jsonify({"error": f"Error fetching user tag activity: {e}"}), 500
+
+
+# Purpose: Returns one page of the comments a user has made.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The front end, for users whose activity is too long to load at once.
+# System Context: The paginated version of the "comments" section of /useractivity/<user>.
+# Data Structures: A JSON dictionary with the list of comments and the cursor for the next page.
+# Algorithms Used: Keyset pagination on commentID, see selectUsersCommentsWithSongs. One extra row is asked for so the
+# function knows whether there is another page.
+# Inputs: A username from the URL, and optionally a cursor and limit from the query string.
+# Outputs: A JSON response with "comments" and "next_cursor", which is None on the last page.
+# Future Changes: N/A
+@app.route('/useractivity/<user>/comments', methods=['GET'])
+def user_post_activity(user):
+    print("USER COMMENT ACTIVITY ENDPOINT HIT")
+
+    try:
+        try:
+            after = decode_cursor(request.args.get("cursor"), int)
+            limit = page_size(request.args.get("limit"), app.config['ACTIVITY_PAGE_SIZE'], app.config['ACTIVITY_MAX_PAGE_SIZE'])
+
+        except ValueError as e:
+
+            return jsonify({"error": f"{e}"}), 400
+
+        with engine.connect() as conn:
+            results = selectUsersCommentsWithSongs(conn, user, after[0] if after else None, limit)
+            if isinstance(results, str):
+
+                return jsonify({"error": results}), 500
+
+        page = results[:limit]
+        next_cursor = encode_cursor(page[-1].commentID) if len(results) > limit else None
+
+        return {"comments" : [format_activity_comment(comment) for comment in page], "next_cursor" : next_cursor}, 200
+
+    except Exception as e:
+
+        return jsonify({"error": f"Error fetching user comment activity: {e}"}), 500
+
+
+# Purpose: Streams every tag and comment a user has made as newline delimited JSON.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The front end or scripts that need a users whole history.
+# System Context: Sends the same data as /useractivity/<user> without building it in memory first, so the memory used
+# stays the same however long the history is.
+# Data Structures: Each line is a JSON object with a "section" key of "tags" or "comments" and the same fields as the
+# non-streamed response. A failure part way through is sent as a final line with an "error" key.
+# Algorithms Used: A generator reads the rows from a server side cursor, ACTIVITY_STREAM_BATCH_SIZE at a time, and
+# yields one line per row. The connection stays open until the last line is sent.
+# Inputs: A username from the URL.
+# Outputs: An application/x-ndjson streamed response.
+# Future Changes: N/A
+@app.route('/useractivity/<user>/stream', methods=['GET'])
+def user_activity_stream(user):
+    print("USER ACTIVITY STREAM ENDPOINT HIT")
+    batch_size = app.config['ACTIVITY_STREAM_BATCH_SIZE']
+
+    def generate():
+        try:
+            with engine.connect() as conn:
+                for section, select_rows, format_row in (("tags", selectUsersTagsWithSongs, format_activity_tag),
+                                                         ("comments", selectUsersCommentsWithSongs, format_activity_comment)):
+                    rows = select_rows(conn, user, yield_per=batch_size)
+                    if isinstance(rows, str):
+                        yield json.dumps({"error" : rows}) + "\n"
+                        return
+                    for row in rows:
+                        yield json.dumps({"section" : section, **format_row(row)}) + "\n"
+
+        except Exception as e:
+
+            yield json.dumps({"error" : f"Error streaming user activity: {e}"}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
     
 # Purpose: Checks to see if the users session is set, and returns the username if it is.
 # Author: Gaetano
@@ -414,14 +768,15 @@ def logout():
 # Purpose: Creates a new user account by inserting the user's information into the database.
 # Author: Gaetano, Ryan
 # Date Written: 4.20.25
-# Last Revised: 5.4.25
+# Last Revised: 10.18.26
 # Called By: Signup component on the homepage (create_acct.tsx).
 # System Context: Allows a new account to be created by inserting the user's information into the database.
 # Data Structures: JSON data structure is being recieved by request and sent in response.
-# Algorithms Used: N/A
+# Algorithms Used: One query checks whether the username or email is taken. The password is hashed in the worker
+# processes of password_hashing.py, with no database connection held while it waits.
 # Inputs: email, username, and password from the request body.
 # Outputs: A message indicating success or failure of the signup process, along with a status code.
-# Future Changes: As of 5.4.25, there are no expected changes to this function. It is working as intended.
+# Future Changes: N/A
 @app.route('/signup', methods=['POST'])
 def signup():
     print("SIGNUP ENDPOINT HIT")
@@ -443,42 +798,52 @@ def signup():
             return jsonify({'error': 'Invalid email format'}), 400
 
         with engine.connect() as conn:
-            # Checks if the username already exists in the database
-            email_check = selectUserFromEmail(conn,email)
+            # Checks if the username or email already exists in the database
+            user_status = checkUserExistence(conn, username, email)
 
-            if email_check:
-                return jsonify({'error': 'Email already exists'}), 409
+        if user_status.startswith("Error"):
+            return jsonify({'error': user_status}), 500
+        if user_status != "No Matches":
+            return jsonify({'error': user_status}), 409
 
         # Hash the password using bcrypt
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        hashed_password = hash_password(password)
  
         with engine.connect() as conn:
             #Insertion of the new user into the database happens here
             result = insertUser(conn, username, hashed_password, email)
+            #Someone else took the username between the check and the insert
+            if isinstance(result, str):
+                return jsonify({'error': result}), 409
+            #A new session ID, so an ID handed out before signing up can not be used to ride on this login
+            session.regenerate()
             session["userID"] = result
             session["username"] = username
             session["email"] = email
 
         return jsonify({'message': 'User signed up successfully'}), 201
+
+    except PasswordHashBusy as e:
+
+        return jsonify({'error': str(e)}), 503
         
-    except IntegrityError as e:
-        #Handle integrity error, such as duplicate username or email and displays it in error message
-        with engine.connect() as conn:
-            user_status = checkUserExistence(conn, username, email)
-        return jsonify({'error': user_status}), 500
+    except Exception as e:
+
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
 
 # Purpose: Allows the user to login by checking their credentials against the database.
 # Author: Ryan 
 # Date Written: 4.28.25 
-# Last Revised: 5.4.25
+# Last Revised: 10.18.26
 # Called By: The login component on the homepage (login.tsx).
 # System Context: Allows the user to login and create a session
 # Data Structures: JSON data structure is being recieved by request and sent in response.
-# Algorithms Used: N/A
+# Algorithms Used: The password is checked in the worker processes of password_hashing.py. If the stored hash was made
+# with a different BCRYPT_LOG_ROUNDS than the current one, the password is hashed again and saved.
 # Inputs: An email and password from the request body.
 # Outputs: A message indicating success or failure of the login process, along with a status code.
-# Future Changes: As of 5.4.25, there are no expected changes to this function. It is working as intended.
+# Future Changes: N/A
 @app.route('/login', methods=['POST'])
 def login():
     print("LOGIN ENDPOINT HIT")
@@ -496,8 +861,16 @@ def login():
         with engine.connect() as conn:
             result = selectUserFromEmail(conn, email)
         # To verify that the user exists, the hashed password and password provided by the request are compared
-        if result != None and bcrypt.check_password_hash(result[2], password):
-            # If the credentials are valid, set the session data
+        if result != None and check_password(result[2], password):
+            # Brings the stored hash up to the current work factor while the plain password is at hand
+            if needs_rehash(result[2]):
+                new_hash = hash_password(password)
+                with engine.connect() as conn:
+                    update_status = updateUserPassword(conn, result[0], new_hash)
+                if update_status.startswith("Error"):
+                    print(update_status)
+            # If the credentials are valid, set the session data under a new session ID
+            session.regenerate()
             session['userID'] = result[0]
             session['username'] = result[1]
             session['email'] = result[3]
@@ -508,6 +881,10 @@ def login():
         else:
             # If the credentials are invalid, return an error message
             return jsonify({"error" : "Password or Email does not match"}), 404
+
+    except PasswordHashBusy as e:
+
+        return jsonify({"error": str(e)}), 503
         
     except Exception as e:
 
@@ -517,27 +894,33 @@ def login():
 # Purpose: Gets the artist data from the Spotify API based on the artist ID provided in the URL, used for filling out artist pages.
 # Author: Gaetano
 # Date Written: 4.10.25
-# Last Revised: 5.4.25
+# Last Revised: 10.18.26
 # Called By: The artist page component (ArtistPage.jsx).
 # System Context: Fills out the artist pages with data on the song being searched.
 # Data Structures: JSON data structure is being sent in the response.
-# Algorithms Used: N/A
+# Algorithms Used: The response carries an ETag and Cache-Control header, see conditional_json. A matching If-None-Match gets a 304.
 # Inputs: A song ID from the URL.
 # Outputs: A JSON reponse with data on the artist, including their name, genres, popularity, and images.
 # Future Changes: As of 5.4.25, there are no expected changes to this function. It is working as intended.
 @app.route('/artist/<id>', methods=['GET'])
-def get_artist(id):
+async def get_artist(id):
     print("GET ARTIST ENDPOINT HIT")
 
     try:
         
-        token = get_token()
+        token = await get_token_async()
 
         if not id:
 
             return jsonify({'error': 'Artist ID is required'}), 400
         #Uses artist search from main.py to get the artist data from the Spotify API.
-        return artist_search(token,id)
+        result = await run_on_loop(artist_search_async(token,id))
+
+        if result is None:
+
+            return jsonify({'error': 'Artist could not be fetched from Spotify'}), 502
+
+        return conditional_json(result, app.config['ARTIST_CACHE_CONTROL'], ("artist", id))
     
     except Exception as e:
 
@@ -547,61 +930,279 @@ def get_artist(id):
 # Purpose: Used to fill out album pages with data on the album being searched.
 # Author: Ryan
 # Date Written: 4.15.25
-# Last Revised: 5.4.25
+# Last Revised: 10.18.26
 # Called By: The album page component (AlbumPage.jsx).
 # System Context: Used for sending album data to the front end to fill out the album page.
 # Data Structures: JSON response with album data.
-# Algorithms Used: N/A
+# Algorithms Used: The response carries an ETag and Cache-Control header, see conditional_json. A matching If-None-Match gets a 304.
 # Inputs: Album ID from the URL.
 # Outputs: JSON response with album data including name, artists, release date, and images.
 # Future Changes: As of 5.4.25, there are no expected changes to this function. It is working as intended.
 @app.route('/album/<id>', methods=['GET'])
-def get_album(id):
+async def get_album(id):
     print("GET ALBUM ENDPOINT HIT")
 
     try:
         
-        token = get_token()
+        token = await get_token_async()
 
         if not id:
 
             return jsonify({'error' : 'Album ID is required'}), 400
         #uses album search from main.py to get the album data from the Spotify API.
-        return album_search(token,id)
+        result = await run_on_loop(album_search_async(token,id))
+
+        if result is None:
+
+            return jsonify({'error': 'Album could not be fetched from Spotify'}), 502
+
+        return conditional_json(result, app.config['ALBUM_CACHE_CONTROL'], ("album", id))
     
     except Exception as e:
 
         return jsonify({'error': f'Error fetching album data: {str(e)}'}), 500
 
 
+# Purpose: Streams an album's full track list as newline delimited JSON, one page per line as each page arrives.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The album page, for albums too long to wait for in one response.
+# System Context: /album/<id> already returns every track, this lets the first ones be shown before the rest are fetched.
+# Data Structures: Each line is a JSON object with the page's offset, the album's total tracks, and the [name, id] pairs
+# of the page. Pages after the first may arrive in any order, the offset says where they go. A failure part way through
+# is sent as a final line with an "error" key.
+# Algorithms Used: See main.album_track_pages_async.
+# Inputs: An album ID from the URL.
+# Outputs: An application/x-ndjson streamed response.
+# Future Changes: N/A
+@app.route('/album/<id>/tracks/stream', methods=['GET'])
+def album_tracks_stream(id):
+    print("ALBUM TRACKS STREAM ENDPOINT HIT")
+
+    def generate():
+        try:
+            for page in stream_album_tracks(get_token(), id):
+                yield json.dumps(page) + "\n"
+
+        except Exception as e:
+
+            yield json.dumps({"error" : f"Error streaming album tracks: {e}"}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
 # Purpose: Used to fill out track pages with data on the track being searched.
 # Author: Ryan
 # Date Written: 4.15.25
-# Last Revised: 5.4.25
+# Last Revised: 10.18.26
 # Called By: The page component for tracks (TrackPage.jsx).
 # System Context: Calls the Spotify API to get track data based on the track ID provided in the URL.
 # Data Structures: JSON response with track data.
-# Algorithms Used: N/A
+# Algorithms Used: The response carries an ETag and Cache-Control header, see conditional_json. A matching If-None-Match gets a 304.
 # Inputs: Track ID from the URL.
 # Outputs: Track data in JSON format, including name, artists, album, duration, and images.
 # Future Changes: As of 5.4.25, there are no expected changes to this function. It is working as intended.
 @app.route('/track/<id>', methods=['GET'])
-def get_track(id):
+async def get_track(id):
     print("GET TRACK ENDPOINT HIT")
 
     try:
 
-        token = get_token()
+        token = await get_token_async()
 
         if not id:
 
             return jsonify({'error': 'Track ID is required'}), 400
         #Calls track search from main.py to get the track data from the Spotify API.
-        return track_search(token,id)
+        result = await run_on_loop(track_search_async(token,id))
+
+        if result is None:
+
+            return jsonify({'error': 'Track could not be fetched from Spotify'}), 502
+
+        return conditional_json(result, app.config['TRACK_CACHE_CONTROL'], ("track", id))
     
     except Exception as e:
 
         return jsonify({'error': f'Error fetching track data: {str(e)}'}), 500
 
+
+# Purpose: Looks up many tracks, albums, or artists for one of the batch endpoints below.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: get_tracks, get_albums, and get_artists.
+# System Context: Reads the comma separated ids query parameter and answers with the same data the single entity
+# endpoints give, keyed by ID.
+# Data Structures: JSON object of ID -> entity, null for IDs Spotify did not find. IDs that could not be fetched, for
+# example because Spotify was rate limiting, are left out so the client can ask for them again.
+# Algorithms Used: Cached entities are served without a request to Spotify, the rest are fetched in batches, see
+# main.entities_search_async. The response carries an ETag and Cache-Control header, see conditional_json. When any ID
+# could not be fetched the response is sent with no-store, so the gap is not kept by browsers or proxies.
+# Inputs: The type of entity and the Cache-Control header to send.
+# Outputs: A JSON response, 400 if there are no IDs or too many, 502 if none of them could be fetched.
+# Future Changes: N/A
+async def entity_batch(type, cache_control):
+    ids = [id.strip() for id in request.args.get("ids", "").split(",") if id.strip()]
+    if not ids:
+
+        return jsonify({"error" : "ids is required"}), 400
+
+    if len(ids) > app.config['BATCH_MAX_IDS']:
+
+        return jsonify({"error" : f"At most {app.config['BATCH_MAX_IDS']} ids may be requested at once"}), 400
+
+    try:
+        token = await get_token_async()
+        results = await run_on_loop(entities_search_async(token, type, ids))
+        if not results:
+
+            return jsonify({"error" : f"{type.capitalize()}s could not be fetched from Spotify"}), 502
+
+        return conditional_json(results, cache_control if len(results) == len(set(ids)) else "no-store")
+
+    except Exception as e:
+
+        return jsonify({"error" : f"Error fetching {type} data: {str(e)}"}), 500
+
+
+# Purpose: Gets the data for many tracks at once, e.g. /tracks?ids=a,b,c.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: Pages that list several tracks.
+# System Context: Saves a request per track compared to /track/<id>.
+# Data Structures: JSON object of track ID -> the data /track/<id> returns.
+# Algorithms Used: See entity_batch.
+# Inputs: Comma separated track IDs in the ids query parameter.
+# Outputs: A JSON response with the tracks.
+# Future Changes: N/A
+@app.route('/tracks', methods=['GET'])
+async def get_tracks():
+    print("GET TRACKS ENDPOINT HIT")
+
+    return await entity_batch("track", app.config['TRACK_CACHE_CONTROL'])
+
+
+# Purpose: Gets the data for many albums at once, e.g. /albums?ids=a,b,c.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: Pages that list several albums.
+# System Context: Saves a request per album compared to /album/<id>.
+# Data Structures: JSON object of album ID -> the data /album/<id> returns.
+# Algorithms Used: See entity_batch.
+# Inputs: Comma separated album IDs in the ids query parameter.
+# Outputs: A JSON response with the albums.
+# Future Changes: N/A
+@app.route('/albums', methods=['GET'])
+async def get_albums():
+    print("GET ALBUMS ENDPOINT HIT")
+
+    return await entity_batch("album", app.config['ALBUM_CACHE_CONTROL'])
+
+
+# Purpose: Gets the data for many artists at once, e.g. /artists?ids=a,b,c.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: Pages that list several artists.
+# System Context: Saves a request per artist compared to /artist/<id>.
+# Data Structures: JSON object of artist ID -> the data /artist/<id> returns.
+# Algorithms Used: See entity_batch.
+# Inputs: Comma separated artist IDs in the ids query parameter.
+# Outputs: A JSON response with the artists.
+# Future Changes: N/A
+@app.route('/artists', methods=['GET'])
+async def get_artists():
+    print("GET ARTISTS ENDPOINT HIT")
+
+    return await entity_batch("artist", app.config['ARTIST_CACHE_CONTROL'])
+
+# Purpose: Reports the backend's internal counters, such as cache hits and misses, the song write queue, and the database pool.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: Developers, when sizing caches and checking performance.
+# System Context: Gives a single place to see how the backend's caches are behaving.
+# Data Structures: JSON response built from dictionaries of counters.
+# Algorithms Used: N/A
+# Inputs: N/A
+# Outputs: A JSON response with the counters.
+# Future Changes: N/A
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    print("STATS ENDPOINT HIT")
+
+    try:
+
+        return jsonify({"cache" : {**cache_stats(), "etag" : etag_cache.stats()},
+                        "song_writer" : song_writer.stats(),
+                        "database" : pool_stats(),
+                        "sessions" : app.session_interface.stats(),
+                        "password_hashing" : hash_pool.stats(),
+                        "spotify" : client_stats.stats(),
+                        "search_index" : search_index.stats()}), 200
+    
+    except Exception as e:
+
+        return jsonify({'error': f'Error fetching stats: {str(e)}'}), 500
+
+# Purpose: Command line tool that recomputes the stored tag totals from the Tags table.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: A developer, with "flask --app BackEnd/app.py rebuild-tag-counts".
+# System Context: Fills the TagCounts table read by /gettags for existing data, or repairs it.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: An optional --song ID to only rebuild one song.
+# Outputs: Prints the result of the rebuild.
+# Future Changes: N/A
+@app.cli.command("rebuild-tag-counts")
+@click.option("--song", default=None, help="Only rebuild the counts of this song ID.")
+def rebuild_tag_counts(song):
+    with engine.connect() as conn:
+        print(rebuildTagCounts(conn, song))
+
+# Purpose: Command line tool that applies any database migrations that have not been applied yet.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: A developer, with "flask --app BackEnd/app.py migrate", after installing or pulling new code.
+# System Context: Creates the tables and indexes the backend needs, see migrations.py.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: N/A
+# Outputs: Prints each migration that was applied and the schema version.
+# Future Changes: N/A
+@app.cli.command("migrate")
+def migrate():
+    for applied in upgrade(engine):
+        print(f"Applied migration {applied}")
+    print(f"Database schema is at version {currentVersion(engine)}")
+
+
+# Purpose: Command line tool that checks every query in db.py uses an index.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: A developer, with "flask --app BackEnd/app.py explain-check", after changing a query or the schema.
+# System Context: Catches queries that would scan a whole table before the table is large, see explain_check.py.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: N/A
+# Outputs: Prints the plan of each query, exits with status 1 if any of them scans a whole table.
+# Future Changes: N/A
+@app.cli.command("explain-check")
+def explain_check():
+    problems = runCheck(engine)
+    for problem in problems:
+        print(problem)
+    if problems:
+        raise SystemExit(1)
+    print("Every query uses an index")
+
 if __name__ == "__main__":
     app.run(debug=True)
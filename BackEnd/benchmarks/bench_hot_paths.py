@@ -0,0 +1,290 @@
+"""
+Author: Ryan
+Date: 10.18.26
+Filename: bench_hot_paths.py
+
+Purpose:
+This script times the functions and endpoints that most page views go through, and compares the results with a
+baseline saved from an earlier run so regressions are caught.
+
+System Context:
+Part of the Backend benchmarks for the PlayBack project. Run it from the BackEnd folder with
+"python benchmarks/bench_hot_paths.py". It starts spotify_stub.py and a SQLite database of its own, so it needs
+neither Spotify nor MySQL.
+
+Development History:
+- Written on: 10.18.26
+- Last revised on: 10.18.26
+
+Existence Rationale:
+There was no way to tell whether a change made searches, entity pages, tags, or comments slower.
+
+Data Structures/ Algorithms:
+- Each case is a function called once per iteration with the iteration number, after a few warm up calls. Cases that go
+to Spotify use a new ID or query each time so they measure the whole path, the "cached" cases repeat one.
+- Every call is timed on its own. Throughput is calls divided by total time, the percentiles use the nearest rank.
+- The baseline is a JSON file of the same numbers. A case is a regression when its p95 is higher, or its throughput
+lower, than the baseline by more than the tolerance.
+Expected Input/Output:
+- Input: Options from the command line, see --help. Output: A table of results, the comparison with the baseline, and
+exit status 1 if any case regressed.
+Future Extensions or Revisions:
+New hot paths are added to the cases list in build_cases.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+backend_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_folder)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from spotify_stub import start_stub
+
+default_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Rows the database fixture is filled with
+fixture_users = 200
+fixture_comments = 2000
+fixture_song = "bench-song"
+
+
+# Purpose: Points the backend at the stub server and new SQLite files, before any backend module is imported.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: main
+# System Context: spotify_client.py, db_engine.py, and app.py read these when they are first imported.
+# Data Structures: N/A
+# Algorithms Used: The rate limit is raised so the benchmark measures the backend and not the token bucket.
+# Inputs: The stub's base URL and the folder the database and session files are made in.
+# Outputs: N/A
+# Future Changes: N/A
+def configure_environment(base_url, folder):
+    os.environ["SPOTIFY_API_URL"] = base_url + "/v1"
+    os.environ["SPOTIFY_ACCOUNTS_URL"] = base_url + "/api"
+    os.environ["CLIENT_ID"] = "bench"
+    os.environ["CLIENT_SECRET"] = "bench"
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(folder, "bench.sqlite3")
+    os.environ["SESSION_SQLITE_PATH"] = os.path.join(folder, "sessions.sqlite3")
+    os.environ["SPOTIFY_RATE_LIMIT"] = "1000000"
+    os.environ["SPOTIFY_RATE_BURST"] = "1000000"
+    #Fewer rounds keep the fixture's password hashes quick, logins are not measured
+    os.environ["BCRYPT_LOG_ROUNDS"] = "4"
+
+
+# Purpose: Creates the schema and fills the database fixture.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: main
+# System Context: Gives the comment and tag queries a realistic amount of data to read.
+# Data Structures: N/A
+# Algorithms Used: Comments are spread over the users with a few replies each, all on one song.
+# Inputs: N/A
+# Outputs: N/A
+# Future Changes: N/A
+def build_fixture():
+    from db_engine import engine
+    from migrations import upgrade
+    from db import Users, Songs, Comments, insertTag
+    from sqlalchemy import insert
+    upgrade(engine)
+    started = datetime(2025, 1, 1)
+    with engine.connect() as conn:
+        conn.execute(insert(Users), [{"userID" : user, "username" : f"bench{user}", "password" : "x",
+                                      "email" : f"bench{user}@example.com"} for user in range(1, fixture_users + 1)])
+        conn.execute(insert(Songs), [{"songID" : fixture_song, "name" : "Bench Song", "image" : "", "type" : "track"}])
+        conn.execute(insert(Comments), [{"commentID" : comment, "userID" : comment % fixture_users + 1, "songID" : fixture_song,
+                                         "content" : f"Comment {comment}", "date_commented" : started + timedelta(minutes=comment),
+                                         "parent_commentID" : None if comment % 5 else comment - 1}
+                                        for comment in range(1, fixture_comments + 1)])
+        conn.commit()
+        for user in range(1, fixture_users + 1):
+            insertTag(conn, ("happy", "sad", "chill")[user % 3], fixture_song, user)
+
+
+# Purpose: Builds the list of cases to time.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: main
+# System Context: Imports the backend, so it must run after configure_environment.
+# Data Structures: A list of (name, function) tuples, each function takes the iteration number.
+# Algorithms Used: N/A
+# Inputs: N/A
+# Outputs: The cases.
+# Future Changes: N/A
+def build_cases():
+    import app
+    import main as backend
+    from db_engine import engine
+    from db import insertSong, insertTag, selectTagsFromSong, selectPostsPage
+
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session["userID"] = 1
+        session["username"] = "bench1"
+        session["email"] = "bench1@example.com"
+    token = backend.get_token()
+    conn = engine.connect()
+
+    #Queries and IDs are zero padded so none is a prefix of another and every one misses the caches
+    return [
+        ("get_token", lambda i: backend.get_token()),
+        ("general_search", lambda i: backend.general_search(token, f"q{i:07d}", "track", 5)),
+        ("general_search (cached)", lambda i: backend.general_search(token, "cached query", "track", 5)),
+        ("artist_search", lambda i: backend.artist_search(token, f"artist{i:07d}")),
+        ("artist_search (cached)", lambda i: backend.artist_search(token, "cached-artist")),
+        ("album_search", lambda i: backend.album_search(token, f"album{i:07d}")),
+        ("album_search (cached)", lambda i: backend.album_search(token, "cached-album")),
+        ("track_search", lambda i: backend.track_search(token, f"track{i:07d}")),
+        ("track_search (cached)", lambda i: backend.track_search(token, "cached-track")),
+        ("insertSong", lambda i: insertSong(conn, f"bench-insert-{i:07d}", "Bench Insert", "track")),
+        ("insertTag", lambda i: insertTag(conn, ("happy", "sad", "chill")[i % 3], fixture_song, i % fixture_users + 1)),
+        ("selectTagsFromSong", lambda i: selectTagsFromSong(conn, fixture_song)),
+        ("selectPostsPage", lambda i: selectPostsPage(conn, fixture_song, None)),
+        ("/getposts", lambda i: client.post("/getposts", json={"last_segment" : fixture_song})),
+        ("/useractivity", lambda i: client.get("/useractivity/bench1")),
+        ("/useractivity/comments", lambda i: client.get("/useractivity/bench1/comments"))
+    ]
+
+
+# Purpose: Times one case.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: main
+# System Context: The endpoints print on every request, so output is thrown away while timing.
+# Data Structures: A list of call times in seconds.
+# Algorithms Used: Nearest rank percentiles over the sorted call times.
+# Inputs: The case function, the number of timed calls, and the number of warm up calls.
+# Outputs: A dictionary with ops_per_sec, p50_ms, p95_ms, and p99_ms.
+# Future Changes: N/A
+def run_case(function, iterations, warmup):
+    devnull = open(os.devnull, "w")
+    stdout, sys.stdout = sys.stdout, devnull
+    try:
+        for i in range(warmup):
+            function(iterations + i)
+        times = []
+        started = time.perf_counter()
+        for i in range(iterations):
+            call_started = time.perf_counter()
+            function(i)
+            times.append(time.perf_counter() - call_started)
+        elapsed = time.perf_counter() - started
+    finally:
+        sys.stdout = stdout
+        devnull.close()
+    times.sort()
+
+    def percentile(share):
+
+        return round(times[min(len(times) - 1, int(share * len(times)))] * 1000, 3)
+
+    return {"ops_per_sec" : round(iterations / elapsed, 1), "p50_ms" : percentile(0.50),
+            "p95_ms" : percentile(0.95), "p99_ms" : percentile(0.99)}
+
+
+# Purpose: Compares one case with its baseline.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: main
+# System Context: N/A
+# Data Structures: N/A
+# Algorithms Used: Cases whose p95 moved by less than min_delta_ms are never counted as regressions, calls that take a
+# few microseconds change by more than the tolerance from run to run. Neither are runs with fewer than min_samples timed
+# calls, with few samples the p95 is one of the slowest calls and a single hiccup moves it.
+# Inputs: The new result, the baseline result, the tolerance as a fraction, the smallest change in ms that counts, and
+# the number of timed calls with the fewest that counts.
+# Outputs: A short description of the change and whether it is a regression.
+# Future Changes: N/A
+def compare(result, baseline, tolerance, min_delta_ms, samples, min_samples):
+    p95_change = (result["p95_ms"] - baseline["p95_ms"]) / baseline["p95_ms"] if baseline["p95_ms"] else 0.0
+    ops_change = (result["ops_per_sec"] - baseline["ops_per_sec"]) / baseline["ops_per_sec"] if baseline["ops_per_sec"] else 0.0
+    regressed = (p95_change > tolerance or ops_change < -tolerance) and abs(result["p95_ms"] - baseline["p95_ms"]) >= min_delta_ms
+    if regressed and samples < min_samples:
+
+        return f"p95 {p95_change:+.0%}, ops/s {ops_change:+.0%}  (too few samples to flag)", False
+
+    return f"p95 {p95_change:+.0%}, ops/s {ops_change:+.0%}" + ("  REGRESSION" if regressed else ""), regressed
+
+
+# Purpose: Runs the benchmarks, prints the results, and compares them with or saves the baseline.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The command line.
+# System Context: N/A
+# Data Structures: A dictionary of case name -> result, the same shape as the baseline file's results.
+# Algorithms Used: N/A
+# Inputs: The options from the command line.
+# Outputs: Exit status 1 if any case regressed against the baseline, 0 otherwise.
+# Future Changes: N/A
+def main():
+    parser = argparse.ArgumentParser(description="Times the backend's hot paths against a stub Spotify and a SQLite fixture")
+    parser.add_argument("--iterations", type=int, default=200, help="timed calls per case")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed calls per case before timing")
+    parser.add_argument("--latency-ms", type=float, default=20, help="delay the stub Spotify adds to each response")
+    parser.add_argument("--only", default="", help="only run cases whose name contains this text")
+    parser.add_argument("--baseline", default=default_baseline, help="baseline file to compare with or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="save these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before a case counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1, help="smallest p95 change that can count as a regression")
+    parser.add_argument("--min-samples", type=int, default=100, help="fewest timed calls per case before regressions are flagged")
+    arguments = parser.parse_args()
+
+    stub, base_url = start_stub(arguments.latency_ms)
+    settings = {"iterations" : arguments.iterations, "latency_ms" : arguments.latency_ms}
+    results = {}
+    #The fixture is removed when the run ends, ignore_cleanup_errors covers files Windows still has open
+    with tempfile.TemporaryDirectory(prefix="bench-hot-paths-", ignore_cleanup_errors=True) as folder:
+        configure_environment(base_url, folder)
+        build_fixture()
+        for name, function in build_cases():
+            if arguments.only in name:
+                results[name] = run_case(function, arguments.iterations, arguments.warmup)
+        #Queued song writes and the search index load use the fixture, so both finish before it is removed
+        from main import song_writer, search_index
+        song_writer.close()
+        search_index.close()
+
+    baseline = None
+    if os.path.exists(arguments.baseline) and not arguments.save_baseline:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get("settings") != settings:
+            print(f"Baseline was run with {baseline.get('settings')}, this run used {settings}")
+
+    regressions = 0
+    print(f"{'case':<26} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  vs baseline")
+    for name, result in results.items():
+        line = f"{name:<26} {result['ops_per_sec']:>10,.1f} {result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f} {result['p99_ms']:>9.3f}"
+        if baseline and name in baseline.get("results", {}):
+            change, regressed = compare(result, baseline["results"][name], arguments.tolerance, arguments.min_delta_ms,
+                                        arguments.iterations, arguments.min_samples)
+            regressions += regressed
+            line += "  " + change
+        print(line)
+    print(f"{stub.requests} requests sent to the stub Spotify")
+
+    if arguments.save_baseline:
+        with open(arguments.baseline, "w") as file:
+            json.dump({"settings" : settings, "results" : results}, file, indent=2, sort_keys=True)
+        print(f"Saved the baseline to {arguments.baseline}")
+    elif baseline is None:
+        print(f"No baseline at {arguments.baseline}, run with --save-baseline to create one")
+    elif regressions:
+        print(f"{regressions} case(s) regressed by more than {arguments.tolerance:.0%}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
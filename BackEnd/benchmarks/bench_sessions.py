@@ -0,0 +1,129 @@
+"""
+Author: Ryan
+Date: 10.18.26
+Filename: bench_sessions.py
+
+Purpose:
+This script measures how many session lookups per second each session store in session_store.py can serve, both
+called directly and through the /check-session endpoint.
+
+System Context:
+Part of the Backend benchmarks for the PlayBack project. Run it from the BackEnd folder with
+"python benchmarks/bench_sessions.py [sessions] [lookups]".
+
+Development History:
+- Written on: 10.18.26
+- Last revised on: 10.18.26
+
+Existence Rationale:
+/check-session is called by most components on every page, so session reads are the most frequent thing the backend does.
+
+Data Structures/ Algorithms:
+- Each store is filled with the given number of sessions, then random session IDs are looked up in a tight loop.
+- The SQLite store is measured twice, with its memory cache and with a cache of size zero so every read goes to the file.
+Expected Input/Output:
+- Input: The number of sessions and the number of lookups. Output: One line per store with lookups per second.
+Future Extensions or Revisions:
+N/A
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_store import MemorySessionStore, SQLiteSessionStore, make_session_interface
+
+
+# Purpose: Times random lookups against one session store.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: main
+# System Context: N/A
+# Data Structures: A list of session IDs.
+# Algorithms Used: The IDs are picked at random before timing so the LRU order does not favour the store.
+# Inputs: The store, the number of sessions, and the number of lookups.
+# Outputs: Lookups per second.
+# Future Changes: N/A
+def bench_store(store, sessions, lookups):
+    expires_at = time.time() + 3600
+    sids = [f"session-{i}" for i in range(sessions)]
+    for sid in sids:
+        store.save(sid, {"userID" : 1, "username" : "bench", "email" : "bench@example.com"}, expires_at)
+    order = [random.choice(sids) for _ in range(lookups)]
+    started = time.perf_counter()
+    for sid in order:
+        store.get(sid)
+
+    return lookups / (time.perf_counter() - started)
+
+
+# Purpose: Times /check-session requests through the Flask test client.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: main
+# System Context: Shows the cost of a session read inside a whole request.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: The session backend name, the number of requests, and the SQLite file to use.
+# Outputs: Requests per second.
+# Future Changes: N/A
+def bench_endpoint(backend, requests, sqlite_path):
+    #The endpoint never touches the database, so any database will do
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    import app
+    app.app.session_interface = make_session_interface({**app.app.config, "SESSION_BACKEND" : backend,
+                                                        "SESSION_SQLITE_PATH" : sqlite_path})
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session["userID"] = 1
+        session["username"] = "bench"
+        session["email"] = "bench@example.com"
+    #The endpoint prints on every request, which would be most of what is measured
+    devnull = open(os.devnull, "w")
+    stdout, sys.stdout = sys.stdout, devnull
+    try:
+        started = time.perf_counter()
+        for _ in range(requests):
+            client.get("/check-session")
+        elapsed = time.perf_counter() - started
+    finally:
+        sys.stdout = stdout
+        devnull.close()
+
+    return requests / elapsed
+
+
+# Purpose: Runs every benchmark and prints the results.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The command line.
+# System Context: N/A
+# Data Structures: A list of (name, rate) tuples.
+# Algorithms Used: N/A
+# Inputs: The number of sessions and lookups from the command line.
+# Outputs: N/A, the results are printed.
+# Future Changes: N/A
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    with tempfile.TemporaryDirectory() as folder:
+        results = [("memory", bench_store(MemorySessionStore(sessions), sessions, lookups)),
+                   ("sqlite + memory cache", bench_store(SQLiteSessionStore(os.path.join(folder, "cached.sqlite3"), sessions, sessions, 3600), sessions, lookups)),
+                   ("sqlite only", bench_store(SQLiteSessionStore(os.path.join(folder, "uncached.sqlite3"), sessions, 0), sessions, lookups))]
+        requests = max(lookups // 20, 1)
+        for backend in ("memory", "sqlite"):
+            results.append((f"/check-session ({backend})", bench_endpoint(backend, requests, os.path.join(folder, "app.sqlite3"))))
+    print(f"{sessions} sessions, {lookups} lookups")
+    for name, rate in results:
+        print(f"{name:<28} {rate:>12,.0f} lookups/s")
+
+
+if __name__ == "__main__":
+    main()
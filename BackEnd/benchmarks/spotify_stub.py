@@ -0,0 +1,244 @@
+"""
+Author: Ryan
+Date: 10.18.26
+Filename: spotify_stub.py
+
+Purpose:
+This script runs a local HTTP server that answers the Spotify requests main.py sends with small made up responses,
+after a configurable delay.
+
+System Context:
+Part of the Backend benchmarks for the PlayBack project. bench_hot_paths.py starts it in the background and points
+SPOTIFY_API_URL and SPOTIFY_ACCOUNTS_URL at it. It can also be run on its own with
+"python benchmarks/spotify_stub.py [--port 8900] [--latency-ms 50]" to try the backend without Spotify.
+
+Development History:
+- Written on: 10.18.26
+- Last revised on: 10.18.26
+
+Existence Rationale:
+Benchmarks against the real Spotify API are slow, rate limited, and change with the network, so they cannot be compared
+from one run to the next.
+
+Data Structures/ Algorithms:
+- The responses have the same shape as Spotify's, with names built from the requested IDs and queries.
+- A ThreadingHTTPServer answers each request on its own thread, so the delay does not serialize concurrent requests.
+Expected Input/Output:
+- Input: The port and the delay. Output: JSON responses, and a count of the requests answered.
+Future Extensions or Revisions:
+N/A
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Tracks on each stub album, more than one page so the album paging is exercised too
+album_tracks = 120
+page_limit = 50
+
+
+# Purpose: Builds a stub track object.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The stub request handler.
+# System Context: N/A
+# Data Structures: A dictionary shaped like a Spotify track.
+# Algorithms Used: N/A
+# Inputs: The track ID.
+# Outputs: The track.
+# Future Changes: N/A
+def stub_track(id):
+
+    return {"id" : id, "name" : f"Track {id}", "type" : "track",
+            "artists" : [{"id" : "stub-artist", "name" : "Stub Artist"}],
+            "album" : {"id" : "stub-album", "name" : "Stub Album", "album_type" : "album", "release_date" : "2025-01-01",
+                       "images" : [{"url" : "https://example.com/album.png"}]}}
+
+
+# Purpose: Builds one page of a stub album's track list.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The stub request handler.
+# System Context: N/A
+# Data Structures: A dictionary shaped like a Spotify paging object.
+# Algorithms Used: N/A
+# Inputs: The album ID, the offset, and the page size.
+# Outputs: The page.
+# Future Changes: N/A
+def stub_album_page(id, offset, limit):
+    items = [{"id" : f"{id}-{number}", "name" : f"Track {number}"} for number in range(offset, min(offset + limit, album_tracks))]
+
+    return {"items" : items, "total" : album_tracks, "limit" : limit, "offset" : offset,
+            "next" : "stub" if offset + limit < album_tracks else None}
+
+
+# Purpose: Builds a stub album object with the first page of its tracks.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The stub request handler.
+# System Context: N/A
+# Data Structures: A dictionary shaped like a Spotify album.
+# Algorithms Used: N/A
+# Inputs: The album ID.
+# Outputs: The album.
+# Future Changes: N/A
+def stub_album(id):
+
+    return {"id" : id, "name" : f"Album {id}", "album_type" : "album", "total_tracks" : album_tracks,
+            "release_date" : "2025-01-01", "images" : [{"url" : "https://example.com/album.png"}],
+            "artists" : [{"id" : "stub-artist", "name" : "Stub Artist"}], "tracks" : stub_album_page(id, 0, page_limit)}
+
+
+# Purpose: Builds a stub artist object.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The stub request handler.
+# System Context: N/A
+# Data Structures: A dictionary shaped like a Spotify artist.
+# Algorithms Used: N/A
+# Inputs: The artist ID.
+# Outputs: The artist.
+# Future Changes: N/A
+def stub_artist(id):
+
+    return {"id" : id, "name" : f"Artist {id}", "followers" : {"total" : 1000}, "genres" : ["stub"],
+            "images" : [{"url" : "https://example.com/artist.png"}]}
+
+
+# Purpose: Answers the Spotify requests main.py sends.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The stub server, once per request.
+# System Context: Covers the token, search, artist, top tracks, album, album tracks, track, and several-items endpoints.
+# Data Structures: N/A
+# Algorithms Used: Waits the server's latency before answering.
+# Inputs: The request.
+# Outputs: A JSON response, 404 for paths it does not know.
+# Future Changes: N/A
+class StubHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.count()
+        time.sleep(self.server.latency)
+        self.send_json({"access_token" : "stub-token", "token_type" : "Bearer", "expires_in" : 3600})
+
+    def do_GET(self):
+        self.server.count()
+        time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        query = {key : values[0] for key, values in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/")[1:]
+        if parts == ["search"]:
+            type = query.get("type", "track")
+            builders = {"track" : stub_track, "album" : stub_album, "artist" : stub_artist}
+            items = [{**builders[type](f"{query.get('q', '')}-{number}"), "name" : f"{query.get('q', '')} result {number}"}
+                     for number in range(int(query.get("limit", 5)))]
+            return self.send_json({type + "s" : {"items" : items}})
+        if len(parts) == 1 and parts[0] in ("tracks", "albums", "artists"):
+            builder = {"tracks" : stub_track, "albums" : stub_album, "artists" : stub_artist}[parts[0]]
+            return self.send_json({parts[0] : [builder(id) for id in query.get("ids", "").split(",") if id]})
+        if len(parts) == 3 and parts[0] == "artists" and parts[2] == "top-tracks":
+            return self.send_json({"tracks" : [stub_track(f"{parts[1]}-top-{number}") for number in range(10)]})
+        if len(parts) == 3 and parts[0] == "albums" and parts[2] == "tracks":
+            return self.send_json(stub_album_page(parts[1], int(query.get("offset", 0)), int(query.get("limit", page_limit))))
+        if len(parts) == 2 and parts[0] in ("tracks", "albums", "artists"):
+            builder = {"tracks" : stub_track, "albums" : stub_album, "artists" : stub_artist}[parts[0]]
+            return self.send_json(builder(parts[1]))
+        self.send_json({"error" : {"status" : 404, "message" : "Not found"}}, 404)
+
+
+# Purpose: The stub server, with its delay and a count of the requests it has answered.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: start_stub
+# System Context: N/A
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: The address and the delay in seconds.
+# Outputs: N/A
+# Future Changes: N/A
+class StubServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address, latency):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def count(self):
+        with self.lock:
+            self.requests += 1
+
+
+# Purpose: Starts the stub server on a background thread.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: bench_hot_paths.py, and main below.
+# System Context: N/A
+# Data Structures: N/A
+# Algorithms Used: Port 0 lets the operating system pick a free port.
+# Inputs: The delay in milliseconds and the port.
+# Outputs: The server and its base URL.
+# Future Changes: N/A
+def start_stub(latency_ms=0, port=0):
+    server = StubServer(("127.0.0.1", port), latency_ms / 1000)
+    threading.Thread(target=server.serve_forever, name="spotify-stub", daemon=True).start()
+
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# Purpose: Runs the stub server until it is stopped.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The command line.
+# System Context: N/A
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: The port and delay from the command line.
+# Outputs: N/A, prints the environment variables to point the backend at it.
+# Future Changes: N/A
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Spotify API")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    arguments = parser.parse_args()
+    server, base_url = start_stub(arguments.latency_ms, arguments.port)
+    print(f"SPOTIFY_API_URL={base_url}/v1")
+    print(f"SPOTIFY_ACCOUNTS_URL={base_url}/api")
+    try:
+        while True:
+            time.sleep(3600)
+
+    except KeyboardInterrupt:
+
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Author: Ryan
+Date: 10.18.26
+Filename: cache.py
+
+Purpose:
+This module provides a small in-process cache used to keep Spotify data in memory between page views so the same
+artist, album, or track is not fetched from the API every time someone opens its page.
+
+System Context:
+Part of the Backend system for the PlayBack project. main.py puts one of these caches in front of each kind of
+lookup it makes.
+
+Development History:
+- Written on: 10.18.26
+- Last revised on: 10.18.26
+
+Existence Rationale:
+Spotify metadata rarely changes, so most upstream requests for it return the exact same data as the last one.
+
+Data Structures/ Algorithms:
+- An OrderedDict is used as an LRU list, the most recently used entries are moved to the end and the oldest are
+evicted from the front once the cache is full.
+- Each entry remembers when it was stored. Once it is older than its TTL it is still served for a stale window while
+a background thread, or a task on the event loop for async loaders, reloads it (stale-while-revalidate).
+Expected Input/Output:
+- Input: A key and a function that loads the value when it is not cached. Output: The cached or freshly loaded value.
+- SearchCache also answers a longer search from the cached results of a shorter one when those results were complete.
+Future Extensions or Revisions:
+Hit, miss, and eviction counters are kept so the TTLs and sizes can be tuned.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads used to reload stale entries, shared by every cache
+refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+
+
+# Purpose: A bounded cache where entries expire after a TTL and can be served stale while they are reloaded.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: main.py, for the artist, album, and track lookups. SearchCache builds on it.
+# System Context: Sits in front of the Spotify API so repeat page views are answered from memory.
+# Data Structures: An OrderedDict of key -> (value, time stored), a set of keys that are being reloaded, and counters.
+# Algorithms Used: LRU eviction, TTL expiry, and stale-while-revalidate. Everything is guarded by one lock, loaders run outside of it.
+# Inputs: A name for the stats, the TTL and the stale window in seconds, and the maximum number of entries.
+# Outputs: Cached values and a dictionary of counters from stats().
+# Future Changes: N/A
+class TTLCache:
+
+    def __init__(self, name, ttl, max_size, stale_ttl=0):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.refreshing = set()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+        #Async reloads that are running, kept so they are not garbage collected before they finish
+        self.refresh_tasks = set()
+
+    #Returns (value, state) where state is "fresh", "stale", or None when the key is missing or too old to serve.
+    #count=False looks the key up without touching the counters.
+    def get(self, key, count=True):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += count
+                return None, None
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += count
+                return value, "fresh"
+            if age < self.ttl + self.stale_ttl:
+                self.entries.move_to_end(key)
+                self.stale_hits += count
+                return value, "stale"
+            #Too old to serve at all
+            del self.entries[key]
+            self.misses += count
+            return None, None
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    #Serves the key from the cache, loading it with loader() when it is missing. None results are not cached.
+    def get_or_load(self, key, loader):
+        value, state = self.get(key)
+        if state == "fresh":
+            return value
+        if state == "stale":
+            self.refresh(key, loader)
+            return value
+        value = loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    #The same as get_or_load for a loader that returns a coroutine, stale entries are reloaded by a task on the running loop
+    async def get_or_load_async(self, key, loader):
+        value, state = self.get(key)
+        if state == "fresh":
+            return value
+        if state == "stale":
+            if self.start_refresh(key):
+                task = asyncio.ensure_future(self.run_refresh_async(key, loader))
+                self.refresh_tasks.add(task)
+                task.add_done_callback(self.refresh_tasks.discard)
+            return value
+        value = await loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    #Serves many keys at once. loader(keys) returns a coroutine giving a dictionary of key -> value for the keys that
+    #were not cached, stale keys are reloaded together by one task on the running loop. Keys the loader leaves out of
+    #its dictionary are left out of the result too, None values are returned but not cached.
+    async def get_many_async(self, keys, loader):
+        values = {}
+        missing = []
+        stale = []
+        for key in dict.fromkeys(keys):
+            value, state = self.get(key)
+            if state is None:
+                missing.append(key)
+                continue
+            values[key] = value
+            if state == "stale" and self.start_refresh(key):
+                stale.append(key)
+        if stale:
+            task = asyncio.ensure_future(self.run_refresh_many_async(stale, loader))
+            self.refresh_tasks.add(task)
+            task.add_done_callback(self.refresh_tasks.discard)
+        if missing:
+            loaded = await loader(missing)
+            for key in missing:
+                if key not in loaded:
+                    continue
+                values[key] = loaded[key]
+                if values[key] is not None:
+                    self.set(key, values[key])
+        return values
+
+    #Marks a key as being reloaded, returns False if a reload of it is already running
+    def start_refresh(self, key):
+        with self.lock:
+            if key in self.refreshing:
+                return False
+            self.refreshing.add(key)
+            self.refreshes += 1
+            return True
+
+    #Reloads a key in the background, only one reload per key runs at a time
+    def refresh(self, key, loader):
+        if self.start_refresh(key):
+            refresh_pool.submit(self.run_refresh, key, loader)
+
+    def run_refresh(self, key, loader):
+        try:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+
+        except Exception as e:
+
+            print(f"Error refreshing {self.name} cache entry {key}: {e}")
+
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    async def run_refresh_async(self, key, loader):
+        try:
+            value = await loader()
+            if value is not None:
+                self.set(key, value)
+
+        except Exception as e:
+
+            print(f"Error refreshing {self.name} cache entry {key}: {e}")
+
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    async def run_refresh_many_async(self, keys, loader):
+        try:
+            loaded = await loader(keys)
+            for key, value in loaded.items():
+                if value is not None:
+                    self.set(key, value)
+
+        except Exception as e:
+
+            print(f"Error refreshing {len(keys)} {self.name} cache entries: {e}")
+
+        finally:
+            with self.lock:
+                self.refreshing.difference_update(keys)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {"size" : len(self.entries),
+                    "max_size" : self.max_size,
+                    "hits" : self.hits,
+                    "stale_hits" : self.stale_hits,
+                    "misses" : self.misses,
+                    "evictions" : self.evictions,
+                    "refreshes" : self.refreshes,
+                    "hit_rate" : round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0}
+
+
+# Purpose: Caches search results by query, type, and limit, and answers longer queries from a shorter cached one.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: main.py, for the search bar and broad search lookups.
+# System Context: The search bar searches on every keystroke, so most queries extend one that was just searched.
+# Data Structures: The TTLCache entries, keyed by (normalized query, type, limit). Empty results are stored as empty lists.
+# Algorithms Used: On a miss the shorter prefixes of the query are checked, longest first, including ones that end in
+# the middle of a word, so each keystroke can be answered from the one before it. A cached prefix that returned some
+# results but fewer than the limit holds every match Spotify had for it, so the results for the longer query are the
+# entries from it whose name or artists contain every word of the longer query. Prefixes that found nothing are not
+# used, Spotify's matching is fuzzy and "ac/" finding nothing says nothing about "ac/dc".
+# Inputs: The TTL in seconds and the maximum number of entries.
+# Outputs: (found, results) from lookup().
+# Future Changes: N/A
+class SearchCache(TTLCache):
+
+    def __init__(self, name, ttl, max_size):
+        super().__init__(name, ttl, max_size)
+        self.prefix_hits = 0
+
+    @staticmethod
+    def normalize(query):
+
+        return " ".join(str(query).lower().split())
+
+    #Checks whether a search result contains every word of the query
+    @staticmethod
+    def matches(item, words):
+        text = " ".join([item.get("name", "")] + list(item.get("artist", []))).lower()
+
+        return all(word in text for word in words)
+
+    def lookup(self, query, type, limit):
+        query = self.normalize(query)
+        value, state = self.get((query, type, limit))
+        if state:
+            return True, value
+        words = query.split()
+        #Each shorter prefix of the query, longest first, so a search typed one letter at a time can use the last one
+        for end in range(len(query) - 1, 0, -1):
+            if query[end - 1] == " ":
+                continue
+            value, state = self.get((query[:end], type, limit), count=False)
+            if state and 0 < len(value) < limit:
+                derived = [item for item in value if self.matches(item, words)]
+                with self.lock:
+                    self.prefix_hits += 1
+                self.set((query, type, limit), derived)
+                return True, derived
+        return False, None
+
+    def store(self, query, type, limit, results):
+        self.set((self.normalize(query), type, limit), results or [])
+
+    def stats(self):
+        result = super().stats()
+        with self.lock:
+            result["prefix_hits"] = self.prefix_hits
+        return result
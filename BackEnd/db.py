@@ -9,7 +9,7 @@
  Where it fits: This file connects to the database and manages user, post, song, and comment data.
  
  Written: 4.1.25
- Revised: 5.4.25
+ Revised: 10.18.26
  
  Why it exists: The file provides essential functions for inserting and managing data in the PlayBack database.
  
@@ -22,22 +22,11 @@
  Expected extensions/revisions: The code may be extended to handle more complex queries or additional table operations.
 """
 
-from sqlalchemy import create_engine, ForeignKey, Column, String, Integer, MetaData, Table, DateTime, insert, select, func, update, and_, update
-from dotenv import load_dotenv
+from sqlalchemy import ForeignKey, Column, String, Integer, Text, MetaData, Table, DateTime, Index, insert, select, func, update, and_, or_, exists, update
+from sqlalchemy.dialects import mysql, sqlite, postgresql
 from datetime import datetime
+import json
 
-
-import os
-#Database credentials to be used in the engine
-load_dotenv()
-db_password = os.getenv("DB_PASSWORD")
-db_user = 'root'
-db_host = '127.0.0.1'
-db_port = '3306'
-db_name = 'play_back_db'
-
-# Create a connection to the MySQL database using SQLAlchemy
-engine = create_engine(f"mysql+pymysql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}", echo = True)
 #Metadata object to hold table definitions, used by SQLAlchemy to manage the database schema
 meta = MetaData()
 
@@ -50,6 +39,16 @@ Tags = Table(
     Column('userID', Integer, ForeignKey('Users.userID'), primary_key=True)
 )
 
+# Keeps a running count of each tag on each song so the totals do not have to be grouped on every page view.
+# insertTag keeps it up to date and rebuildTagCounts can recompute it from Tags.
+TagCounts = Table(
+    "TagCounts",
+    meta,
+    Column('songID', String(200), primary_key=True),
+    Column('tag', String(100), primary_key=True),
+    Column('occurrences', Integer, nullable=False, default=0)
+)
+
 # Creates the table that stores song information
 Songs = Table(
     "Songs",
@@ -57,7 +56,9 @@ Songs = Table(
     Column('songID', String(200), primary_key=True),
     Column('name', String(100), default="NoName"),
     Column('image', String(200)),
-    Column('type', String(50))
+    Column('type', String(50)),
+    #A JSON list of the artist names, so the local search index can show who a track is by
+    Column('artists', Text)
 )
 
 # Creates the table that stores user information
@@ -84,6 +85,21 @@ Comments = Table(
     Column('parent_commentID', Integer, ForeignKey('Comments.commentID'))
 )
 
+# Indexes on the columns the hot lookups filter on: posts by song, activity by user, replies by parent, and login by email.
+# Existing databases get them from migration 3 in migrations.py.
+lookup_indexes = [
+    Index('ix_Comments_songID', Comments.c.songID),
+    Index('ix_Comments_userID', Comments.c.userID),
+    Index('ix_Comments_parent_commentID', Comments.c.parent_commentID),
+    Index('ix_Users_email', Users.c.email),
+    Index('ix_Tags_userID', Tags.c.userID)
+]
+
+# Index in the order each level of a comment thread is paged through, so every page of /getposts and /getreplies is a
+# range read. Added by migration 5.
+Index('ix_Comments_songID_parent_date_commentID', Comments.c.songID, Comments.c.parent_commentID, Comments.c.date_commented,
+      Comments.c.commentID)
+
 """
     Purpose: Inserts a new song into the Songs table.
     Author: Ryan 
@@ -116,6 +132,69 @@ def insertSong(conn, song_id, name, type, image="images/no_result.png"):
 
         return f"Song with ID: {song_id} already exists"
 
+# Purpose: Builds an INSERT that updates the existing row instead of failing when the primary key is already taken.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: insertSongs, insertTag, and changeTagCounts
+# System Context: Each database spells upserts differently, this hides that from the insert functions.
+# Data Structures: A list of row dictionaries, a list of columns that take the new row's value on conflict, and a list
+# of columns that have the new row's value added to them on conflict.
+# Algorithms Used: Uses ON DUPLICATE KEY UPDATE on MySQL and ON CONFLICT DO UPDATE on SQLite and PostgreSQL.
+# Inputs: A database connection, a table, the rows to write, the key columns, and the columns to change on conflict.
+# Outputs: A single multi-row insert statement.
+# Future Changes: N/A
+def buildUpsert(conn, table, rows, keys, update_columns, increment_columns=()):
+    if conn.dialect.name == "mysql":
+        statement = mysql.insert(table).values(rows)
+        new_values = statement.inserted
+    else:
+        dialect = sqlite if conn.dialect.name == "sqlite" else postgresql
+        statement = dialect.insert(table).values(rows)
+        new_values = statement.excluded
+    changes = {column : new_values[column] for column in update_columns}
+    changes.update({column : table.c[column] + new_values[column] for column in increment_columns})
+    if conn.dialect.name == "mysql":
+
+        return statement.on_duplicate_key_update(changes)
+
+    return statement.on_conflict_do_update(index_elements=keys, set_=changes)
+
+
+# Purpose: Inserts a whole list of songs into the Songs table at once, updating songs that are already stored.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: search_media in main.py, after every search.
+# System Context: Replaces one insertSong call per search result, which meant one statement and one commit per song.
+# Data Structures: A list of dictionaries with songID, name, type, image, and artists keys, artists being a list of names.
+# Algorithms Used: Duplicate IDs in the list are dropped, then every row is written by one upsert statement in one transaction.
+# Inputs: Connection object to the database and the list of songs.
+# Outputs: A message with the number of songs written, or an error message.
+# Future Changes: N/A
+def insertSongs(conn, songs):
+    try:
+        # Later entries with the same ID replace earlier ones, values are cut to the column sizes
+        rows = list({song["songID"] : {"songID" : song["songID"],
+                                       "name" : (song.get("name") or "NoName")[:100],
+                                       "image" : (song.get("image") or "images/no_result.png")[:200],
+                                       "type" : song.get("type"),
+                                       "artists" : json.dumps(song.get("artists") or [])} for song in songs if song.get("songID")}.values())
+        if not rows:
+
+            return "No songs to insert"
+        
+        conn.execute(buildUpsert(conn, Songs, rows, [Songs.c.songID], ["name", "image", "type", "artists"]))
+        conn.commit()
+
+        return f"{len(rows)} songs inserted or updated"
+    
+    except Exception as e:
+
+        conn.rollback()
+
+        return f"Error inserting songs: {e}"
+
 """
     Method Comment Block: insert_user
     Purpose: Inserts a new user into the Users table.
@@ -278,41 +357,94 @@ def selectUserFromID(conn, id):
         return f"Error selecting user with ID: {id}, error: {e}"
 
 
-# Purpose: Returns an interable object of all posts connected to a song.
+# Purpose: Returns one page of the comments on a song that reply to the same parent, together with the username of the
+# person who wrote each one.
 # Author: Ryan
-# Date Written: 4.20.25
-# Last Revised: 5.4.25
-# Called By: The get_posts Flask endpoint.
-# System Context: Gets all comments associated with a song, used to display comments on the song's page.
-# Data Structures: The object is an iterable containing all comments with comment information stored in a tuple.
-# Algorithms Used: N/A
-# Inputs: A songs ID and a connection to the database.
-# Outputs: An iterable object containing all comments associated with the song.
-# Future Changes: As of 5.4.25, there are no expected changes to this method.
-def selectPostsFromSong(conn, song):
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The get_posts and get_replies Flask endpoints.
+# System Context: Replaces reading every comment on a song followed by a selectUserFromID call for each one, and keeps the
+# response for popular songs from growing without bound. Only one level of a thread is read at a time, replies are
+# loaded when the user opens them.
+# Data Structures: A list of rows with commentID, content, date_commented, userID, username, parent_commentID, and posted.
+# Algorithms Used: Keyset pagination. Comments are ordered by (date_commented, commentID) and a page starts right after
+# the last comment of the previous page, so a deep page reads the same number of index entries as the first one.
+# Comments are left joined to Users in the same query, a missing user shows up as "[DELETED]". The posted column says
+# whether the given user has commented on the song at all.
+# Inputs: A database connection, a song ID, the ID of the user looking at the page (or None), the (date_commented,
+# commentID) of the last comment already seen (or None for the first page), the page size, and the ID of the parent
+# comment (None for the top-level comments).
+# Outputs: A list of up to limit + 1 rows, the extra row only tells the caller there is another page. Or an error message.
+# Future Changes: N/A
+def selectPostsPage(conn, song, user, after=None, limit=50, parent=None):
     try:
-        comment_search = conn.execute(select(Comments).where(Comments.c.songID == song))
-        return comment_search
+        posted = exists().where(and_(Comments.c.songID == song, Comments.c.userID == user)).label("posted")
+        statement = (select(Comments.c.commentID,
+                            Comments.c.content,
+                            Comments.c.date_commented,
+                            Comments.c.userID,
+                            func.coalesce(Users.c.username, "[DELETED]").label("username"),
+                            Comments.c.parent_commentID,
+                            posted)
+                     .select_from(Comments.outerjoin(Users, Comments.c.userID == Users.c.userID))
+                     .where(Comments.c.songID == song, Comments.c.parent_commentID == parent))
+        if after is not None:
+            after_date, after_id = after
+            statement = statement.where(or_(Comments.c.date_commented > after_date,
+                                            and_(Comments.c.date_commented == after_date, Comments.c.commentID > after_id)))
+        statement = statement.order_by(Comments.c.date_commented, Comments.c.commentID).limit(limit + 1)
+
+        return conn.execute(statement).fetchall()
+    
     except Exception as e:
+
         return f"Error getting posts for song with ID: {song}, error: {e}"
 
 
+# Purpose: Counts the direct replies to each of a list of comments.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The get_posts and get_replies Flask endpoints.
+# System Context: Lets the front end show how many replies a comment has without loading them.
+# Data Structures: A dictionary of commentID -> number of replies. Comments without replies are left out.
+# Algorithms Used: One grouped count over the parent_commentID index for the whole page.
+# Inputs: A database connection and the IDs of the comments on a page.
+# Outputs: The dictionary of reply counts, or an error message.
+# Future Changes: N/A
+def selectReplyCounts(conn, comment_ids):
+    try:
+        if not comment_ids:
+            return {}
+        statement = (select(Comments.c.parent_commentID, func.count().label("replies"))
+                     .where(Comments.c.parent_commentID.in_(comment_ids))
+                     .group_by(Comments.c.parent_commentID))
+
+        return {row.parent_commentID : row.replies for row in conn.execute(statement)}
+
+    except Exception as e:
+
+        return f"Error counting replies, error: {e}"
+
+
 # Purpose: Used to check if a username or email already exists in the Users table.
 # Author: Ryan
 # Date Written: 4.20.25
-# Last Revised: 5.4.25
+# Last Revised: 10.18.26
 # Called By: The signup Flask endpoint.
 # System Context: Returns a message indicating whether the username or email already exists in the database. Shows the user what they need to
 # change to successfully create an account.
-# Data Structures: Two tuples containing the results of the search for the username and email.
-# Algorithms Used: N/A
+# Data Structures: A list of the (username, email) rows that match either value.
+# Algorithms Used: One query matches on username or email, then the rows are checked for which of the two they matched.
 # Inputs: username and email strings, and a connection to the database.
 # Outputs: A message indicating whether the username or email already exists in the database, or if there are no matches.
-# Future Changes: As of 5.4.25, there are no expected changes to this method.
+# Future Changes: N/A
 def checkUserExistence(conn, username, email):
     try:
-        user_search = conn.execute(select(Users).where(Users.c.username == username)).fetchone()
-        email_search = conn.execute(select(Users).where(Users.c.email == email)).fetchone()
+        matches = conn.execute(select(Users.c.username, Users.c.email)
+                               .where(or_(Users.c.username == username, Users.c.email == email))).fetchall()
+        user_search = any(row.username == username for row in matches)
+        email_search = any(row.email == email for row in matches)
         if user_search and email_search:
             return "Username and Email Already Exist"
         if user_search:
@@ -325,41 +457,90 @@ def checkUserExistence(conn, username, email):
         return f"Error checking user: {e}"
     
 
-# Purpose: Inserts a tag into the database, or updates an existing one.
+# Purpose: Replaces the stored password hash of a user.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The login Flask endpoint, when the stored hash was made with an older bcrypt work factor.
+# System Context: Lets the work factor be changed without asking anyone to reset their password.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: A database connection, a user ID, and the new hash.
+# Outputs: A success message or an error message.
+# Future Changes: N/A
+def updateUserPassword(conn, id, password):
+    try:
+        conn.execute(update(Users).where(Users.c.userID == id).values(password=password))
+        conn.commit()
+
+        return f"Password updated for user with ID: {id}"
+
+    except Exception as e:
+
+        return f"Error updating password for user with ID: {id}, error: {e}"
+
+
+# Purpose: Adds to or subtracts from the stored counts of tags on a song.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: insertTag
+# System Context: Keeps the TagCounts table in step with Tags as users tag songs or change their tag.
+# Data Structures: A dictionary of tag value to the amount its count changes by.
+# Algorithms Used: One multi-row upsert creates the counter rows or adds the change to them. Does not commit, so it is
+# part of the caller's transaction.
+# Inputs: A database connection, a song ID, and the changes.
+# Outputs: N/A
+# Future Changes: N/A
+def changeTagCounts(conn, song, changes):
+    rows = [{"songID" : song, "tag" : tag, "occurrences" : change} for tag, change in changes.items() if change]
+    if rows:
+        conn.execute(buildUpsert(conn, TagCounts, rows, [TagCounts.c.songID, TagCounts.c.tag], [], ["occurrences"]))
+
+
+# Purpose: Sets a user's tag on a song, creating it if they do not have one yet.
 # Author: Ryan
 # Date Written: 4.25.25
-# Last Revised: 5.4.25
+# Last Revised: 10.18.26
 # Called By: the create_tag Flask endpoint.
 # System Context: Used to add a tag to the database for permanent storage or update the tag value.
-# Data Structures: Database entry tuple.
-# Algorithms Used: N/A
+# Data Structures: A dictionary describing what happened to the tag.
+# Algorithms Used: A locked read-modify-write of up to four statements in one transaction. The user's own Users row is
+# locked first with an UPDATE that changes nothing. That row always exists, unlike the Tags row on a first tag, so
+# concurrent clicks by the same user wait for each other on every database (MySQL row lock, SQLite write lock). The old
+# tag is then read, the new one is written with an upsert, and the old value is used to move the user's vote between
+# TagCounts rows. Everything is committed once.
 # Inputs: A database connection, a tag value, a song ID, and a user ID.
-# Outputs: A message indicating whether the tag was created or updated, or an error message if something goes wrong.
+# Outputs: {"result": "created", "updated" or "unchanged", "old_tag": the previous tag or None}, None for an empty or missing tag,
+# or an error message if something goes wrong.
 # Future Changes: 
 def insertTag(conn, value, song, id):
     try:
         #Tag must have a value 
-        if value != "":
-            try:
-                #sqlalchemy insert statement to add a new tag
-                insert_statement = insert(Tags).values(
-                    tag=value,
-                    songID=song,
-                    userID=id
-                )
-                conn.execute(insert_statement)
+        if value:
+            #Serializes this user's tag writes, reading the Tags row with FOR UPDATE does not when it does not exist yet
+            conn.execute(update(Users).where(Users.c.userID == id).values(userID=Users.c.userID))
+            old_value = conn.execute(select(Tags.c.tag)
+                                     .where(and_(Tags.c.userID == id, Tags.c.songID == song))).scalar()
+            if old_value == value:
                 conn.commit()
 
-                return f"created tag"
-            #If the tag already exists, update the existing tag
-            except Exception:
-                conn.execute(update(Tags).where(and_(Tags.c.userID == id,Tags.c.songID == song)).values(tag=value))
-                conn.commit()
-
-                return f"updated tag"
+                return {"result" : "unchanged", "old_tag" : old_value}
+            
+            conn.execute(buildUpsert(conn, Tags, [{"tag" : value, "songID" : song, "userID" : id}], [Tags.c.songID, Tags.c.userID], ["tag"]))
+            #Moves the user's vote from their old tag to the new one
+            changes = {value : 1}
+            if old_value is not None:
+                changes[old_value] = -1
+            changeTagCounts(conn, song, changes)
+            conn.commit()
+
+            return {"result" : "created" if old_value is None else "updated", "old_tag" : old_value}
             
     except Exception as e:
 
+        conn.rollback()
+
         return f"Error inserting tag: {e}"
 
 
@@ -391,18 +572,18 @@ def selectUsersTag(conn, song, user):
 # Purpose: Selects all tags associated with a song and counts their occurrences.
 # Author: Ryan
 # Date Written: 5.1.25
-# Last Revised: 5.4.25
+# Last Revised: 10.18.26
 # Called By: get_tags Flask endpoint.
 # System Context: Shows all tags associated with a song and how many times each tag has been used.
 # Data Structures: An intermediary dictionary to store tag occurrences.
-# Algorithms Used: A list of database entries is iterated through and the relevant data is stored in a dictionary.
+# Algorithms Used: The counts are read straight from the TagCounts table that insertTag keeps up to date.
 # Inputs: A database connection and a song ID.
 # Outputs: A dictionary where the keys are tag names and the values are the number of occurrences of each tag.
-# Future Changes: As of 5.4.25, there are no expected changes to this method.
+# Future Changes: N/A
 def selectTagsFromSong(conn, song):
     try:
         resultdict = {}
-        results = conn.execute(select(Tags.c.tag, func.count().label('occurrences')).where(Tags.c.songID == song).group_by(Tags.c.tag))
+        results = conn.execute(select(TagCounts.c.tag, TagCounts.c.occurrences).where(and_(TagCounts.c.songID == song, TagCounts.c.occurrences > 0)))
         #Iterate through the results and store them in a dictionary
         for i in results:
             #Sets a key value pair in the dictionary, where the key is the tag and the value is the number of occurrences
@@ -415,6 +596,37 @@ def selectTagsFromSong(conn, song):
         return f"Error selecting tags for song with ID: {song}, error: {e}"
 
 
+# Purpose: Recomputes the TagCounts table from the Tags table.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The rebuild-tag-counts command in app.py.
+# System Context: Used to fill TagCounts for tags that existed before it did, or to repair it if it ever drifts.
+# Data Structures: N/A
+# Algorithms Used: Deletes the stored counts and inserts fresh ones from a GROUP BY over Tags, in one transaction.
+# Inputs: A database connection and optionally a song ID to only rebuild that song.
+# Outputs: A message with the number of counter rows written, or an error message.
+# Future Changes: N/A
+def rebuildTagCounts(conn, song=None):
+    try:
+        counts = select(Tags.c.songID, Tags.c.tag, func.count().label('occurrences')).group_by(Tags.c.songID, Tags.c.tag)
+        clear = TagCounts.delete()
+        if song is not None:
+            counts = counts.where(Tags.c.songID == song)
+            clear = clear.where(TagCounts.c.songID == song)
+        conn.execute(clear)
+        result = conn.execute(insert(TagCounts).from_select(["songID", "tag", "occurrences"], counts))
+        conn.commit()
+
+        return f"Rebuilt {result.rowcount} tag counts"
+    
+    except Exception as e:
+
+        conn.rollback()
+
+        return f"Error rebuilding tag counts: {e}"
+
+
 # Purpose: Returns all database information on a song.
 # Author: Ryan
 # Date Written: 5.1.25
@@ -437,6 +649,30 @@ def selectSong(conn, song):
         return f"Error selecting song with ID: {song}, error: {e}"
     
 
+# Purpose: Gets a page of songs in songID order.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: SearchIndex.load in search_index.py.
+# System Context: Lets the local search index read the whole Songs table a page at a time.
+# Data Structures: A list of rows with every Songs column.
+# Algorithms Used: Keyset pagination on the primary key, each page starts after the last songID of the one before.
+# Inputs: A database connection, the last songID already read or None to start, and the page size.
+# Outputs: A list of rows, or an error message.
+# Future Changes: N/A
+def selectSongsPage(conn, after=None, limit=1000):
+    try:
+        statement = select(Songs).order_by(Songs.c.songID).limit(limit)
+        if after is not None:
+            statement = statement.where(Songs.c.songID > after)
+
+        return conn.execute(statement).fetchall()
+    
+    except Exception as e:
+
+        return f"Error selecting songs after: {after}, error: {e}"
+    
+
 # Purpose: Gets all of a users tags
 # Author: Ryan
 # Date Written: 5.1.25
@@ -481,8 +717,80 @@ def selectUsersComments(conn, user):
         return f"Error selecting comments for user with ID: {user}, error: {e}"
 
 
+# Purpose: Gets a users tags together with the song each tag is on, all of them or one page at a time.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The user activity endpoints.
+# System Context: Replaces looking up the user's ID, then their tags, then calling selectSong for every tag.
+# Data Structures: A list of rows with tag, songID, name, image, and type.
+# Algorithms Used: Tags is joined to Users by username and left joined to Songs in one query, ordered by songID, which is
+# unique for each of a users tags. A page is read with keyset pagination, it starts right after the songID of the last
+# tag on the previous page. With yield_per the rows are streamed from a server side cursor in batches of that size
+# instead of all being read into memory.
+# Inputs: A database connection, a username, and optionally the songID of the last tag already seen, the page size, and
+# the streaming batch size.
+# Outputs: A list of tag rows (up to limit + 1 of them when a page size is given, the extra row only tells the caller
+# there is another page), an unread result to iterate over when yield_per is given, or an error message.
+# Future Changes: N/A
+def selectUsersTagsWithSongs(conn, username, after=None, limit=None, yield_per=None):
+    try:
+        statement = (select(Tags.c.tag, Tags.c.songID, Songs.c.name, Songs.c.image, Songs.c.type)
+                     .select_from(Tags.join(Users, Tags.c.userID == Users.c.userID)
+                                      .outerjoin(Songs, Tags.c.songID == Songs.c.songID))
+                     .where(Users.c.username == username)
+                     .order_by(Tags.c.songID))
+        if after is not None:
+            statement = statement.where(Tags.c.songID > after)
+        if limit is not None:
+            statement = statement.limit(limit + 1)
+        if yield_per is not None:
+            return conn.execute(statement.execution_options(yield_per=yield_per))
+
+        return conn.execute(statement).fetchall()
+    
+    except Exception as e:
+
+        return f"Error selecting tags for user: {username}, error: {e}"
+
+
+# Purpose: Gets a users comments together with the song each comment is on, all of them or one page at a time.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The user activity endpoints.
+# System Context: Replaces looking up the user's ID, then their comments, then calling selectSong three times per comment.
+# Data Structures: A list of rows with commentID, content, date_commented, songID, name, image, and type.
+# Algorithms Used: Comments is joined to Users by username and left joined to Songs in one query, ordered by commentID.
+# A page is read with keyset pagination, it starts right after the commentID of the last comment on the previous page.
+# With yield_per the rows are streamed from a server side cursor in batches of that size instead of all being read
+# into memory.
+# Inputs: A database connection, a username, and optionally the commentID of the last comment already seen, the page
+# size, and the streaming batch size.
+# Outputs: A list of comment rows (up to limit + 1 of them when a page size is given, the extra row only tells the caller
+# there is another page), an unread result to iterate over when yield_per is given, or an error message.
+# Future Changes: N/A
+def selectUsersCommentsWithSongs(conn, username, after=None, limit=None, yield_per=None):
+    try:
+        statement = (select(Comments.c.commentID, Comments.c.content, Comments.c.date_commented, Comments.c.songID, Songs.c.name, Songs.c.image, Songs.c.type)
+                     .select_from(Comments.join(Users, Comments.c.userID == Users.c.userID)
+                                          .outerjoin(Songs, Comments.c.songID == Songs.c.songID))
+                     .where(Users.c.username == username)
+                     .order_by(Comments.c.commentID))
+        if after is not None:
+            statement = statement.where(Comments.c.commentID > after)
+        if limit is not None:
+            statement = statement.limit(limit + 1)
+        if yield_per is not None:
+            return conn.execute(statement.execution_options(yield_per=yield_per))
+
+        return conn.execute(statement).fetchall()
+    
+    except Exception as e:
+
+        return f"Error selecting comments for user: {username}, error: {e}"
+
 
 
 # with engine.connect() as conn:
 #     print([i for i in (select_user_comments(conn, 1))])
-
@@ -0,0 +1,179 @@
+"""
+Author: Ryan
+Date: 10.18.26
+Filename: db_engine.py
+
+Purpose:
+This module creates the one SQLAlchemy engine, and so the one connection pool, that the whole backend shares.
+
+System Context:
+Part of the Backend system for the PlayBack project. app.py, main.py, and db.py all import the engine from here
+instead of building their own.
+
+Development History:
+- Written on: 10.18.26
+- Last revised on: 10.18.26
+
+Existence Rationale:
+Each module used to call create_engine with its own connection string, which gave every process three separate
+pools, two of which logged every SQL statement.
+
+Data Structures/ Algorithms:
+- engine.connect is wrapped to time how long each checkout waits for a connection.
+- A small lock-guarded counter object keeps those timings for pool_stats().
+Expected Input/Output:
+- Input: Database settings from the environment. Output: The shared engine and a dictionary of pool statistics.
+Future Extensions or Revisions:
+N/A
+"""
+
+from dotenv import load_dotenv
+import os
+import threading
+import time
+from sqlalchemy import create_engine, exc
+from sqlalchemy.pool import QueuePool
+
+#Database credentials to be used in the engine
+load_dotenv()
+db_password = os.getenv("DB_PASSWORD")
+db_user = 'root'
+db_host = '127.0.0.1'
+db_port = '3306'
+db_name = 'play_back_db'
+# DATABASE_URL can point the backend at a different database, such as a local SQLite file
+database_url = os.getenv("DATABASE_URL", f"mysql+pymysql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}")
+
+# Pool settings
+pool_size = int(os.getenv("DB_POOL_SIZE", 10))
+max_overflow = int(os.getenv("DB_MAX_OVERFLOW", 20))
+pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", 30))
+pool_recycle = int(os.getenv("DB_POOL_RECYCLE", 1800))
+pool_pre_ping = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Logging every statement is slow, so it is off unless DB_ECHO=true
+echo = os.getenv("DB_ECHO", "false").lower() == "true"
+
+
+# Purpose: Keeps track of how long connection checkouts wait on the pool.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: time_checkouts
+# System Context: Shows whether requests are waiting on database connections, which means the pool is too small.
+# Data Structures: Counters guarded by a lock.
+# Algorithms Used: N/A
+# Inputs: The wait time of each checkout.
+# Outputs: A dictionary from stats().
+# Future Changes: N/A
+class CheckoutTimer:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def record(self, waited, timed_out=False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def stats(self):
+        with self.lock:
+            return {"checkouts" : self.checkouts,
+                    "checkout_timeouts" : self.timeouts,
+                    "checkout_wait_ms_avg" : round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                    "checkout_wait_ms_max" : round(self.wait_max * 1000, 3)}
+
+
+checkout_timer = CheckoutTimer()
+
+
+# Purpose: Creates the shared engine from the settings above.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: Module import
+# System Context: The only place in the backend that calls create_engine.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: A database URL.
+# Outputs: A SQLAlchemy engine.
+# Future Changes: N/A
+def make_engine(url):
+    if url.startswith("sqlite") and (url.endswith(":memory:") or url.rstrip("/") == "sqlite:"):
+        #An in-memory SQLite database only exists inside one connection, so it cannot use a queue pool
+        return create_engine(url, echo=echo)
+
+    return time_checkouts(create_engine(url, echo=echo, poolclass=QueuePool, pool_size=pool_size, max_overflow=max_overflow,
+                                        pool_timeout=pool_timeout, pool_recycle=pool_recycle, pool_pre_ping=pool_pre_ping))
+
+
+# Purpose: Times every connection checkout of an engine.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: make_engine
+# System Context: Lets every existing "with engine.connect() as conn" and "with engine.begin() as conn" be measured
+# without changing it.
+# Data Structures: N/A
+# Algorithms Used: The engine's connect is wrapped, engine.begin goes through it too. The time covers waiting for a free
+# connection, and opening or pinging one. Only running out of pool_timeout counts as a timeout, a checkout that fails
+# because the database could not be reached is not counted.
+# Inputs: An engine with a queue pool.
+# Outputs: The same engine.
+# Future Changes: N/A
+def time_checkouts(new_engine):
+    connect = new_engine.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            connection = connect()
+
+        except exc.TimeoutError:
+
+            checkout_timer.record(time.perf_counter() - started, timed_out=True)
+            raise
+
+        checkout_timer.record(time.perf_counter() - started)
+
+        return connection
+
+    new_engine.connect = timed_connect
+    return new_engine
+
+
+engine = make_engine(database_url)
+
+
+# Purpose: Reports how busy the connection pool is.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The stats endpoint in app.py.
+# System Context: Used to tune DB_POOL_SIZE and DB_MAX_OVERFLOW.
+# Data Structures: A dictionary of pool statistics.
+# Algorithms Used: Utilization is the number of connections checked out over the most the pool will ever open.
+# Inputs: N/A
+# Outputs: A dictionary with the pool's size, how many connections are in use, and the checkout wait times.
+# Future Changes: N/A
+def pool_stats():
+    pool = engine.pool
+    result = checkout_timer.stats()
+    if isinstance(pool, QueuePool):
+        capacity = pool.size() + max(max_overflow, 0)
+        result.update({"pool_size" : pool.size(),
+                       "max_overflow" : max_overflow,
+                       "pool_timeout_s" : pool.timeout(),
+                       "checked_out" : pool.checkedout(),
+                       "idle" : pool.checkedin(),
+                       "overflow" : pool.overflow(),
+                       "utilization" : round(pool.checkedout() / capacity, 4) if capacity else 0.0})
+
+    return result
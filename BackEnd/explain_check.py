@@ -0,0 +1,220 @@
+"""
+ Author: Ryan
+ Date: 10.18.26
+ Filename: explain_check.py
+
+ Purpose: This script runs every query in db.py against the database and asks the database how it plans to run each
+          one with EXPLAIN. It fails if any query would read a whole table instead of using an index.
+
+ Where it fits: Run from the command line with "flask --app BackEnd/app.py explain-check" after changing a query or
+                the schema. The command exits with status 1 when a query falls back to a full table scan. The tests in
+                BackEnd/tests run it against a migrated SQLite database on every test run.
+
+ Written: 10.18.26
+ Revised: 10.18.26
+
+ Why it exists: A missing index does not show up until a table is large, this catches it while it is still small.
+
+ How it uses data structures and algorithms: The db.py functions are called with sample values on a connection whose
+                commits are ignored and which is rolled back at the end, so nothing is written. A SQLAlchemy event
+                listener records each statement they send, and each one is then run again with EXPLAIN.
+
+ Expected input: The shared database engine, with the schema migrated to the latest version.
+
+ Expected output: One line per checked statement and a list of the ones that scan a whole table.
+
+ Expected extensions/revisions: Every function added to db.py needs an entry in query_calls, the check fails if one
+                is missing.
+"""
+
+import inspect
+import sys
+from datetime import datetime
+from sqlalchemy import event
+import db
+
+# Sample values that the db.py functions are called with
+sample_song = "explain-check-song"
+sample_user = 1
+sample_username = "explain-check-user"
+sample_email = "explain-check@example.com"
+
+# Every db.py function that runs a query, with the arguments it is called with after the connection
+query_calls = {
+    "insertSong" : (sample_song, "Explain Check", "track"),
+    "insertSongs" : ([{"songID" : sample_song, "name" : "Explain Check", "type" : "track"}],),
+    "insertUser" : (sample_username, "password", sample_email),
+    "insertComment" : (sample_user, sample_song, "Explain Check"),
+    "deleteComment" : (1, sample_user),
+    "selectUserFromEmail" : (sample_email,),
+    "selectUserIDFromUsername" : (sample_username,),
+    "selectUserFromID" : (sample_user,),
+    "selectPostsPage" : (sample_song, sample_user, (datetime(2025, 1, 1), 1), 50, 1),
+    "selectReplyCounts" : ([1, 2, 3],),
+    "checkUserExistence" : (sample_username, sample_email),
+    "updateUserPassword" : (sample_user, "password"),
+    "insertTag" : ("happy", sample_song, sample_user),
+    "selectUsersTag" : (sample_song, sample_user),
+    "selectTagsFromSong" : (sample_song,),
+    "rebuildTagCounts" : (),
+    "selectSong" : (sample_song,),
+    "selectSongsPage" : (sample_song, 50),
+    "selectUsersTags" : (sample_user,),
+    "selectUsersComments" : (sample_user,),
+    "selectUsersTagsWithSongs" : (sample_username, sample_song, 50),
+    "selectUsersCommentsWithSongs" : (sample_username, 1, 50)
+}
+
+# Functions that read a whole table on purpose
+full_scan_allowed = {"rebuildTagCounts"}
+
+# Functions in db.py that take a connection but never run a query of their own
+not_queries = {"buildUpsert", "changeTagCounts"}
+
+
+# Purpose: A stand-in for a database connection that ignores commit and rollback calls.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: captureQueries
+# System Context: Lets the db.py functions run inside one transaction that the check rolls back when it is done.
+# Data Structures: N/A
+# Algorithms Used: Every other attribute is passed through to the real connection.
+# Inputs: A SQLAlchemy connection.
+# Outputs: N/A
+# Future Changes: N/A
+class NoCommitConnection:
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getattr__(self, name):
+
+        return getattr(self.conn, name)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+# Purpose: Finds db.py functions that take a connection but have no entry in query_calls.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: runCheck
+# System Context: Makes sure new queries are not left out of the check.
+# Data Structures: A list of function names.
+# Algorithms Used: Looks at the first parameter of every function defined in db.py.
+# Inputs: N/A
+# Outputs: The names of the functions that are missing.
+# Future Changes: N/A
+def uncheckedFunctions():
+    missing = []
+    for name, function in inspect.getmembers(db, inspect.isfunction):
+        if function.__module__ != db.__name__ or name in not_queries:
+            continue
+        parameters = list(inspect.signature(function).parameters)
+        if parameters and parameters[0] == "conn" and name not in query_calls:
+            missing.append(name)
+
+    return missing
+
+
+# Purpose: Runs every db.py function in query_calls and records the statements it sends.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: runCheck
+# System Context: Gathers the exact SQL that the application runs, with the database's own parameter style.
+# Data Structures: A list of (function name, statement, parameters) tuples.
+# Algorithms Used: A before_cursor_execute listener is attached while the functions run. Inserts are skipped since
+# they never search a table, except INSERT ... SELECT.
+# Inputs: An open connection.
+# Outputs: The recorded statements.
+# Future Changes: N/A
+def captureQueries(conn):
+    captured = []
+    current = [None]
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        text = statement.lstrip().upper()
+        if text.startswith("INSERT") and " SELECT " not in text:
+            return
+        if text.startswith(("SELECT", "INSERT", "UPDATE", "DELETE")):
+            captured.append((current[0], statement, parameters))
+
+    event.listen(conn, "before_cursor_execute", record)
+    try:
+        wrapped = NoCommitConnection(conn)
+        for name, arguments in query_calls.items():
+            current[0] = name
+            result = getattr(db, name)(wrapped, *arguments)
+            #Some functions hand back a result that has not been read yet
+            if hasattr(result, "fetchall"):
+                result.fetchall()
+    finally:
+        event.remove(conn, "before_cursor_execute", record)
+
+    return captured
+
+
+# Purpose: Runs EXPLAIN on one statement and returns the tables it would read in full.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: runCheck
+# System Context: Understands the EXPLAIN output of MySQL and SQLite.
+# Data Structures: A list of table names.
+# Algorithms Used: On MySQL a plan row with access type ALL is a full table scan. On SQLite a "SCAN table" step that
+# does not use an index is.
+# Inputs: An open connection, the statement, and its parameters.
+# Outputs: The tables that would be scanned in full.
+# Future Changes: N/A
+def fullScans(conn, statement, parameters):
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+
+        return [row[3].split()[1] for row in rows if row[3].startswith("SCAN ") and "INDEX" not in row[3]
+                and not row[3].startswith("SCAN CONSTANT")]
+
+    rows = conn.exec_driver_sql("EXPLAIN " + statement, parameters).mappings().fetchall()
+
+    return [row["table"] for row in rows if row.get("type") == "ALL"]
+
+
+# Purpose: Runs the whole check.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The explain-check command in app.py.
+# System Context: Fails when a query in db.py is missing from the check or would scan a whole table.
+# Data Structures: A list of problem descriptions.
+# Algorithms Used: N/A
+# Inputs: The database engine.
+# Outputs: A list of problems, empty when every query uses an index.
+# Future Changes: N/A
+def runCheck(engine):
+    problems = [f"{name} is not covered by explain_check.query_calls" for name in uncheckedFunctions()]
+    with engine.connect() as conn:
+        conn.begin()
+        try:
+            captured = captureQueries(conn)
+            for name, statement, parameters in captured:
+                scanned = fullScans(conn, statement, parameters)
+                print(f"{'SCAN' if scanned else 'ok  '} {name}: {' '.join(statement.split())[:100]}")
+                if scanned and name not in full_scan_allowed:
+                    problems.append(f"{name} scans {', '.join(scanned)}: {' '.join(statement.split())}")
+        finally:
+            conn.rollback()
+
+    return problems
+
+
+if __name__ == "__main__":
+    from db_engine import engine
+    found = runCheck(engine)
+    for problem in found:
+        print(problem)
+    sys.exit(1 if found else 0)
@@ -11,7 +11,7 @@ Part of the Backend system for the PlayBack project. This script enables the fro
 
 Development History:  
 - Written on: 4.1.25  
-- Last revised on: 5.4.25 
+- Last revised on: 10.18.26 
 
 Existence Rationale:  
 Centralizes all Spotify-related API requests to ensure modularity and reuse of token handling, header generation, and data fetching logic across the backend system.  
@@ -19,6 +19,10 @@ Centralizes all Spotify-related API requests to ensure modularity and reuse of t
 Data Structures/ Algorithms:
 - Uses dictionaries to structure API responses for artists, tracks, and albums. And simple iterations through groups 
 of data.
+- The access token is cached by a TokenManager until shortly before it expires and is refreshed by a single thread.
+- All requests are sent through the pooled session in spotify_client.py.
+- Artist, album, and track lookups and search results are kept in TTL + LRU caches from cache.py.
+- Songs found by searches are written to the database in batches by a write-behind queue.
 Expected Input/Output:
 - Input: Search queries, artist/track/album IDs. Output: JSON formatted data containing search results, artist details, track information, and album details.
 Future Extensions or Revisions:  
@@ -29,57 +33,206 @@ from dotenv import load_dotenv
 import os
 import base64
 import json
-from requests import post, get
-import json
-from sqlalchemy import create_engine
-from db import insertSong
+import asyncio
+import threading
+import time
+from spotify_client import spotify_post, spotify_get_async, run_sync, iterate_sync, on_unauthorized, api_url, accounts_url
+from db_engine import engine
+from db import insertSongs
+from cache import TTLCache, SearchCache
+from write_behind import make_write_behind
+from search_index import search_index
 
 load_dotenv() # Load environment variables from .env file
-db_password = os.getenv("DB_PASSWORD")
-db_user = 'root'
-db_host = '127.0.0.1'
-db_port = '3306'
-db_name = 'play_back_db'
-
-# Create a connection to the MySQL database using SQLAlchemy
-engine = create_engine(f"mysql+pymysql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}", echo = True)
 # Secure client credentials for API access that are stored in .env files are grabbed here.
 client_id = os.getenv("CLIENT_ID")
 client_secret = os.getenv("CLIENT_SECRET")
+# The result key and the Spotify type for each part of a broad search
+broad_search_types = (("artists", "artist"), ("albums", "album"), ("tracks", "track"))
+
+# Entity caches keyed by Spotify ID. Entries are fresh for their TTL, then served stale for up to
+# ENTITY_CACHE_STALE_TTL more seconds while they are reloaded in the background.
+entity_cache_size = int(os.getenv("ENTITY_CACHE_SIZE", 2000))
+entity_cache_stale_ttl = int(os.getenv("ENTITY_CACHE_STALE_TTL", 86400))
+artist_cache = TTLCache("artist", int(os.getenv("ARTIST_CACHE_TTL", 3600)), entity_cache_size, entity_cache_stale_ttl)
+album_cache = TTLCache("album", int(os.getenv("ALBUM_CACHE_TTL", 21600)), entity_cache_size, entity_cache_stale_ttl)
+track_cache = TTLCache("track", int(os.getenv("TRACK_CACHE_TTL", 21600)), entity_cache_size, entity_cache_stale_ttl)
+entity_caches = {"artist" : artist_cache, "album" : album_cache, "track" : track_cache}
+# Most IDs Spotify accepts in one several-items lookup for each type
+batch_sizes = {"track" : 50, "album" : 20, "artist" : 50}
+# Tracks per page of an album's track list, Spotify's maximum, and how many pages of one album are fetched at once
+album_page_size = 50
+album_page_concurrency = int(os.getenv("ALBUM_PAGE_CONCURRENCY", 4))
+# Search results keyed by normalized query, type, and limit
+search_cache = SearchCache("search", int(os.getenv("SEARCH_CACHE_TTL", 600)), int(os.getenv("SEARCH_CACHE_SIZE", 5000)))
+
+
+# Seconds before expiry at which a cached token is considered due for a refresh.
+token_refresh_margin = int(os.getenv("TOKEN_REFRESH_MARGIN", 300))
+
+
+# Purpose: Writes a batch of songs found by searches to the Songs table.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The song_writer write-behind queue, from its background thread.
+# System Context: Keeps the Songs table filled with everything users have searched for.
+# Data Structures: A list of song dictionaries.
+# Algorithms Used: N/A
+# Inputs: The batch of songs.
+# Outputs: N/A, raises if the batch could not be written so the queue can count the failure.
+# Future Changes: N/A
+def write_songs(songs):
+    with engine.connect() as conn:
+        result = insertSongs(conn, songs)
+    if result.startswith("Error"):
+        raise RuntimeError(result)
+
+
+# Songs found by searches are written to the database in batches off of the request thread
+song_writer = make_write_behind("songs", write_songs, "songID",
+                                batch_size=int(os.getenv("SONG_WRITE_BATCH_SIZE", 200)),
+                                flush_interval=float(os.getenv("SONG_WRITE_INTERVAL", 2.0)),
+                                max_queue=int(os.getenv("SONG_WRITE_QUEUE_SIZE", 10000)))
+
+
+# Purpose: Requests a brand new token from the Spotify accounts service.
+# Author: Ryan
+# Date Written: 4.1.25
+# Last Revised: 10.18.26
+# Called By: The TokenManager whenever the cached token is missing or close to expiring.
+# System Context: Used to generate a key that is used in every spotify API request to authenticate the client.
+# Data Structures: Various JSON structures are used to handle the response from the Spotify API.
+# Algorithms Used: N/A
+# Inputs: N/A
+# Outputs: A tuple of the token and the number of seconds it stays valid for.
+# Future Changes: If the API changes or the authentication method changes, this function may need to be updated.
+def request_token():
+    # Encode client credentials for Basic Authentication
+    auth_string = client_id + ":" + client_secret
+    auth_bytes = auth_string.encode("utf-8")
+    auth_base64 = str(base64.b64encode(auth_bytes), "utf-8")
+
+    # Set the API URL for token request
+    url = accounts_url + "/token"
+    headers = {
+        "Authorization": "Basic " + auth_base64,
+        "Content-Type": "application/x-www-form-urlencoded"
+    }
+    data = {"grant_type": "client_credentials"}
+    # Send POST request to get the token
+    result = spotify_post(url, headers=headers, data=data)
+    json_result = json.loads(result.content)
+
+    return json_result["access_token"], int(json_result.get("expires_in", 3600))
+
+
+# Purpose: Keeps a single Spotify token in memory and hands it out until it is about to expire.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: get_token
+# System Context: Stops every endpoint from making its own round trip to the accounts service before calling the API.
+# Data Structures: The token and its expiry time are kept together in one tuple so readers always see a matching pair.
+# A lock makes sure only one thread is refreshing at a time.
+# Algorithms Used: While the token is fresh it is returned directly. Inside the refresh margin the old token is still
+# returned and a background thread fetches the new one. Only when there is no usable token do callers wait on the refresh.
+# Inputs: A function that returns (token, expires_in) and the refresh margin in seconds.
+# Outputs: A valid token, or None if one could not be fetched.
+# Future Changes: N/A
+class TokenManager:
+
+    def __init__(self, fetch, refresh_margin):
+        self.fetch = fetch
+        self.refresh_margin = refresh_margin
+        #(token, expiry time on the monotonic clock)
+        self.state = (None, 0.0)
+        self.refresh_lock = threading.Lock()
+
+    def get(self):
+        token, expires_at = self.state
+        now = time.monotonic()
+        if token and now < expires_at - self.refresh_margin:
+            return token
+        if token and now < expires_at:
+            #Still valid, so the caller keeps going while one thread refreshes in the background
+            if self.refresh_lock.acquire(blocking=False):
+                threading.Thread(target=self.refresh_and_release, daemon=True).start()
+            return token
+        #No usable token, callers have to wait, but only one of them does the actual request
+        with self.refresh_lock:
+            token, expires_at = self.state
+            if token and time.monotonic() < expires_at - self.refresh_margin:
+                return token
+            self.refresh()
+        token, expires_at = self.state
+        return token if token and time.monotonic() < expires_at else None
+
+    def refresh(self):
+        try:
+            token, expires_in = self.fetch()
+            self.state = (token, time.monotonic() + expires_in)
+        except Exception as e:
+            print(f"Error getting token: {e}")
+
+    def refresh_and_release(self):
+        try:
+            self.refresh()
+        finally:
+            self.refresh_lock.release()
+
+    #The same as get, but a caller that has to wait for the refresh waits on a worker thread instead of its event loop
+    async def get_async(self):
+        token, expires_at = self.state
+        if token and time.monotonic() < expires_at:
+            return self.get()
+        return await asyncio.to_thread(self.get)
+
+    #Forgets the token if it is still the one that was rejected, so only the first of several rejected requests
+    #causes a refresh
+    def invalidate(self, rejected=None):
+        if rejected is None or self.state[0] == rejected:
+            self.state = (None, 0.0)
+
+
+token_manager = TokenManager(request_token, token_refresh_margin)
+
+
+# Purpose: Replaces a token Spotify rejected with a 401.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: send_get in spotify_client.py, registered below with on_unauthorized.
+# System Context: A token revoked before it expires would otherwise keep being sent until the refresh margin.
+# Data Structures: N/A
+# Algorithms Used: See TokenManager.invalidate and TokenManager.get_async.
+# Inputs: The Authorization header that was rejected.
+# Outputs: A new token, or None if one could not be fetched.
+# Future Changes: N/A
+async def renew_rejected_token(authorization):
+    token_manager.invalidate((authorization or "").removeprefix("Bearer "))
+
+    return await get_token_async()
+
+
+on_unauthorized(renew_rejected_token)
 
 
 # Purpose: Used to generate a token for API access
 # Author: Ryan
 # Date Written: 4.1.25
-# Last Revised: 5.4.25
+# Last Revised: 10.18.26
 # Called By: Just about every function that needs to access the Spotify API
 # System Context: Used to generate a key that is used in every spotify API request to authenticate the client.
-# Data Structures: Various JSON structures are used to handle the response from the Spotify API.
+# Data Structures: N/A
 # Algorithms Used: N/A
 # Inputs: N/A
-# Outputs: A token that can be used to query the Spotify API
-# Future Changes: As of 5.4.25 no changes are necessary, but if the API changes or the authentication method changes, this function may need to be updated.
+# Outputs: A token that can be used to query the Spotify API, served from the token cache when possible.
+# Future Changes: If the API changes or the authentication method changes, this function may need to be updated.
 def get_token():
     try:
-        # Encode client credentials for Basic Authentication
-        auth_string = client_id + ":" + client_secret
-        auth_bytes = auth_string.encode("utf-8")
-        auth_base64 = str(base64.b64encode(auth_bytes), "utf-8")
-
-        # Set the API URL for token request
-        url = "https://accounts.spotify.com/api/token"
-        headers = {
-            "Authorization": "Basic " + auth_base64,
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
-        data = {"grant_type": "client_credentials"}
-        # Send POST request to get the token
-        result = post(url, headers=headers, data=data)
-        json_result = json.loads(result.content)
-        # Check if the token was successfully retrieved
-        token = json_result["access_token"]
-
-        return token
+
+        return token_manager.get()
     
     except Exception as e:
 
@@ -87,6 +240,30 @@ def get_token():
 
         return None
 
+
+# Purpose: The async version of get_token.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The async endpoints in the backend.
+# System Context: A request that arrives when there is no usable token waits for the refresh without blocking the
+# event loop it runs on.
+# Data Structures: N/A
+# Algorithms Used: See TokenManager.get_async.
+# Inputs: N/A
+# Outputs: The same as get_token.
+# Future Changes: N/A
+async def get_token_async():
+    try:
+
+        return await token_manager.get_async()
+
+    except Exception as e:
+
+        print(f"Error getting token: {e}")
+
+        return None
+
 # Purpose: Creates an authorization header for API requests
 # Author: Ryan
 # Date Written: 4.1.25
@@ -112,52 +289,99 @@ def get_auth_header(token):
 # Purpose: Used to return 5 results of a search query for artists, albums, or tracks.
 # Author: Ryan
 # Date Written: 4.1.25
-# Last Revised: 5.4.25
-# Called By: The broad search endpoint, and the search endpoint in the frontend.
+# Last Revised: 10.18.26
+# Called By: cached_search_async, when the search cache and the local search index cannot answer the search.
 # System Context: Used to show results of a query, contains spare information, mostly for searching
 # Data Structures: A list of dictionaries is used to store the results of the search query.
 # Algorithms Used: The API results are iterated through to retrieve the relevant information for each item.
 # Inputs: API token, a search value, the type of media one if looking for, and the limit on the number of results.
-# Outputs: A list of deictionaries containing relevant information about the media found in the search query.
-# Future Changes: As of 5.4.25 no changes are necessary, but if the API changes or the search functionality changes, this function may need to be updated.
-def general_search(token, search, type, limit):
-    try:
-        #Setting up the URL and headers for the API request
-        url = "https://api.spotify.com/v1/search"
-        headers = get_auth_header(token)
-        query = f"?q={search}&type={type}&limit={limit}"
-        query_url = url + query
-        
-        # Send GET request to the search endpoint
-        result = get(query_url, headers=headers)
-        # Parse the JSON response
-        json_result = json.loads(result.content).get(type + 's',{}).get("items",[])
-        
-        # Check if any results are found
-        if len(json_result) == 0:
+# Outputs: A list of deictionaries containing relevant information about the media found in the search query, None if
+# nothing was found. Errors from the API are raised instead of being returned.
+# Future Changes: If the API changes or the search functionality changes, this function may need to be updated.
+async def search_media_async(token, search, type, limit):
+    #Setting up the URL and headers for the API request
+    url = api_url + "/search"
+    headers = get_auth_header(token)
+    query = f"?q={search}&type={type}&limit={limit}"
+    query_url = url + query
+    
+    # Send GET request to the search endpoint
+    result = await spotify_get_async(query_url, headers=headers)
+    result.raise_for_status()
+    # Parse the JSON response
+    json_result = json.loads(result.content).get(type + 's',{}).get("items",[])
+    
+    # Check if any results are found
+    if len(json_result) == 0:
 
-            print("No results found")
+        print("No results found")
 
-            return None
-        
-        else:
-            #Puts data found into a dictionary with Name:(artist/track/album), image: pic if it exists, and type: type of media
-            results_list = [{"name": item.get("name", "NoName"),
-                            "image" : item["images"][-1]["url"] if isinstance(item.get("images"), list) and item["images"] else "",
-                            "type" : type,
-                            "artist" : [artist.get("name", '') for artist in item.get("artists", [{}])],
-                            "id" : item.get("id", ""),
-                            "album" : item.get("album", {}).get("images",[{"url" : "images/no_result.png"}])[-1].get("url","")} for item in json_result]
-            # Populates the database with songs that are found in the results
-            with engine.connect() as conn:
-                for i in results_list:
-                    #Since a tracks data is stored differently by the API, its insertoin is handled differently
-                    if i.get("type") == "track":
-                        insertSong(conn, i.get("id"), i.get("name"), i.get("type"), i.get("album"))
-                    else:
-                        insertSong(conn, i.get("id"), i.get("name"), i.get("type"), i.get("image"))
-
-            return results_list
+        return None
+    
+    else:
+        #Puts data found into a dictionary with Name:(artist/track/album), image: pic if it exists, and type: type of media
+        results_list = [{"name": item.get("name", "NoName"),
+                        "image" : item["images"][-1]["url"] if isinstance(item.get("images"), list) and item["images"] else "",
+                        "type" : type,
+                        "artist" : [artist.get("name", '') for artist in item.get("artists", [{}])],
+                        "id" : item.get("id", ""),
+                        "album" : item.get("album", {}).get("images",[{"url" : "images/no_result.png"}])[-1].get("url","")} for item in json_result]
+        # Queues the songs found in the results to be written to the database in the background
+        #Since a tracks data is stored differently by the API, its image comes from the album
+        song_writer.enqueue([{"songID" : i.get("id"),
+                              "name" : i.get("name"),
+                              "type" : i.get("type"),
+                              "image" : i.get("album") if i.get("type") == "track" else i.get("image"),
+                              "artists" : i.get("artist")} for i in results_list])
+        #The local search index is kept up to date with the same songs
+        search_index.add(results_list)
+
+        return results_list
+
+
+# Purpose: Runs a search through the search cache and the local search index, only going to Spotify when neither can answer it.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: general_search_async and broad_search_results_async.
+# System Context: The search bar sends a search on every keystroke, most of which can be answered from earlier searches
+# or from the songs already stored in the database.
+# Data Structures: A list of result dictionaries, the same as search_media_async.
+# Algorithms Used: See SearchCache.lookup in cache.py and SearchIndex.search in search_index.py. The index only answers
+# when it has a full limit of matches, otherwise Spotify is searched. Searches with no results are cached too, failed
+# searches are not.
+# Inputs: API token, a search value, the type of media, and the limit on the number of results.
+# Outputs: A list of result dictionaries, empty if nothing was found. Errors from the API are raised.
+# Future Changes: N/A
+async def cached_search_async(token, search, type, limit):
+    found, results = search_cache.lookup(search, type, limit)
+    if found:
+        return results or []
+    search_index.ensure_loaded(engine)
+    results = search_index.search(search, type, limit)
+    if results is None:
+        results = await search_media_async(token, search, type, limit)
+        search_cache.store(search, type, limit, results)
+
+    return results or []
+
+
+# Purpose: Used to return 5 results of a search query for artists, albums, or tracks.
+# Author: Ryan
+# Date Written: 4.1.25
+# Last Revised: 10.18.26
+# Called By: The search endpoint in the backend.
+# System Context: Used to show results of a query, contains spare information, mostly for searching
+# Data Structures: A list of dictionaries is used to store the results of the search query.
+# Algorithms Used: N/A
+# Inputs: API token, a search value, the type of media one if looking for, and the limit on the number of results.
+# Outputs: A list of deictionaries containing relevant information about the media found in the search query, empty if
+# nothing was found, or None if the search failed.
+# Future Changes: If the API changes or the search functionality changes, this function may need to be updated.
+async def general_search_async(token, search, type, limit):
+    try:
+
+        return await cached_search_async(token, search, type, limit)
         
     except Exception as e:
 
@@ -165,40 +389,230 @@ def general_search(token, search, type, limit):
 
         return None
 
-    
+
+# Purpose: Formats the Spotify data for an artist and their top tracks into the dictionary the artist page uses.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: fetch_artist_async and fetch_batch_async.
+# System Context: Shared so an artist looked up on its own and one looked up in a batch come out the same.
+# Data Structures: A dictionary with artist information, including a list of an artist's top tracks.
+# Algorithms Used: API query results are iterated through and used to populate the result dictionary.
+# Inputs: The artist object and the top tracks response from the Spotify API.
+# Outputs: Dictionary containing artist information, including name, followers, image, genres, and top tracks.
+# Future Changes: N/A
+def format_artist(dataresult, trackresult):
+    results_list = {"artistname" : dataresult.get("name","NoName"),
+                    "followers" : dataresult.get("followers", {}).get("total", 0),
+                    "artistimage" : dataresult.get("images",[{"url" : "images/no_result.png"}])[0].get("url", ""),
+                    "genres" : dataresult.get("genres",[]),
+                    #Iterates through top track results and adds relevant information to nested list.
+                    "toptracks" : [[item.get("name","NoName"),item.get("id","NoID"),item.get("album",{}).get("images",[{"url" : "images/no_result.png"}])[0].get("url", ""),item.get("album", {}).get("id", "NoAlbumID")] for item in trackresult.get("tracks",[])]
+                    }
+
+    return results_list
+
+
+# Purpose: Formats the Spotify data for a track into the dictionary the track page uses.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: fetch_track_async and fetch_batch_async.
+# System Context: Shared so a track looked up on its own and one looked up in a batch come out the same.
+# Data Structures: A dictionary containing track information, including track name, album type, album name, album ID, image URL, release date, and artists stored in a list.
+# Algorithms Used: The artists are iterated through using a loop and list comprehension to create a list of artist names and IDs.
+# Inputs: The track object from the Spotify API.
+# Outputs: Information on a track.
+# Future Changes: N/A
+def format_track(result):
+    results_list = {"trackname" : result.get("name", "NoName"),
+                    "trackalbumtype" : result.get("album", {}).get("album_type", "NoAlbumType"),
+                    "trackalbumname" : result.get("album", {}).get("name", "NoAlbumName"),
+                    "trackalbumid" : result.get("album", {}).get("id", "NoAlbumID"),
+                    "trackimage" : result.get("album", {}).get("images", [{"url" : "images/no_result.png"}])[0].get("url",""),
+                    "trackreleasedate" : result.get("album", {}).get("release_date","NoRelaseDate"),
+                    "trackartists" : [[item.get("name", "NoName"),item.get("id","NoID")] for item in result.get("artists",{})]
+                    }
+
+    return results_list
+
+
+# Purpose: Formats the Spotify data for an album into the dictionary the album page uses.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: fetch_album_async and fetch_batch_async.
+# System Context: Shared so an album looked up on its own and one looked up in a batch come out the same.
+# Data Structures: A dictionary with album information, including album name, type, image URL, release date, an artists list, and a tracks list.
+# Algorithms Used: List comprehension is used to create lists of artists and tracks from the API response via a for loop.
+# Inputs: The album object from the Spotify API.
+# Outputs: A dictionary containing album information, including album name, type, total tracks, image URL, release date, artists, and tracks.
+# Future Changes: N/A
+def format_album(result):
+    results_list = {"albumname" : result.get("name", "NoName"),
+                    "albumtype" : result.get("album_type", "NoAlbumType"),
+                    "tracknumber" : result.get("total_tracks", 0),
+                    "albumimage" : result.get("images", [{"url" : "images/no_result.png"}])[0].get("url", ""),
+                    "albumreleasedate" : result.get("release_date","NoReleaseDate"),
+                    "albumartists" : [[item.get("name","NoName"),item.get("id","NoID")] for item in result.get("artists",[])],
+                    "albumtracks" : format_album_tracks(result.get("tracks", {}).get("items", []))
+                    }
+
+    return results_list
+
+
+# Purpose: Formats the tracks of an album into the [name, id] pairs the album page lists.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: format_album and album_track_pages_async.
+# System Context: N/A
+# Data Structures: A list of [track name, track ID] lists.
+# Algorithms Used: N/A
+# Inputs: Simplified track objects from the Spotify API.
+# Outputs: The list of pairs.
+# Future Changes: N/A
+def format_album_tracks(items):
+
+    return [[item.get("name","NoTrackName"),item.get("id","NoTrackID")] for item in items]
+
+
+# Purpose: Fetches one page of an album's track list.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: complete_album_tracks_async and album_track_pages_async.
+# System Context: N/A
+# Data Structures: The Spotify paging object, with items, total, and next.
+# Algorithms Used: The semaphore bounds how many pages of one album are requested at the same time.
+# Inputs: A token, the album ID, the offset of the page, and the semaphore.
+# Outputs: The offset and the paging object. Errors from the API are raised.
+# Future Changes: N/A
+async def fetch_album_tracks_page_async(token, id, offset, semaphore):
+    async with semaphore:
+        result = await spotify_get_async(f"{api_url}/albums/{id}/tracks", headers=get_auth_header(token),
+                                         params={"offset" : offset, "limit" : album_page_size})
+    result.raise_for_status()
+
+    return offset, json.loads(result.content)
+
+
+# Purpose: Works out the offsets of the pages of an album's track list that come after the first.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: complete_album_tracks_async and album_track_pages_async.
+# System Context: Spotify sends only the first page of tracks with an album, with the total and a link to the next page.
+# Data Structures: A list of offsets.
+# Algorithms Used: N/A
+# Inputs: The paging object of the first page.
+# Outputs: The offsets still to fetch, empty when the first page holds every track.
+# Future Changes: N/A
+def remaining_track_offsets(first_page):
+    fetched = len(first_page.get("items", []))
+    if not first_page.get("next") or not fetched:
+        return []
+
+    return list(range(fetched, first_page.get("total", 0), album_page_size))
+
+
+# Purpose: Fills in the rest of an album's track list when it is longer than one page.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: fetch_album_async and fetch_batch_async.
+# System Context: Without it long albums and box sets only listed their first 50 tracks.
+# Data Structures: The Spotify album object, changed in place.
+# Algorithms Used: Every remaining page is requested at once, at most album_page_concurrency at a time, and the pages
+# are joined in offset order.
+# Inputs: A token, the album ID, and the album object.
+# Outputs: N/A, errors from the API are raised.
+# Future Changes: N/A
+async def complete_album_tracks_async(token, id, album):
+    tracks = album.get("tracks") or {}
+    offsets = remaining_track_offsets(tracks)
+    if not offsets:
+        return
+    semaphore = asyncio.Semaphore(album_page_concurrency)
+    pages = await asyncio.gather(*[fetch_album_tracks_page_async(token, id, offset, semaphore) for offset in offsets])
+    for offset, page in sorted(pages, key=lambda page: page[0]):
+        tracks["items"].extend(page.get("items", []))
+    tracks["next"] = None
+
+
+# Purpose: Produces an album's track list a page at a time, in the order the pages arrive.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: stream_album_tracks
+# System Context: Lets the album page show the first tracks of a long album before the rest have been fetched.
+# Data Structures: Dictionaries with the offset of the page, the total number of tracks, and the [name, id] pairs.
+# Algorithms Used: The first page gives the total, then the remaining pages are requested at once, at most
+# album_page_concurrency at a time, and each is yielded as soon as it finishes.
+# Inputs: A token and the album ID.
+# Outputs: Yields one dictionary per page. Errors from the API are raised.
+# Future Changes: N/A
+async def album_track_pages_async(token, id):
+    semaphore = asyncio.Semaphore(album_page_concurrency)
+    offset, first_page = await fetch_album_tracks_page_async(token, id, 0, semaphore)
+    total = first_page.get("total", 0)
+    yield {"offset" : 0, "total" : total, "tracks" : format_album_tracks(first_page.get("items", []))}
+    pending = [asyncio.ensure_future(fetch_album_tracks_page_async(token, id, offset, semaphore))
+               for offset in remaining_track_offsets(first_page)]
+    try:
+        for next_page in asyncio.as_completed(pending):
+            offset, page = await next_page
+            yield {"offset" : offset, "total" : total, "tracks" : format_album_tracks(page.get("items", []))}
+
+    finally:
+        #Stops fetching pages nobody will read when the stream ends early
+        for task in pending:
+            task.cancel()
+
+
+# Purpose: Synchronous version of album_track_pages_async.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The album track stream endpoint in the backend.
+# System Context: Flask streams from ordinary generators.
+# Data Structures: N/A
+# Algorithms Used: See iterate_sync in spotify_client.py.
+# Inputs: A token and the album ID.
+# Outputs: Yields one dictionary per page.
+# Future Changes: N/A
+def stream_album_tracks(token, id):
+
+    return iterate_sync(album_track_pages_async(token, id))
+
 
 # Purpose: Used to find detailed information about an artist, including their top tracks and genres.
 # Author: Ryan
 # Date Written: 4.1.25
-# Last Revised: 5.4.25
-# Called By: The artist search endpoint in the frontend.
+# Last Revised: 10.18.26
+# Called By: artist_search_async, when the artist is not in the cache or its entry is being refreshed.
 # System Context: Used to display more specific information about an artist, including their top tracks and genres on the artist page.
 # Data Structures: A dictionary with artist information, including a list of an artist's top tracks.
-# Algorithms Used: API query results are iterated through and used to populate the result dictionary,
+# Algorithms Used: The artist and top tracks requests are sent at the same time. API query results are iterated through
+# and used to populate the result dictionary,
 # Inputs: A token for API access and an artist ID to search for.
 # Outputs: Dictionary containing artist information, including name, followers, image, genres, and top tracks.
 # Future Changes: As of 5.4.25 no changes are necessary, but if the API changes or the artist search functionality changes, this function may need to be updated.
-def artist_search(token, id):
+async def fetch_artist_async(token, id):
     try:
         # Setting up the URL for the artist data and top tracks
-        artist_data_url = f"https://api.spotify.com/v1/artists/{id}"
+        artist_data_url = f"{api_url}/artists/{id}"
         artist_tracks_url = artist_data_url + "/top-tracks"
         headers = get_auth_header(token)
-        artist_result = get(artist_data_url, headers=headers)
-        track_result = get(artist_tracks_url, headers=headers)
+        artist_result, track_result = await asyncio.gather(spotify_get_async(artist_data_url, headers=headers),
+                                                           spotify_get_async(artist_tracks_url, headers=headers))
+        artist_result.raise_for_status()
+        track_result.raise_for_status()
         dataresult = json.loads(artist_result.content)
         trackresult = json.loads(track_result.content)
         
-        # Process and format album data into a dictionary
-        results_list = {"artistname" : dataresult.get("name","NoName"),
-                        "followers" : dataresult.get("followers", {}).get("total", 0),
-                        "artistimage" : dataresult.get("images",[{"url" : "images/no_result.png"}])[0].get("url", ""),
-                        "genres" : dataresult.get("genres",[]),
-                        #Iterates through top track results and adds relevant information to nested list.
-                        "toptracks" : [[item.get("name","NoName"),item.get("id","NoID"),item.get("album",{}).get("images",[{"url" : "images/no_result.png"}])[0].get("url", ""),item.get("album", {}).get("id", "NoAlbumID")] for item in trackresult.get("tracks",[])]
-                        }
-        
-        return results_list
+
+        return format_artist(dataresult, trackresult)
     
     except Exception as e:
 
@@ -210,73 +624,57 @@ def artist_search(token, id):
 # Purpose: Searches for detailed information about a track, including its album and artists.
 # Author: Ryan
 # Date Written: 4.1.25
-# Last Revised: 5.4.25
-# Called By: The track search endpoint in the backend.
+# Last Revised: 10.18.26
+# Called By: track_search_async, when the track is not in the cache or its entry is being refreshed.
 # System Context: Used to display detailed information about a track, including its album and artists on the track page.
 # Data Structures: A dictionary containing track information, including track name, album type, album name, album ID, image URL, release date, and artists stored in a list.
 # Algorithms Used: The artists are iterated through using a loop and list comprehension to create a list of artist names and IDs.
 # Inputs: A token and track ID to search for.
-# Outputs: Information on a track.
+# Outputs: Information on a track, or None if the request failed.
 # Future Changes: 
-def track_search(token, id):
+async def fetch_track_async(token, id):
     try:
         # Setting up the URL for the track data
-        track_data_url = f"https://api.spotify.com/v1/tracks/{id}"
+        track_data_url = f"{api_url}/tracks/{id}"
         headers = get_auth_header(token)
-        track_result = get(track_data_url, headers=headers)
+        track_result = await spotify_get_async(track_data_url, headers=headers)
+        track_result.raise_for_status()
         result = json.loads(track_result.content)
         
-        # Process and format album data into a dictionary
-        results_list = {"trackname" : result.get("name", "NoName"),
-                        "trackalbumtype" : result.get("album", {}).get("album_type", "NoAlbumType"),
-                        "trackalbumname" : result.get("album", {}).get("name", "NoAlbumName"),
-                        "trackalbumid" : result.get("album", {}).get("id", "NoAlbumID"),
-                        "trackimage" : result.get("album", {}).get("images", [{"url" : "images/no_result.png"}])[0].get("url",""),
-                        "trackreleasedate" : result.get("album", {}).get("release_date","NoRelaseDate"),
-                        "trackartists" : [[item.get("name", "NoName"),item.get("id","NoID")] for item in result.get("artists",{})]
-                        }
-        
-        return results_list
+
+        return format_track(result)
     
-    except:
+    except Exception as e:
 
-        print("Error in track_search")
+        print(f"Error in track_search: {e}")
 
         return None
 
 
-
-
 # Purpose: Returns detailed information about an album, including its name, type, total tracks, image, release date, artists, and tracks.
 # Author: Ryan
 # Date Written: 4.1.25
-# Last Revised: 5.4.25
-# Called By: get_album endpoint in the backend.
+# Last Revised: 10.18.26
+# Called By: album_search_async, when the album is not in the cache or its entry is being refreshed.
 # System Context: used to populat the album search page.
 # Data Structures: A dictionary with album information, including album name, type, image URL, release date, an artists list, and a tracks list.
-# Algorithms Used: List comprehension is used to create lists of artists and tracks from the API response via a for loop.
+# Algorithms Used: Tracks past the first page are fetched concurrently, see complete_album_tracks_async. List comprehension is
+# used to create lists of artists and tracks from the API response via a for loop.
 # Inputs: A album id and token to search for.
 # Outputs: A dictionary containing album information, including album name, type, total tracks, image URL, release date, artists, and tracks.
 # Future Changes: As of 5.4.25 no changes are necessary, but if the API changes or the album search functionality changes, this function may need to be updated.
-def album_search(token, id):
+async def fetch_album_async(token, id):
     try:
         # Setting up the URL for the album data API query
-        album_data_url = f"https://api.spotify.com/v1/albums/{id}"
+        album_data_url = f"{api_url}/albums/{id}"
         headers = get_auth_header(token)
-        album_result = get(album_data_url, headers=headers)
+        album_result = await spotify_get_async(album_data_url, headers=headers)
+        album_result.raise_for_status()
         result = json.loads(album_result.content)
+        await complete_album_tracks_async(token, id, result)
         
-        # Process and format album data into a dictionary
-        results_list = {"albumname" : result.get("name", "NoName"),
-                        "albumtype" : result.get("album_type", "NoAlbumType"),
-                        "tracknumber" : result.get("total_tracks", 0),
-                        "albumimage" : result.get("images", [{"url" : "images/no_result.png"}])[0].get("url", ""),
-                        "albumreleasedate" : result.get("release_date","NoReleaseDate"),
-                        "albumartists" : [[item.get("name","NoName"),item.get("id","NoID")] for item in result.get("artists",[])],
-                        "albumtracks" : [[item.get("name","NoTrackName"),item.get("id","NoTrackID")]for item in result.get("tracks",[{}]).get("items",[])]
-                        }
-        
-        return results_list
+
+        return format_album(result)
     
     except Exception as e:  
 
@@ -284,21 +682,264 @@ def album_search(token, id):
 
         return None
 
+
+# Purpose: Returns an artist's details, served from the artist cache when possible.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The artist search endpoint in the backend.
+# System Context: Keeps popular artist pages from going back to Spotify on every view.
+# Data Structures: The artist dictionary produced by fetch_artist_async.
+# Algorithms Used: See TTLCache.get_or_load_async in cache.py.
+# Inputs: A token for API access and an artist ID.
+# Outputs: Dictionary containing artist information, or None if it could not be fetched.
+# Future Changes: N/A
+async def artist_search_async(token, id):
+
+    return await artist_cache.get_or_load_async(id, lambda: fetch_artist_async(token, id))
+
+
+# Purpose: Returns a track's details, served from the track cache when possible.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The track search endpoint in the backend.
+# System Context: Keeps popular track pages from going back to Spotify on every view.
+# Data Structures: The track dictionary produced by fetch_track_async.
+# Algorithms Used: See TTLCache.get_or_load_async in cache.py.
+# Inputs: A token for API access and a track ID.
+# Outputs: Dictionary containing track information, or None if it could not be fetched.
+# Future Changes: N/A
+async def track_search_async(token, id):
+
+    return await track_cache.get_or_load_async(id, lambda: fetch_track_async(token, id))
+
+
+# Purpose: Returns an album's details, served from the album cache when possible.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The album search endpoint in the backend.
+# System Context: Keeps popular album pages from going back to Spotify on every view.
+# Data Structures: The album dictionary produced by fetch_album_async.
+# Algorithms Used: See TTLCache.get_or_load_async in cache.py.
+# Inputs: A token for API access and an album ID.
+# Outputs: Dictionary containing album information, or None if it could not be fetched.
+# Future Changes: N/A
+async def album_search_async(token, id):
+
+    return await album_cache.get_or_load_async(id, lambda: fetch_album_async(token, id))
+
+
+# Purpose: Fetches one batch of tracks, albums, or artists with a single request to Spotify's several-items lookup.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: fetch_many_async
+# System Context: Spotify has no batch lookup for top tracks, so for artists those are fetched one per artist at the same time.
+# Data Structures: A dictionary of ID -> formatted entity.
+# Algorithms Used: Spotify answers in the order the IDs were sent, with null for an ID it does not know, so the
+# answers are matched to the IDs by position. An album whose later track pages could not be fetched keeps the first
+# page Spotify sent with it, and an artist whose top tracks could not be fetched has none, so one entity does not fail
+# the whole batch.
+# Inputs: A token, the type of entity, and at most batch_sizes[type] IDs.
+# Outputs: A dictionary of ID -> formatted entity, or None for an ID Spotify did not find. Errors from the API are raised.
+# Future Changes: N/A
+async def fetch_batch_async(token, type, ids):
+    headers = get_auth_header(token)
+    result = await spotify_get_async(f"{api_url}/{type}s", headers=headers, params={"ids" : ",".join(ids)})
+    result.raise_for_status()
+    items = json.loads(result.content).get(type + "s", [])
+    found = dict(zip(ids, items))
+    if type == "track":
+        return {id : format_track(item) if item else None for id, item in found.items()}
+    if type == "album":
+        albums = [(id, item) for id, item in found.items() if item]
+        outcomes = await asyncio.gather(*[complete_album_tracks_async(token, id, item) for id, item in albums],
+                                        return_exceptions=True)
+        for (id, item), outcome in zip(albums, outcomes):
+            if isinstance(outcome, Exception):
+
+                print(f"Error completing the tracks of album {id}: {outcome}")
+
+        return {id : format_album(item) if item else None for id, item in found.items()}
+    artists = [id for id, item in found.items() if item]
+    outcomes = await asyncio.gather(*[fetch_top_tracks_async(headers, id) for id in artists], return_exceptions=True)
+    top_tracks = {}
+    for id, outcome in zip(artists, outcomes):
+        if isinstance(outcome, Exception):
+
+            print(f"Error fetching the top tracks of artist {id}: {outcome}")
+
+            outcome = {"tracks" : []}
+        top_tracks[id] = outcome
+
+    return {id : format_artist(item, top_tracks[id]) if item else None for id, item in found.items()}
+
+
+# Purpose: Fetches one artist's top tracks.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: fetch_batch_async
+# System Context: N/A
+# Data Structures: The Spotify top tracks object.
+# Algorithms Used: N/A
+# Inputs: The request headers and the artist ID.
+# Outputs: The top tracks object, errors from the API are raised.
+# Future Changes: N/A
+async def fetch_top_tracks_async(headers, id):
+    result = await spotify_get_async(f"{api_url}/artists/{id}/top-tracks", headers=headers)
+    result.raise_for_status()
+
+    return json.loads(result.content)
+
+
+# Purpose: Fetches any number of tracks, albums, or artists from Spotify in as few requests as possible.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: entities_search_async, for the IDs that were not in the cache.
+# System Context: Used by the /tracks, /albums, and /artists endpoints.
+# Data Structures: A dictionary of ID -> formatted entity.
+# Algorithms Used: The IDs are split into batches of Spotify's maximum size and the batches are requested at the same time.
+# A batch that fails leaves its IDs out of the result without failing the others.
+# Inputs: A token, the type of entity, and a list of IDs.
+# Outputs: A dictionary of ID -> formatted entity, None for IDs Spotify did not find. IDs that could not be fetched are
+# left out, so a failed request is never mistaken for an ID that does not exist.
+# Future Changes: N/A
+async def fetch_many_async(token, type, ids):
+    size = batch_sizes[type]
+    chunks = [ids[start:start + size] for start in range(0, len(ids), size)]
+    outcomes = await asyncio.gather(*[fetch_batch_async(token, type, chunk) for chunk in chunks], return_exceptions=True)
+    results = {}
+    for chunk, outcome in zip(chunks, outcomes):
+        if isinstance(outcome, Exception):
+
+            print(f"Error fetching {len(chunk)} {type}s: {outcome}")
+
+            continue
+        results.update({id : outcome.get(id) for id in chunk})
+
+    return results
+
+
+# Purpose: Returns the details of many tracks, albums, or artists, served from their cache when possible.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The /tracks, /albums, and /artists endpoints in the backend.
+# System Context: Lets a page that lists many entities load them with one request instead of one per entity.
+# Data Structures: A dictionary of ID -> the same dictionary track_search, album_search, or artist_search returns.
+# Algorithms Used: See TTLCache.get_many_async in cache.py, only the IDs that are not cached are fetched.
+# Inputs: A token, the type of entity ("track", "album", or "artist"), and a list of IDs.
+# Outputs: A dictionary of ID -> entity, None for IDs that could not be found. IDs that could not be fetched are left out.
+# Future Changes: N/A
+async def entities_search_async(token, type, ids):
+
+    return await entity_caches[type].get_many_async(ids, lambda missing: fetch_many_async(token, type, missing))
+
+
+# Purpose: Collects the counters of every entity and search cache.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The stats endpoint in the backend.
+# System Context: Used to see how well the caches are working and whether their sizes need to change.
+# Data Structures: A dictionary keyed by cache name.
+# Algorithms Used: N/A
+# Inputs: N/A
+# Outputs: A dictionary of cache statistics.
+# Future Changes: N/A
+def cache_stats():
+
+    return {cache.name : cache.stats() for cache in (artist_cache, album_cache, track_cache, search_cache)}
+
+
+# Purpose: Used to search for artists, albums, and tracks based on a search value, uses the search from above.
+# Author: Ryan
+# Date Written: 5.1.25
+# Last Revised: 10.18.26
+# Called By: broad_search_results, and the broad search endpoint in the backend.
+# System Context: Used to help the user search for a value by returning a larger list of results that are relevant to the search value.
+# Data Structures: A dictionary with three keys: artists, albums, and tracks, each containing a list of search results,
+# and an errors key of type -> message when a search failed.
+# Algorithms Used: The three searches are awaited together with asyncio.gather, so the total time is about that of the
+# slowest search instead of the sum of all three, without a thread for each.
+# Inputs: A token for API access, a search value to search for, and the number of results per type.
+# Outputs: A dictionary of results for artists, albums, and tracks. A type whose search failed holds an empty list, so
+# the broad search page can still list the other two, and its message is put under errors.
+# Future Changes: N/A
+async def broad_search_results_async(token, search_value, limit=10):
+    outcomes = await asyncio.gather(*[cached_search_async(token, search_value, type, limit) for key, type in broad_search_types],
+                                    return_exceptions=True)
+    results = {}
+    errors = {}
+    for (key, type), outcome in zip(broad_search_types, outcomes):
+        if isinstance(outcome, Exception):
+
+            print(f"Error in broad_search for {key}: {outcome}")
+
+            results[key] = []
+            errors[key] = f"Error while searching {key}: {outcome}"
+        else:
+            results[key] = outcome
+    if errors:
+        results["errors"] = errors
+
+    return results
+
+
+# Purpose: Synchronous versions of the searches and lookups above, for code that is not async.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: broad_search below and the benchmarks in benchmarks/bench_hot_paths.py. The endpoints await the async
+# versions instead.
+# System Context: Must not be called from the Spotify event loop itself.
+# Data Structures: N/A
+# Algorithms Used: Each runs its coroutine on the Spotify event loop and waits for it, see run_sync in spotify_client.py.
+# Inputs: The same as the async version.
+# Outputs: The same as the async version.
+# Future Changes: N/A
+def general_search(token, search, type, limit):
+
+    return run_sync(general_search_async(token, search, type, limit))
+
+
+def artist_search(token, id):
+
+    return run_sync(artist_search_async(token, id))
+
+
+def track_search(token, id):
+
+    return run_sync(track_search_async(token, id))
+
+
+def album_search(token, id):
+
+    return run_sync(album_search_async(token, id))
+
+
+def broad_search_results(token, search_value, limit=10):
+
+    return run_sync(broad_search_results_async(token, search_value, limit))
+
+
 # Purpose: Used to search for artists, albums, and tracks based on a search value, uses the general search from above.
 # Author: Ryan
 # Date Written: 5.1.25
-# Last Revised: 5.4.25
+# Last Revised: 10.18.26
 # Called By: The broad search endpoint in the backend.
 # System Context: Used to help the user search for a value by returning a larger list of results that are relevant to the search value.
 # Data Structures: A dictionary with three keys: artists, albums, and tracks, each containing a list of tuple search results.
-# Algorithms Used: N
+# Algorithms Used: N/A
 # Inputs: A token for API access and a search value to search for.
 # Outputs: A JSON formatted string containing search 10 results for artists, albums, and tracks each.
-# Future Changes: As of 5.4.25 no changes are necessary, but if the API changes or the search functionality changes, this function may need to be updated.
+# Future Changes: N/A
 def broad_search(token,search_value):
-    return json.dumps({"artists" : general_search(token, search_value, "artist",10),
-            "albums" : general_search(token, search_value, "album",10),
-            "tracks" : general_search(token, search_value, "track",10),})
+    return json.dumps(broad_search_results(token, search_value))
     
 
 
@@ -0,0 +1,269 @@
+"""
+ Author: Ryan
+ Date: 10.18.26
+ Filename: migrations.py
+ 
+ Purpose: This script keeps the database schema up to date. Each change to the schema is a numbered migration, and
+          the database remembers which ones it has already had applied.
+ 
+ Where it fits: Run from the command line with "flask --app BackEnd/app.py migrate" after installing or updating.
+ 
+ Written: 10.18.26
+ Revised: 10.18.26
+ 
+ Why it exists: Tables used to only be created by adding meta.create_all to db.py by hand, which never adds
+                new tables or indexes to a database that already exists.
+ 
+ How it uses data structures and algorithms: A schema_version table holds one row per applied migration. The
+                migrations list is walked in order and any version missing from that table is run.
+ 
+ Expected input: The shared database engine.
+ 
+ Expected output: Messages for each migration that was applied.
+ 
+ Expected extensions/revisions: New schema changes are added to the end of the migrations list with the next number.
+"""
+
+from sqlalchemy import Column, String, Integer, MetaData, Table, DateTime, Index, insert, select, inspect
+from datetime import datetime
+from db import Users, Songs, Tags, Comments, TagCounts, lookup_indexes, rebuildTagCounts
+
+#Kept apart from the application tables so meta.create_all never touches it
+schema_meta = MetaData()
+
+# Creates the table that records which migrations have been applied
+SchemaVersion = Table(
+    "schema_version",
+    schema_meta,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, default=datetime.utcnow)
+)
+
+#Indexes that an earlier migration creates and a later one drops, so db.py no longer declares them. They are declared
+#on stand-in tables in their own MetaData so meta.create_all never creates them.
+retired_meta = MetaData()
+
+# The (songID, date_commented, commentID) index from migration 4, dropped by migration 5
+PostsPageComments = Table(
+    "Comments",
+    retired_meta,
+    Column('commentID', Integer, primary_key=True),
+    Column('date_commented', DateTime),
+    Column('songID', String(200)),
+    Index("ix_Comments_songID_date_commentID", "songID", "date_commented", "commentID")
+)
+
+
+# Purpose: Migration 1, creates the original tables.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: upgrade
+# System Context: Databases set up with meta.create_all already have these tables, so they are skipped if they exist.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: A database connection.
+# Outputs: N/A
+# Future Changes: N/A
+def createBaseTables(conn):
+    for table in (Users, Songs, Tags, Comments):
+        table.create(conn, checkfirst=True)
+
+
+# Purpose: Migration 2, creates the TagCounts table and fills it from the existing tags.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: upgrade
+# System Context: /gettags reads its totals from TagCounts.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: A database connection.
+# Outputs: N/A, raises if the counts could not be rebuilt.
+# Future Changes: N/A
+def createTagCounts(conn):
+    TagCounts.create(conn, checkfirst=True)
+    result = rebuildTagCounts(conn)
+    if result.startswith("Error"):
+        raise RuntimeError(result)
+
+
+# Purpose: Migration 3, adds indexes for the columns the hot lookups filter on.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: upgrade
+# System Context: Covers Comments.songID, Comments.userID, Comments.parent_commentID, Users.email, and Tags.userID.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: A database connection.
+# Outputs: N/A
+# Future Changes: N/A
+def createLookupIndexes(conn):
+    for index in lookup_indexes:
+        index.create(conn, checkfirst=True)
+
+
+# Purpose: Migration 4, adds the index that /getposts pages through.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: upgrade
+# System Context: Covers the (songID, date_commented, commentID) order used by the keyset pagination in selectPostsPage.
+# Migration 5 replaced it once comments were paged one thread level at a time, so it is declared above instead of in
+# db.py, and a database migrated from scratch has it only until migration 5 runs.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: A database connection.
+# Outputs: N/A
+# Future Changes: N/A
+def createPostsPageIndex(conn):
+    tableIndex(PostsPageComments, "ix_Comments_songID_date_commentID").create(conn, checkfirst=True)
+
+
+# Purpose: Migration 5, adds the index that each level of a comment thread is paged through.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: upgrade
+# System Context: Covers the (songID, parent_commentID, date_commented, commentID) order used by selectPostsPage, and
+# drops the index from migration 4 that it replaces.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: A database connection.
+# Outputs: N/A
+# Future Changes: N/A
+def createThreadPageIndex(conn):
+    tableIndex(Comments, "ix_Comments_songID_parent_date_commentID").create(conn, checkfirst=True)
+    dropIndex(conn, Comments, "ix_Comments_songID_date_commentID")
+
+
+# Purpose: Migration 6, adds the artists column to Songs.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: upgrade
+# System Context: The local search index in search_index.py shows the artists of a track, which Songs did not store.
+# Songs written before this migration have no artists until they are found by a search again.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: A database connection.
+# Outputs: N/A
+# Future Changes: N/A
+def addSongArtists(conn):
+    addColumn(conn, Songs, "artists")
+
+
+# Purpose: Adds a column that is declared in db.py to an existing table, if the database does not have it yet.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The migrations that add a column.
+# System Context: Tables created after the column was declared already have it.
+# Data Structures: N/A
+# Algorithms Used: The column type is compiled for the database being migrated.
+# Inputs: A database connection, the table, and the column name.
+# Outputs: N/A
+# Future Changes: N/A
+def addColumn(conn, table, name):
+    if name in [column["name"] for column in inspect(conn).get_columns(table.name)]:
+        return
+    column = table.c[name]
+    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {name} {column.type.compile(dialect=conn.dialect)}")
+
+
+# Purpose: Drops an index that is no longer declared in db.py, if the database has it.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The migrations that replace an index.
+# System Context: MySQL needs the table named in DROP INDEX, SQLite does not allow it.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: A database connection, the table, and the index name.
+# Outputs: N/A
+# Future Changes: N/A
+def dropIndex(conn, table, name):
+    if name not in [index["name"] for index in inspect(conn).get_indexes(table.name)]:
+        return
+    if conn.dialect.name == "mysql":
+        conn.exec_driver_sql(f"DROP INDEX {name} ON {table.name}")
+    else:
+        conn.exec_driver_sql(f"DROP INDEX {name}")
+
+
+# Purpose: Finds an index declared on a table in db.py by its name.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The migrations that add a single index.
+# System Context: Lets migrations create an index without declaring it a second time.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: A table and the index name.
+# Outputs: The Index object.
+# Future Changes: N/A
+def tableIndex(table, name):
+
+    return next(index for index in table.indexes if index.name == name)
+
+
+# Every schema change in order, new ones go at the end with the next version number
+migrations = [
+    (1, "create base tables", createBaseTables),
+    (2, "create tag counts", createTagCounts),
+    (3, "add lookup indexes", createLookupIndexes),
+    (4, "add posts page index", createPostsPageIndex),
+    (5, "add thread page index", createThreadPageIndex),
+    (6, "add song artists", addSongArtists)
+]
+
+
+# Purpose: Applies every migration the database has not had yet.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The migrate command in app.py.
+# System Context: Brings a new or existing database up to the schema the code expects.
+# Data Structures: A set of the versions that have already been applied.
+# Algorithms Used: Each missing migration is run and recorded in schema_version before moving to the next one, so a
+# failure leaves every earlier migration recorded.
+# Inputs: The database engine.
+# Outputs: A list of the migrations that were applied.
+# Future Changes: N/A
+def upgrade(engine):
+    applied_now = []
+    with engine.connect() as conn:
+        SchemaVersion.create(conn, checkfirst=True)
+        conn.commit()
+        applied = set(conn.execute(select(SchemaVersion.c.version)).scalars())
+        for version, name, step in migrations:
+            if version in applied:
+                continue
+            step(conn)
+            conn.execute(insert(SchemaVersion).values(version=version, name=name))
+            conn.commit()
+            applied_now.append(f"{version}: {name}")
+
+    return applied_now
+
+
+# Purpose: Returns the newest migration the database has had applied.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The migrate command in app.py.
+# System Context: Used to show which version the schema is at.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: The database engine.
+# Outputs: The version number, 0 if no migrations have been applied.
+# Future Changes: N/A
+def currentVersion(engine):
+    with engine.connect() as conn:
+        SchemaVersion.create(conn, checkfirst=True)
+        conn.commit()
+        version = conn.execute(select(SchemaVersion.c.version).order_by(SchemaVersion.c.version.desc())).scalar()
+
+    return version or 0
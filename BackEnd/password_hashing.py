@@ -0,0 +1,267 @@
+"""
+Author: Ryan
+Date: 10.18.26
+Filename: password_hashing.py
+
+Purpose:
+This module hashes and checks passwords with bcrypt in a small pool of worker processes, so the CPU time bcrypt
+takes is not spent on the threads that serve requests.
+
+System Context:
+Part of the Backend system for the PlayBack project. The signup and login endpoints in app.py use it instead of
+calling Flask-Bcrypt directly.
+
+Development History:
+- Written on: 10.18.26
+- Last revised on: 10.18.26
+
+Existence Rationale:
+A bcrypt hash is meant to be slow. Run inline, a burst of logins held the GIL and every other endpoint waited on them.
+
+Data Structures/ Algorithms:
+- A ProcessPoolExecutor runs the hashing, and a semaphore limits how many hashes may be queued for it at once. When the
+pool is that far behind, new requests are turned away instead of waiting in line.
+- The workers are started with forkserver, or spawn where that is not available, so they do not inherit copies of the
+request threads, database connections, and locks of the process that started them. Each worker imports the script
+that was run, so scripts that hash passwords need an "if __name__ == '__main__':" block, as app.py has.
+- The cost of a stored hash is read from the hash itself, so hashes made with an older BCRYPT_LOG_ROUNDS can be found
+and replaced when their owner logs in.
+Expected Input/Output:
+- Input: Passwords and stored hashes. Output: New hashes, True or False for a check, and counters from stats().
+Future Extensions or Revisions:
+N/A
+"""
+
+from dotenv import load_dotenv
+import multiprocessing
+import os
+import threading
+import time
+import bcrypt
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+load_dotenv()
+# The bcrypt work factor, each step doubles the time a hash takes
+log_rounds = int(os.getenv("BCRYPT_LOG_ROUNDS", 12))
+# Worker processes, and how many hashes may be waiting for one before new ones are turned away
+hash_workers = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+max_pending = int(os.getenv("PASSWORD_HASH_MAX_PENDING", hash_workers * 8))
+# Seconds a request waits for a place in the queue, and for its hash to finish
+queue_timeout = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", 2))
+hash_timeout = float(os.getenv("PASSWORD_HASH_TIMEOUT", 30))
+
+
+# Purpose: Raised when the hashing pool is too far behind to take another password.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: HashPool.run
+# System Context: The endpoints answer it with a 503 so the client can try again. Also raised when a hash takes longer
+# than PASSWORD_HASH_TIMEOUT.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: N/A
+# Outputs: N/A
+# Future Changes: N/A
+class PasswordHashBusy(Exception):
+    pass
+
+
+# Purpose: Hashes a password, runs in a worker process.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: hash_password, through the process pool.
+# System Context: Makes the same $2b$ hashes as Flask-Bcrypt, so existing passwords still check.
+# Data Structures: N/A
+# Algorithms Used: bcrypt
+# Inputs: The password and the work factor.
+# Outputs: The hash as a string.
+# Future Changes: N/A
+def hash_in_worker(password, rounds):
+
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+# Purpose: Checks a password against a stored hash, runs in a worker process.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: check_password, through the process pool.
+# System Context: N/A
+# Data Structures: N/A
+# Algorithms Used: bcrypt
+# Inputs: The stored hash and the password.
+# Outputs: True if they match.
+# Future Changes: N/A
+def check_in_worker(hashed, password):
+    try:
+
+        return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+    except ValueError:
+
+        #Not a bcrypt hash
+        return False
+
+
+# Purpose: Keeps the process pool, the queue limit, and the counters together.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: hash_password and check_password
+# System Context: There is one of these for the whole backend.
+# Data Structures: A ProcessPoolExecutor, a BoundedSemaphore, and counters guarded by a lock.
+# Algorithms Used: The pool is started on first use so importing app.py does not start processes. A request takes a
+# place from the semaphore before it submits a hash, and the place is given back when the hash is done, not when the
+# request stops waiting, so hashes that time out still count against the limit while they run. A pool that broke
+# because a worker died is thrown away and a new one is started for the next hash.
+# Inputs: The number of workers and the most hashes that may be waiting.
+# Outputs: Results of the submitted functions, and a dictionary of counters from stats().
+# Future Changes: N/A
+class HashPool:
+
+    def __init__(self, workers, pending):
+        self.workers = workers
+        self.max_pending = pending
+        self.places = threading.BoundedSemaphore(pending)
+        self.executor = None
+        self.lock = threading.Lock()
+        self.hashes = 0
+        self.checks = 0
+        self.rejected = 0
+        self.busy_time = 0.0
+
+    def run(self, function, *args):
+        if not self.places.acquire(timeout=queue_timeout):
+            with self.lock:
+                self.rejected += 1
+            raise PasswordHashBusy("Too many password requests, try again shortly")
+        started = time.perf_counter()
+        try:
+            future = self.submit(function, *args)
+            try:
+
+                return future.result(timeout=hash_timeout)
+
+            except TimeoutError:
+
+                future.cancel()
+                raise PasswordHashBusy("Password hashing took too long, try again shortly")
+
+            except BrokenProcessPool:
+
+                self.discard(future.pool)
+                raise
+
+        finally:
+            with self.lock:
+                self.busy_time += time.perf_counter() - started
+                if function is hash_in_worker:
+                    self.hashes += 1
+                else:
+                    self.checks += 1
+
+    #Submits to the current pool, starting one if there is none, and tries once more on a new pool if it was broken.
+    #The semaphore place taken in run is given back when the future finishes, or straight away if it was not submitted.
+    def submit(self, function, *args):
+        for attempt in range(2):
+            with self.lock:
+                if self.executor is None:
+                    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                    self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+                executor = self.executor
+            try:
+                future = executor.submit(function, *args)
+
+            except BrokenProcessPool:
+
+                self.discard(executor)
+                if attempt == 0:
+                    continue
+                self.places.release()
+                raise
+
+            except BaseException:
+
+                self.places.release()
+                raise
+
+            future.pool = executor
+            future.add_done_callback(lambda done: self.places.release())
+            return future
+
+    #Forgets a broken pool so the next hash starts a new one
+    def discard(self, executor):
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self.lock:
+            done = self.hashes + self.checks
+            return {"workers" : self.workers,
+                    "log_rounds" : log_rounds,
+                    "max_pending" : self.max_pending,
+                    "hashes" : self.hashes,
+                    "checks" : self.checks,
+                    "rejected" : self.rejected,
+                    "ms_avg" : round(self.busy_time * 1000 / done, 3) if done else 0.0}
+
+
+hash_pool = HashPool(hash_workers, max_pending)
+
+
+# Purpose: Hashes a new password with the configured work factor.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The signup and login endpoints in app.py.
+# System Context: N/A
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: The password.
+# Outputs: The hash as a string. Raises PasswordHashBusy when the pool is full.
+# Future Changes: N/A
+def hash_password(password):
+
+    return hash_pool.run(hash_in_worker, password, log_rounds)
+
+
+# Purpose: Checks a password against the hash stored for a user.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The login endpoint in app.py.
+# System Context: N/A
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: The stored hash and the password.
+# Outputs: True if they match. Raises PasswordHashBusy when the pool is full.
+# Future Changes: N/A
+def check_password(hashed, password):
+
+    return hash_pool.run(check_in_worker, hashed, password)
+
+
+# Purpose: Tells whether a stored hash was made with a different work factor than the configured one.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The login endpoint in app.py.
+# System Context: Lets BCRYPT_LOG_ROUNDS be raised or lowered without resetting any passwords.
+# Data Structures: N/A
+# Algorithms Used: A bcrypt hash looks like $2b$12$..., the number between the second and third $ is the cost.
+# Inputs: The stored hash.
+# Outputs: True if the password should be hashed again.
+# Future Changes: N/A
+def needs_rehash(hashed):
+    try:
+
+        return int(hashed.split("$")[2]) != log_rounds
+
+    except (IndexError, ValueError):
+
+        return True
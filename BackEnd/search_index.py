@@ -0,0 +1,255 @@
+"""
+Author: Ryan
+Date: 10.18.26
+Filename: search_index.py
+
+Purpose:
+This module keeps an in-memory search index of every artist, album, and track in the Songs table, so the search bar
+can be answered without going to Spotify.
+
+System Context:
+Part of the Backend system for the PlayBack project. main.py asks it before searching Spotify and adds every result
+Spotify returns to it, the same results that are written to Songs.
+
+Development History:
+- Written on: 10.18.26
+- Last revised on: 10.18.26
+
+Existence Rationale:
+Every search was written to Songs, but searches never read from it, so the search bar always waited on Spotify.
+
+Data Structures/ Algorithms:
+- A dictionary of songID -> search result, and for each type a dictionary of word prefix -> set of songIDs. Every word
+of a name and its artists is indexed under each of its prefixes up to SEARCH_INDEX_PREFIX_LENGTH characters.
+- A query is answered by intersecting the sets for each of its words, smallest first. Only results whose name starts
+with the whole query are kept, exact matches first, then shorter names. The index only answers when it has a full limit
+of those and the query is at least SEARCH_INDEX_MIN_QUERY_LENGTH characters, anything looser is left to Spotify's
+relevance ranking.
+- Tracks with no stored artists are never answered locally, the search bar shows who a track is by.
+- The Songs table is read in the background a page at a time the first time the index is used.
+Expected Input/Output:
+- Input: Search results to add, and queries. Output: Up to the limit of results in the same format as main.search_media,
+or None when the index does not have enough of them.
+Future Extensions or Revisions:
+Results are ranked by name only, Spotify also ranks by popularity, which the Songs table does not store. Storing it
+would let shorter and looser queries be answered locally.
+"""
+
+from dotenv import load_dotenv
+import heapq
+import json
+import os
+import threading
+import time
+from db import selectSongsPage
+
+load_dotenv()
+# Longest word prefix that is indexed, longer query words are matched against the words of each candidate
+prefix_length = int(os.getenv("SEARCH_INDEX_PREFIX_LENGTH", 12))
+# Most results the index holds, later ones are not added once it is full
+max_entries = int(os.getenv("SEARCH_INDEX_MAX_ENTRIES", 200000))
+# Milliseconds a lookup may take before it gives up and the search goes to Spotify instead
+latency_budget = float(os.getenv("SEARCH_INDEX_BUDGET_MS", 5)) / 1000
+# Shortest query the index answers, shorter ones match too many names to rank well without Spotify's popularity
+min_query_length = int(os.getenv("SEARCH_INDEX_MIN_QUERY_LENGTH", 4))
+# Songs read from the database per page while the index is loaded
+load_page_size = int(os.getenv("SEARCH_INDEX_LOAD_PAGE_SIZE", 1000))
+
+
+# Purpose: Splits a name or query into the lower case words it is indexed and searched by.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: SearchIndex
+# System Context: Matches the normalization SearchCache uses.
+# Data Structures: A list of words.
+# Algorithms Used: N/A
+# Inputs: Text.
+# Outputs: The words.
+# Future Changes: N/A
+def words_of(text):
+
+    return str(text).lower().split()
+
+
+# Purpose: Turns a row of the Songs table into a search result.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: SearchIndex.load
+# System Context: Songs stores a track's album image in image, while search results keep it in album.
+# Data Structures: A dictionary in the main.search_media format.
+# Algorithms Used: N/A
+# Inputs: A Songs row.
+# Outputs: The search result.
+# Future Changes: N/A
+def result_from_row(row):
+    try:
+        artists = json.loads(row.artists) if row.artists else []
+
+    except ValueError:
+
+        artists = []
+
+    if row.type == "track":
+
+        return {"name" : row.name, "image" : "", "type" : row.type, "artist" : artists, "id" : row.songID, "album" : row.image}
+
+    return {"name" : row.name, "image" : row.image, "type" : row.type, "artist" : artists, "id" : row.songID,
+            "album" : "images/no_result.png"}
+
+
+# Purpose: The search index itself.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: main.py
+# System Context: There is one of these for the whole backend, used from the Spotify event loop and the loading thread.
+# Data Structures: See the module docstring. Counters are kept for stats().
+# Algorithms Used: See the module docstring. Everything is guarded by one lock.
+# Inputs: N/A
+# Outputs: Search results from search(), and a dictionary of counters from stats().
+# Future Changes: N/A
+class SearchIndex:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.prefixes = {}
+        self.load_started = False
+        self.loaded = False
+        self.loader = None
+        self.stopping = threading.Event()
+        self.lookups = 0
+        self.local_hits = 0
+        self.over_budget = 0
+        self.dropped = 0
+        self.search_time = 0.0
+
+    #Every prefix of every word in a result's name and artists, up to prefix_length characters
+    @staticmethod
+    def keys_of(result):
+        keys = set()
+        for word in words_of(" ".join([result.get("name") or ""] + list(result.get("artist") or []))):
+            keys.update(word[:end] for end in range(1, min(len(word), prefix_length) + 1))
+        return keys
+
+    #Adds search results to the index. replace=False keeps a result that is already in it, used while loading so rows
+    #read from the database do not replace newer results from Spotify.
+    def add(self, results, replace=True):
+        with self.lock:
+            for result in results:
+                id, type = result.get("id"), result.get("type")
+                if not id or not type:
+                    continue
+                if id in self.entries:
+                    if not replace:
+                        continue
+                    self.remove(id)
+                elif len(self.entries) >= max_entries:
+                    self.dropped += 1
+                    continue
+                self.entries[id] = result
+                by_prefix = self.prefixes.setdefault(type, {})
+                for key in self.keys_of(result):
+                    by_prefix.setdefault(key, set()).add(id)
+
+    #Takes a result out of the prefix sets, the lock must be held
+    def remove(self, id):
+        result = self.entries.pop(id)
+        by_prefix = self.prefixes.get(result.get("type"), {})
+        for key in self.keys_of(result):
+            ids = by_prefix.get(key)
+            if ids is not None:
+                ids.discard(id)
+                if not ids:
+                    del by_prefix[key]
+
+    #Returns up to limit results for the query, or None if the query is too short, there are fewer than limit names
+    #starting with it, or the budget ran out
+    def search(self, query, type, limit):
+        started = time.perf_counter()
+        words = words_of(query)
+        with self.lock:
+            self.lookups += 1
+            results = self.find(words, type, limit, started) if len(" ".join(words)) >= min_query_length else None
+            self.search_time += time.perf_counter() - started
+            if results is not None:
+                self.local_hits += 1
+        return results
+
+    #The lock must be held
+    def find(self, words, type, limit, started):
+        by_prefix = self.prefixes.get(type, {})
+        sets = sorted((by_prefix.get(word[:prefix_length], set()) for word in words), key=len)
+        if len(sets[0]) < limit:
+            return None
+        candidates = sets[0].intersection(*sets[1:])
+        if len(candidates) < limit:
+            return None
+        query = " ".join(words)
+        ranked = []
+        for count, id in enumerate(candidates):
+            if count % 256 == 0 and time.perf_counter() - started > latency_budget:
+                self.over_budget += 1
+                return None
+            result = self.entries[id]
+            #Tracks loaded from rows written before Songs stored artists would show as "by" nobody
+            if result.get("type") == "track" and not result.get("artist"):
+                continue
+            name = " ".join(words_of(result.get("name") or ""))
+            if not name.startswith(query):
+                continue
+            ranked.append(((name != query, len(name), name), id))
+        if len(ranked) < limit:
+            return None
+        return [self.entries[id] for rank, id in heapq.nsmallest(limit, ranked)]
+
+    #Reads the Songs table into the index in a background thread, the first call starts it and later calls do nothing
+    def ensure_loaded(self, engine):
+        with self.lock:
+            if self.load_started:
+                return
+            self.load_started = True
+            self.loader = threading.Thread(target=self.load, args=(engine,), name="search-index-load", daemon=True)
+        self.loader.start()
+
+    def load(self, engine):
+        after = None
+        try:
+            with engine.connect() as conn:
+                while not self.stopping.is_set():
+                    rows = selectSongsPage(conn, after, load_page_size)
+                    if isinstance(rows, str):
+                        raise RuntimeError(rows)
+                    if not rows:
+                        break
+                    self.add([result_from_row(row) for row in rows], replace=False)
+                    after = rows[-1].songID
+            with self.lock:
+                self.loaded = not self.stopping.is_set()
+
+        except Exception as e:
+
+            print(f"Error loading the search index: {e}")
+
+    #Stops loading after the page being read and waits for the loading thread, for code that removes the database
+    def close(self):
+        self.stopping.set()
+        if self.loader is not None:
+            self.loader.join()
+
+    def stats(self):
+        with self.lock:
+            return {"entries" : len(self.entries),
+                    "loaded" : self.loaded,
+                    "lookups" : self.lookups,
+                    "local_hits" : self.local_hits,
+                    "fallbacks" : self.lookups - self.local_hits,
+                    "over_budget" : self.over_budget,
+                    "dropped" : self.dropped,
+                    "hit_rate" : round(self.local_hits / self.lookups, 3) if self.lookups else 0.0,
+                    "ms_avg" : round(self.search_time * 1000 / self.lookups, 3) if self.lookups else 0.0}
+
+
+search_index = SearchIndex()
@@ -0,0 +1,392 @@
+"""
+Author: Ryan
+Date: 10.18.26
+Filename: session_store.py
+
+Purpose:
+This module keeps Flask sessions on the server. The browser only holds a signed session ID, and the session data is
+looked up in an in-memory LRU store or a SQLite store that is fronted by one.
+
+System Context:
+Part of the Backend system for the PlayBack project. app.py installs the session interface made by
+make_session_interface, and every endpoint that reads or writes flask.session goes through it.
+
+Development History:
+- Written on: 10.18.26
+- Last revised on: 10.18.26
+
+Existence Rationale:
+The old flask_session folder gained one file per session and nothing ever removed them. /check-session is called by
+most components on every page, so a session read needs to be a dictionary lookup, not a file read.
+
+Data Structures/ Algorithms:
+- An OrderedDict is used as an LRU list of sid -> (data, expiry time), the least recently used session is evicted
+once the store is full.
+- The SQLite store keeps every session in a table indexed by expiry time and serves reads from an in-memory LRU store
+in front of it. Sessions are only kept in front for a few seconds, so a logout in one worker reaches the others quickly.
+- A background thread deletes expired sessions every SESSION_SWEEP_INTERVAL seconds.
+Expected Input/Output:
+- Input: The Flask app's config. Output: A SessionInterface, and a dictionary of counters from its stats().
+Future Extensions or Revisions:
+Another backend only needs get, save, touch, delete, sweep, and stats.
+"""
+
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+# The same serializer Flask uses for cookie sessions, so sessions can hold the same kinds of values
+serializer = TaggedJSONSerializer()
+
+
+# Purpose: The session object handed to the endpoints as flask.session.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: ServerSessionInterface
+# System Context: Behaves like the normal Flask session, and remembers its ID and when it expires in the store.
+# Data Structures: A dictionary that marks itself modified when it is changed.
+# Algorithms Used: regenerate() moves the session to a new ID, the old one is deleted from the store when it is saved.
+# The login and signup endpoints call it so an ID set before logging in, for example by an attacker, is never logged in.
+# Inputs: The stored session data, the session ID, whether it is new, and its expiry time in the store.
+# Outputs: N/A
+# Future Changes: N/A
+class ServerSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial=None, sid=None, new=False, expires_at=None):
+        def on_update(self):
+            self.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires_at = expires_at
+        self.modified = False
+        self.replaced_sid = None
+
+    def regenerate(self):
+        if self.replaced_sid is None and not self.new:
+            self.replaced_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+
+# Purpose: A bounded in-memory session store.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: ServerSessionInterface, and SQLiteSessionStore as its read cache.
+# System Context: The fastest backend, sessions are lost when the process restarts and are not shared between workers.
+# Data Structures: An OrderedDict of sid -> (data, expiry time) and counters, guarded by one lock.
+# Algorithms Used: LRU eviction once max_size sessions are stored. An expired session is deleted when it is read, and
+# the sweeper deletes the rest.
+# Inputs: The most sessions to keep.
+# Outputs: Session data and a dictionary of counters from stats().
+# Future Changes: N/A
+class MemorySessionStore:
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.swept = 0
+
+    #Returns (data, expiry time), or (None, None) when the session is missing or has expired
+    def get(self, sid, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            entry = self.entries.get(sid)
+            if entry is None:
+                self.misses += 1
+                return None, None
+            data, expires_at = entry
+            if expires_at <= now:
+                del self.entries[sid]
+                self.expired += 1
+                return None, None
+            self.entries.move_to_end(sid)
+            self.hits += 1
+            return dict(data), expires_at
+
+    def save(self, sid, data, expires_at):
+        with self.lock:
+            self.entries[sid] = (dict(data), expires_at)
+            self.entries.move_to_end(sid)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    #Moves the expiry time of a session forward without rewriting it
+    def touch(self, sid, expires_at):
+        with self.lock:
+            entry = self.entries.get(sid)
+            if entry is not None:
+                self.entries[sid] = (entry[0], expires_at)
+
+    def delete(self, sid):
+        with self.lock:
+            self.entries.pop(sid, None)
+
+    #Deletes every expired session and returns how many there were
+    def sweep(self, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            expired = [sid for sid, (data, expires_at) in self.entries.items() if expires_at <= now]
+            for sid in expired:
+                del self.entries[sid]
+            self.swept += len(expired)
+        return len(expired)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses + self.expired
+            return {"backend" : "memory",
+                    "size" : len(self.entries),
+                    "max_size" : self.max_size,
+                    "hits" : self.hits,
+                    "misses" : self.misses,
+                    "expired" : self.expired,
+                    "evictions" : self.evictions,
+                    "swept" : self.swept,
+                    "hit_rate" : round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+# Purpose: A session store that keeps sessions in a SQLite file, with recently used sessions also kept in memory.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: ServerSessionInterface
+# System Context: Sessions survive a restart and are shared by every worker on the machine, while most reads are still
+# answered from memory.
+# Data Structures: A sessions table of (sid, data, expires_at) with an index on expires_at, one SQLite connection per
+# thread, and a MemorySessionStore used as a write-through read cache.
+# Algorithms Used: Reads check the memory store first and only go to SQLite on a miss. Writes go to both. A session
+# stays in memory for at most cache_ttl seconds, after which it is read from SQLite again so changes made by other
+# workers, such as a logout, are picked up. A touch updates the expiry in memory as well, so it does not cause a read. The sweep deletes expired rows with one range delete on the expiry index, then the oldest rows
+# over max_size.
+# Inputs: The path of the SQLite file, the most sessions to keep in the file, the most to keep in memory, and how many
+# seconds one is kept in memory.
+# Outputs: Session data and a dictionary of counters from stats().
+# Future Changes: N/A
+class SQLiteSessionStore:
+
+    def __init__(self, path, max_size, cache_size, cache_ttl=5):
+        self.path = path
+        self.max_size = max_size
+        self.cache = MemorySessionStore(cache_size)
+        self.cache_ttl = cache_ttl
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.reads = 0
+        self.writes = 0
+        self.swept = 0
+        with self.connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at)")
+
+    #SQLite connections can not be shared between threads, so each thread opens its own
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, sid, now=None):
+        now = time.time() if now is None else now
+        cached, fresh_until = self.cache.get(sid, now)
+        if cached is not None:
+            return dict(cached["data"]), cached["expires_at"]
+        with self.lock:
+            self.reads += 1
+        row = self.connection().execute("SELECT data, expires_at FROM sessions WHERE sid = ? AND expires_at > ?",
+                                        (sid, now)).fetchone()
+        if row is None:
+            return None, None
+        data = serializer.loads(row[0])
+        self.remember(sid, data, row[1], now)
+        return data, row[1]
+
+    #Keeps a session in the memory store until cache_ttl runs out or it expires, whichever is first
+    def remember(self, sid, data, expires_at, now):
+        self.cache.save(sid, {"data" : dict(data), "expires_at" : expires_at}, min(expires_at, now + self.cache_ttl))
+
+    def save(self, sid, data, expires_at):
+        with self.connection() as conn:
+            conn.execute("INSERT INTO sessions (sid, data, expires_at) VALUES (?, ?, ?) "
+                         "ON CONFLICT(sid) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+                         (sid, serializer.dumps(dict(data)), expires_at))
+        with self.lock:
+            self.writes += 1
+        self.remember(sid, data, expires_at, time.time())
+
+    def touch(self, sid, expires_at):
+        with self.connection() as conn:
+            conn.execute("UPDATE sessions SET expires_at = ? WHERE sid = ?", (expires_at, sid))
+        with self.lock:
+            self.writes += 1
+        #Keeps the cached copy until its own cache_ttl runs out, with the new expiry
+        cached, fresh_until = self.cache.get(sid)
+        if cached is not None:
+            self.cache.save(sid, {"data" : cached["data"], "expires_at" : expires_at}, fresh_until)
+
+    def delete(self, sid):
+        with self.connection() as conn:
+            conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+        self.cache.delete(sid)
+
+    def sweep(self, now=None):
+        now = time.time() if now is None else now
+        self.cache.sweep(now)
+        with self.connection() as conn:
+            removed = conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+            #Past the size limit the sessions closest to expiring go first
+            removed += conn.execute("DELETE FROM sessions WHERE sid IN (SELECT sid FROM sessions ORDER BY expires_at "
+                                    "LIMIT max(0, (SELECT count(*) FROM sessions) - ?))", (self.max_size,)).rowcount
+        with self.lock:
+            self.swept += removed
+        return removed
+
+    def stats(self):
+        size = self.connection().execute("SELECT count(*) FROM sessions").fetchone()[0]
+        with self.lock:
+            return {"backend" : "sqlite",
+                    "size" : size,
+                    "max_size" : self.max_size,
+                    "sqlite_reads" : self.reads,
+                    "sqlite_writes" : self.writes,
+                    "swept" : self.swept,
+                    "cache" : self.cache.stats()}
+
+
+# Purpose: Connects a session store to Flask.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: Flask, at the start and end of every request.
+# System Context: Replaces Flask's cookie sessions, the cookie only holds the signed session ID.
+# Data Structures: A ServerSession for each request.
+# Algorithms Used: The session ID is signed with the app's secret key so it can not be guessed or forged. Every session
+# expires PERMANENT_SESSION_LIFETIME after it was last saved, whether or not it is permanent. A session is only written
+# when it changes. A permanent session that is only read has its expiry moved forward, at most once every
+# touch_interval seconds so reads do not turn into writes. A session moved to a new ID by regenerate() is deleted under
+# its old one. The sweeper thread starts with the first request.
+# Inputs: The session store, the sweep interval, and the touch interval in seconds.
+# Outputs: N/A
+# Future Changes: N/A
+class ServerSessionInterface(SessionInterface):
+
+    def __init__(self, store, sweep_interval=60, touch_interval=60):
+        self.store = store
+        self.sweep_interval = sweep_interval
+        self.touch_interval = touch_interval
+        self.sweeper = None
+        self.lock = threading.Lock()
+
+    def signer(self, app):
+
+        return Signer(app.secret_key, salt="playback-session", key_derivation="hmac")
+
+    def open_session(self, app, request):
+        self.start()
+        signed = request.cookies.get(self.get_cookie_name(app))
+        if signed:
+            try:
+                sid = self.signer(app).unsign(signed).decode()
+                data, expires_at = self.store.get(sid)
+                if data is not None:
+                    return ServerSession(data, sid=sid, expires_at=expires_at)
+
+            except BadSignature:
+
+                pass
+
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.replaced_sid is not None:
+            self.store.delete(session.replaced_sid)
+        if not session:
+            #An emptied session is removed from the store along with its cookie
+            if session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                       httponly=self.get_cookie_httponly(app), samesite=self.get_cookie_samesite(app))
+            return
+
+        now = time.time()
+        expires_at = now + app.permanent_session_lifetime.total_seconds()
+        if session.modified:
+            self.store.save(session.sid, session, expires_at)
+        elif session.permanent and self.should_set_cookie(app, session):
+            if session.expires_at is not None and expires_at - session.expires_at >= self.touch_interval:
+                self.store.touch(session.sid, expires_at)
+        if not self.should_set_cookie(app, session):
+            return
+        response.set_cookie(name, self.signer(app).sign(session.sid).decode(), expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+        response.vary.add("Cookie")
+
+    #Starts the thread that deletes expired sessions, once
+    def start(self):
+        if self.sweeper is not None:
+            return
+        with self.lock:
+            if self.sweeper is None:
+                self.sweeper = threading.Thread(target=self.run_sweeper, name="session-sweeper", daemon=True)
+                self.sweeper.start()
+
+    def run_sweeper(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.store.sweep()
+
+            except Exception as e:
+
+                print(f"Error sweeping expired sessions: {e}")
+
+    def stats(self):
+
+        return self.store.stats()
+
+
+# Purpose: Creates the session interface chosen by the app's config.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: app.py
+# System Context: SESSION_BACKEND picks "sqlite" or "memory". The SQLite store is shared by every worker process on the
+# machine, the memory store only works when the backend runs as a single process.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: The Flask app's config.
+# Outputs: A ServerSessionInterface.
+# Future Changes: N/A
+def make_session_interface(config):
+    backend = config["SESSION_BACKEND"]
+    if backend == "memory":
+        store = MemorySessionStore(config["SESSION_MAX_ENTRIES"])
+    elif backend == "sqlite":
+        store = SQLiteSessionStore(config["SESSION_SQLITE_PATH"], config["SESSION_MAX_ENTRIES"],
+                                   config["SESSION_CACHE_SIZE"], config["SESSION_CACHE_TTL"])
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+
+    return ServerSessionInterface(store, config["SESSION_SWEEP_INTERVAL"], config["SESSION_TOUCH_INTERVAL"])
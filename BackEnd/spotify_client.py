@@ -0,0 +1,485 @@
+"""
+Author: Ryan
+Date: 10.18.26
+Filename: spotify_client.py
+
+Purpose:
+This module is the HTTP layer that every Spotify request in main.py goes through. It runs one asyncio event loop in a
+background thread with a pooled async client, which the coroutines in main.py send their API requests through. Token
+requests go through a pooled session to the accounts host, so connections are reused instead of being set up again
+for every call.
+
+System Context:
+Part of the Backend system for the PlayBack project. main.py builds the requests and formats the responses,
+this module only sends them.
+
+Development History:
+- Written on: 10.18.26
+- Last revised on: 10.18.26
+
+Existence Rationale:
+A bare requests.get/post opens a new TCP + TLS connection each time and never times out. Sharing a session keeps
+connections alive between page loads and puts the timeout and retry rules in one place. A blocking request also ties up
+a thread for the whole round trip, while any number of requests can wait on the event loop at once. The app itself is
+still served by WSGI, so each request to the backend keeps its worker thread until it is answered. What the loop saves
+is a thread for each Spotify call a request makes, for example the three searches of a broad search.
+
+Data Structures/ Algorithms:
+- A requests Session with an HTTPAdapter for the accounts host, with its own connection pool size.
+- urllib3's Retry handles connection resets with a short backoff.
+- An httpx AsyncClient, bound to the background event loop, with its own connection limit.
+- Identical GETs that are in flight at the same time share one upstream request (single-flight).
+- A token bucket spaces out requests to the API host. A 429 response pauses the bucket for its Retry-After time and
+the request is tried again, up to a limit.
+Expected Input/Output:
+- Input: A URL, headers and optional query parameters or form data. Output: The httpx or requests Response object.
+Future Extensions or Revisions:
+Pool sizes, timeouts, and the rate limit are read from the environment so they can be tuned without code changes.
+"""
+
+from dotenv import load_dotenv
+import asyncio
+import os
+import queue
+import threading
+import time
+import httpx
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+load_dotenv() # Load environment variables from .env file
+# Base URLs for the two Spotify hosts, can be pointed at a local stub for testing
+api_url = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1")
+accounts_url = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com/api")
+
+# Connections kept open per host, the API host gets more since every page view uses it. The API host's are kept by the
+# async client.
+api_pool_size = int(os.getenv("SPOTIFY_API_POOL_SIZE", 20))
+accounts_pool_size = int(os.getenv("SPOTIFY_ACCOUNTS_POOL_SIZE", 2))
+# (connect, read) timeouts in seconds
+timeout = (float(os.getenv("SPOTIFY_CONNECT_TIMEOUT", 3.05)), float(os.getenv("SPOTIFY_READ_TIMEOUT", 10)))
+# How many times a request is retried after the connection is reset or dropped
+retries = int(os.getenv("SPOTIFY_RETRIES", 2))
+# Most connections the async client opens at once, requests past this wait for one to free up
+async_max_connections = int(os.getenv("SPOTIFY_ASYNC_MAX_CONNECTIONS", 100))
+# Requests per second sent to the API host, and how many may be sent at once after a quiet spell
+rate_limit = float(os.getenv("SPOTIFY_RATE_LIMIT", 20))
+rate_burst = int(os.getenv("SPOTIFY_RATE_BURST", 40))
+# How many times a 429 response is retried, and the longest wait, in seconds, that is accepted before giving up
+rate_limit_retries = int(os.getenv("SPOTIFY_RATE_LIMIT_RETRIES", 3))
+max_throttle_wait = float(os.getenv("SPOTIFY_MAX_THROTTLE_WAIT", 10))
+# Items a streamed response may have waiting for the client before the event loop stops producing more
+stream_buffer = int(os.getenv("SPOTIFY_STREAM_BUFFER", 4))
+
+
+# Purpose: Builds an adapter with its own connection pool and retry rules for a single host.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: make_session
+# System Context: The accounts host gets one of these mounted on the shared session.
+# Data Structures: An HTTPAdapter holding a urllib3 connection pool.
+# Algorithms Used: Retries only cover connection and read errors, HTTP error statuses are passed back to the caller as they are.
+# Inputs: The number of connections to keep open to the host.
+# Outputs: An HTTPAdapter.
+# Future Changes: N/A
+def make_adapter(pool_size):
+    retry = Retry(total=retries, connect=retries, read=retries, status=0, other=0,
+                  backoff_factor=0.1, allowed_methods=frozenset(["GET", "POST"]), raise_on_status=False)
+
+    return HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry, pool_block=False)
+
+
+# Purpose: Creates the session that token requests share.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: Module import
+# System Context: Mounts a separately sized pool for the accounts host. Requests to the API host are sent by the async
+# client instead, see spotify_get_async.
+# Data Structures: A requests Session.
+# Algorithms Used: N/A
+# Inputs: N/A
+# Outputs: A session with keep-alive enabled.
+# Future Changes: N/A
+def make_session():
+    new_session = Session()
+    new_session.headers.update({"Connection": "keep-alive"})
+    new_session.mount(accounts_url, make_adapter(accounts_pool_size))
+
+    return new_session
+
+
+session = make_session()
+
+
+# Purpose: Sends a POST request to Spotify through the shared session.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: request_token in main.py
+# System Context: Replaces the bare requests.post call used to get an access token.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: A full URL, the request headers and the form data.
+# Outputs: The requests Response object.
+# Future Changes: N/A
+def spotify_post(url, headers=None, data=None):
+
+    return session.post(url, headers=headers, data=data, timeout=timeout)
+
+
+# Purpose: Runs the event loop that every async Spotify request is sent from.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: run_sync and run_on_loop
+# System Context: The async client can only be used from the loop it was first used on, so every coroutine in main.py
+# is run on this one loop, whichever thread or loop it was started from.
+# Data Structures: An asyncio event loop, the thread running it, and the httpx AsyncClient.
+# Algorithms Used: The loop and client are created the first time they are needed.
+# Inputs: N/A
+# Outputs: N/A
+# Future Changes: N/A
+class LoopThread:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loop = None
+        self.client = None
+
+    def get_loop(self):
+        if self.loop is not None:
+            return self.loop
+        with self.lock:
+            if self.loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="spotify-loop", daemon=True).start()
+                self.client = httpx.AsyncClient(
+                    timeout=httpx.Timeout(timeout[1], connect=timeout[0], pool=timeout[1]),
+                    limits=httpx.Limits(max_connections=async_max_connections, max_keepalive_connections=api_pool_size),
+                    transport=httpx.AsyncHTTPTransport(retries=retries))
+                self.loop = loop
+        return self.loop
+
+
+loop_thread = LoopThread()
+
+
+# Purpose: Runs a coroutine on the Spotify event loop and waits for its result.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The synchronous wrappers in main.py.
+# System Context: Lets code that is not async use the coroutines in main.py. Must not be called from the loop itself.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: A coroutine.
+# Outputs: What the coroutine returns, or the exception it raised.
+# Future Changes: N/A
+def run_sync(coroutine):
+
+    return asyncio.run_coroutine_threadsafe(coroutine, loop_thread.get_loop()).result()
+
+
+# Purpose: Runs a coroutine on the Spotify event loop and awaits its result from another loop.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The async endpoints in app.py.
+# System Context: Flask runs each async view on a loop of its own, this hands the work over to the shared loop.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: A coroutine.
+# Outputs: What the coroutine returns, or the exception it raised.
+# Future Changes: N/A
+async def run_on_loop(coroutine):
+
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, loop_thread.get_loop()))
+
+
+# Purpose: Iterates over an async generator from code that is not async.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The streamed endpoints, through the generators in main.py.
+# System Context: Flask streams responses from ordinary generators, this lets one be fed from the Spotify event loop.
+# Data Structures: A queue the loop puts items on and the calling thread takes them from, and a semaphore on the loop
+# with one place per item the queue may hold.
+# Algorithms Used: The async generator is run to the end on the loop. It waits for a place before putting each item on
+# the queue and the calling thread gives the place back when it takes the item, so a slow client holds back the
+# generator instead of letting the queue grow. Waiting for a place does not block the loop. If the caller stops early,
+# for example because the client disconnected, the run on the loop is cancelled.
+# Inputs: An async generator.
+# Outputs: Yields each item it produces, and raises any exception it raised.
+# Future Changes: N/A
+def iterate_sync(generator):
+    items = queue.Queue()
+    places = asyncio.Semaphore(stream_buffer)
+    loop = loop_thread.get_loop()
+
+    async def pump():
+        try:
+            async for item in generator:
+                await places.acquire()
+                items.put(("item", item))
+
+        except Exception as e:
+
+            items.put(("error", e))
+
+        finally:
+            items.put(("done", None))
+
+    future = asyncio.run_coroutine_threadsafe(pump(), loop)
+    try:
+        while True:
+            kind, item = items.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise item
+            loop.call_soon_threadsafe(places.release)
+            yield item
+
+    finally:
+        future.cancel()
+
+
+# Purpose: Raised when Spotify has asked for a longer pause than the backend is willing to wait.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: TokenBucket.acquire
+# System Context: The lookups in main.py catch it like any other failed request, so cached entries are still served.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: N/A
+# Outputs: N/A
+# Future Changes: N/A
+class SpotifyThrottled(Exception):
+    pass
+
+
+# Purpose: Limits how fast requests are sent to the API host.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: send_get
+# System Context: Only used on the Spotify event loop, so it needs no lock.
+# Data Structures: The number of tokens left, when they were last topped up, and a time before which nothing is sent.
+# Algorithms Used: Token bucket. Tokens are added at the configured rate up to the burst size and each request takes
+# one. A request that finds the bucket empty, or paused after a 429, sleeps until it may go.
+# Inputs: The rate in requests per second and the burst size.
+# Outputs: The seconds a request had to wait. Raises SpotifyThrottled if the wait would be longer than max_throttle_wait.
+# Future Changes: N/A
+class TokenBucket:
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    async def acquire(self):
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            if self.paused_until > now:
+                wait = self.paused_until - now
+            else:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            if waited + wait > max_throttle_wait:
+                raise SpotifyThrottled(f"Spotify is rate limiting, retry in {wait:.1f}s")
+            await asyncio.sleep(wait)
+            waited += wait
+
+    #Stops every request from being sent for the given number of seconds
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+# Purpose: Counters for the async Spotify client.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: spotify_get_async, send_get, and the stats endpoint in app.py through client_stats.
+# System Context: Only changed on the Spotify event loop.
+# Data Structures: Integer and float counters.
+# Algorithms Used: N/A
+# Inputs: N/A
+# Outputs: A dictionary of the counters from stats().
+# Future Changes: N/A
+class ClientStats:
+
+    def __init__(self):
+        self.requests = 0
+        self.upstream = 0
+        self.coalesced = 0
+        self.throttled = 0
+        self.throttle_wait = 0.0
+        self.rate_limited = 0
+        self.gave_up = 0
+        self.reconnects = 0
+        self.renewed_tokens = 0
+
+    def stats(self):
+
+        return {"requests" : self.requests,
+                "upstream_requests" : self.upstream,
+                "coalesced" : self.coalesced,
+                "throttled_waits" : self.throttled,
+                "throttle_wait_ms" : round(self.throttle_wait * 1000, 3),
+                "rate_limited" : self.rate_limited,
+                "gave_up" : self.gave_up,
+                "reconnects" : self.reconnects,
+                "renewed_tokens" : self.renewed_tokens,
+                "in_flight" : len(in_flight)}
+
+
+bucket = TokenBucket(rate_limit, rate_burst)
+client_stats = ClientStats()
+# Upstream GETs that have been sent and not answered yet, keyed by what makes two requests identical
+in_flight = {}
+# Coroutine function main.py registers with on_unauthorized, it is given the rejected Authorization header and returns
+# a new token or None
+token_renewer = None
+
+
+# Purpose: Registers what send_get calls when Spotify rejects a token.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: main.py, at import.
+# System Context: The token is kept by main.py, which this module cannot import without a cycle.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: A coroutine function taking the rejected Authorization header and returning a new token or None.
+# Outputs: N/A
+# Future Changes: N/A
+def on_unauthorized(renewer):
+    global token_renewer
+    token_renewer = renewer
+
+
+# Purpose: Works out how long to wait after a 429 response.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: send_get
+# System Context: Spotify sends Retry-After in seconds.
+# Data Structures: N/A
+# Algorithms Used: Falls back to exponential backoff from half a second when the header is missing or unreadable.
+# Inputs: The response and how many times the request has been tried.
+# Outputs: The seconds to wait.
+# Future Changes: N/A
+def retry_delay(response, attempt):
+    try:
+
+        return max(float(response.headers.get("Retry-After")), 0.0)
+
+    except (TypeError, ValueError):
+
+        return 0.5 * 2 ** attempt
+
+
+# Purpose: Sends a GET through the async client, trying once more if the connection it reused had been closed.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: send_get
+# System Context: The transport's own retries only cover setting up a connection. A kept-alive connection that Spotify
+# has closed fails once the request is sent on it, as a RemoteProtocolError or ReadError, and a GET is safe to resend.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: A full URL, the request headers and optional query parameters.
+# Outputs: The httpx Response. The error is raised if the second try fails too.
+# Future Changes: N/A
+async def get_with_reconnect(url, headers, params):
+    try:
+
+        return await loop_thread.client.get(url, headers=headers, params=params)
+
+    except (httpx.RemoteProtocolError, httpx.ReadError):
+
+        client_stats.reconnects += 1
+        return await loop_thread.client.get(url, headers=headers, params=params)
+
+
+# Purpose: Sends one GET to Spotify, keeping to the rate limit and retrying 429 responses.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: spotify_get_async
+# System Context: A 429 pauses the shared bucket, so every other request waits out the Retry-After time too.
+# Data Structures: N/A
+# Algorithms Used: A 401 means the token was revoked before it expired, so it is renewed through token_renewer and the
+# request is sent once more with the new one.
+# Inputs: A full URL, the request headers and optional query parameters.
+# Outputs: The httpx Response. The last 429 is returned if every retry was rate limited, raises SpotifyThrottled if
+# Spotify asked for a wait longer than max_throttle_wait.
+# Future Changes: N/A
+async def send_get(url, headers, params):
+    renewed = False
+    for attempt in range(rate_limit_retries + 1):
+        try:
+            waited = await bucket.acquire()
+        except SpotifyThrottled:
+            client_stats.gave_up += 1
+            raise
+        if waited:
+            client_stats.throttled += 1
+            client_stats.throttle_wait += waited
+        client_stats.upstream += 1
+        response = await get_with_reconnect(url, headers, params)
+        if response.status_code == 401 and token_renewer is not None and not renewed:
+            renewed = True
+            token = await token_renewer((headers or {}).get("Authorization"))
+            if token:
+                client_stats.renewed_tokens += 1
+                headers = {**(headers or {}), "Authorization" : "Bearer " + token}
+                response = await get_with_reconnect(url, headers, params)
+        if response.status_code != 429:
+            return response
+        client_stats.rate_limited += 1
+        bucket.pause(retry_delay(response, attempt))
+    client_stats.gave_up += 1
+
+    return response
+
+
+# Purpose: Sends a GET request to Spotify through the shared async client.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: The async lookups in main.py, on the Spotify event loop.
+# System Context: Every request to the API host is sent through here, the thread is free while it is in flight. When many
+# users open the same page at once only one request for it goes to Spotify.
+# Data Structures: The in_flight dictionary of running requests.
+# Algorithms Used: Single-flight. A request with the same URL, parameters, and token as one already running waits for
+# that one's response instead of sending its own. The shared request is shielded so one caller giving up does not
+# cancel it for the rest.
+# Inputs: A full URL, the request headers and optional query parameters.
+# Outputs: The httpx Response object, which has the same content and raise_for_status as a requests Response.
+# Future Changes: N/A
+async def spotify_get_async(url, headers=None, params=None):
+    client_stats.requests += 1
+    key = (url, tuple(sorted((params or {}).items())), (headers or {}).get("Authorization"))
+    task = in_flight.get(key)
+    if task is not None:
+        client_stats.coalesced += 1
+    else:
+        task = asyncio.ensure_future(send_get(url, headers, params))
+        in_flight[key] = task
+        task.add_done_callback(lambda done: in_flight.pop(key) if in_flight.get(key) is done else None)
+
+    return await asyncio.shield(task)
+
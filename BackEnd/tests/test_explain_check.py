@@ -0,0 +1,45 @@
+"""
+ Author: Ryan
+ Date: 10.18.26
+ Filename: test_explain_check.py
+
+ Purpose: Runs the index check from explain_check.py as a test, so a query that reads a whole table fails the test
+          run instead of waiting for someone to run "flask explain-check" by hand.
+
+ Where it fits: Run with "python -m pytest BackEnd/tests" from the project folder.
+
+ Written: 10.18.26
+ Revised: 10.18.26
+
+ Why it exists: The check only catches a missing index if it is run, and a test run is the one thing every change gets.
+
+ How it uses data structures and algorithms: A new SQLite file is migrated to the latest version and the checker is
+                run against it, see runCheck in explain_check.py.
+
+ Expected input: N/A
+
+ Expected output: A failing test listing each query that scans a whole table or is not covered by the check.
+
+ Expected extensions/revisions: N/A
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import upgrade
+from explain_check import runCheck
+
+
+def test_every_query_uses_an_index(tmp_path):
+    engine = create_engine("sqlite:///" + str(tmp_path / "explain_check.sqlite3"))
+    try:
+        upgrade(engine)
+        problems = runCheck(engine)
+
+    finally:
+        engine.dispose()
+
+    assert problems == []
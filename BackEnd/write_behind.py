@@ -0,0 +1,210 @@
+"""
+Author: Ryan
+Date: 10.18.26
+Filename: write_behind.py
+
+Purpose:
+This module provides a write-behind queue. Rows are handed to it during a request and written to the database
+later, in batches, by a background thread, so the request does not wait on the write.
+
+System Context:
+Part of the Backend system for the PlayBack project. main.py uses it to store the songs found by searches in the
+Songs table without holding up the search response.
+
+Development History:
+- Written on: 10.18.26
+- Last revised on: 10.18.26
+
+Existence Rationale:
+The user never sees the Songs rows that a search writes, so there is no reason for the search to wait on MySQL.
+
+Data Structures/ Algorithms:
+- A bounded Queue holds rows waiting to be written. When it is full new rows are dropped and counted.
+- An OrderedDict of recently queued IDs is used as a bounded LRU set so the same song is not queued over and over.
+- The background thread writes a batch once it has batch_size rows or flush_interval seconds have passed.
+Expected Input/Output:
+- Input: Lists of row dictionaries. Output: Batches of rows passed to the write function, and counters from stats().
+Future Extensions or Revisions:
+N/A
+"""
+
+import atexit
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+
+# Purpose: Queues rows and writes them in batches from a background thread.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: main.py, which queues the songs found by each search.
+# System Context: Takes database writes that the user does not need to wait on off of the request thread.
+# Data Structures: A bounded Queue of rows, an OrderedDict of recently seen keys, and counters guarded by a lock.
+# Algorithms Used: Rows are deduplicated by key before they are queued. The worker collects rows until the batch is full
+# or the flush interval runs out, then hands the batch to the write function. close() writes whatever is left.
+# Inputs: The write function, the key each row is deduplicated by, the batch size, the flush interval in seconds,
+# the most rows that can wait in the queue, and how many keys are remembered for deduplication.
+# Outputs: A dictionary of counters from stats().
+# Future Changes: N/A
+class WriteBehindQueue:
+
+    def __init__(self, name, write, key, batch_size=100, flush_interval=1.0, max_queue=10000, seen_size=50000):
+        self.name = name
+        self.write = write
+        self.key = key
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue(maxsize=max_queue)
+        self.seen = OrderedDict()
+        self.seen_size = seen_size
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.worker = None
+        self.enqueued = 0
+        self.deduplicated = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.errors = 0
+        self.flush_time_total = 0.0
+        self.flush_time_last = 0.0
+        self.flush_time_max = 0.0
+
+    #Queues rows for writing, rows whose key was queued recently are skipped
+    def enqueue(self, rows):
+        self.start()
+        for row in rows:
+            row_key = row.get(self.key)
+            with self.lock:
+                if row_key in self.seen:
+                    self.seen.move_to_end(row_key)
+                    self.deduplicated += 1
+                    continue
+                self.seen[row_key] = True
+                while len(self.seen) > self.seen_size:
+                    self.seen.popitem(last=False)
+            try:
+                self.pending.put_nowait(row)
+                with self.lock:
+                    self.enqueued += 1
+
+            except queue.Full:
+
+                with self.lock:
+                    self.dropped += 1
+                    #Forget the key so the row can be queued again once there is room
+                    self.seen.pop(row_key, None)
+
+    def start(self):
+        if self.worker is not None:
+            return
+        with self.lock:
+            if self.worker is None and not self.stopping.is_set():
+                self.worker = threading.Thread(target=self.run, name=f"{self.name}-writer", daemon=True)
+                self.worker.start()
+
+    def run(self):
+        while not self.stopping.is_set():
+            batch = self.collect()
+            if batch:
+                self.flush(batch)
+
+    #Waits for the first row, then keeps taking rows until the batch is full or the flush interval runs out
+    def collect(self):
+        batch = []
+        try:
+            batch.append(self.pending.get(timeout=self.flush_interval))
+
+        except queue.Empty:
+
+            return batch
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+
+            except queue.Empty:
+
+                break
+
+        return batch
+
+    def flush(self, batch):
+        started = time.perf_counter()
+        try:
+            self.write(batch)
+
+        except Exception as e:
+
+            print(f"Error writing {self.name} batch of {len(batch)}: {e}")
+
+            with self.lock:
+                self.errors += 1
+                for row in batch:
+                    self.seen.pop(row.get(self.key), None)
+            return
+
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.flushes += 1
+            self.flushed_rows += len(batch)
+            self.flush_time_total += elapsed
+            self.flush_time_last = elapsed
+            self.flush_time_max = max(self.flush_time_max, elapsed)
+
+    #Stops the worker and writes every row that is still queued
+    def close(self):
+        self.stopping.set()
+        if self.worker is not None:
+            self.worker.join(timeout=self.flush_interval * 2)
+        batch = []
+        while True:
+            try:
+                batch.append(self.pending.get_nowait())
+
+            except queue.Empty:
+
+                break
+
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+
+    def stats(self):
+        with self.lock:
+            return {"queue_depth" : self.pending.qsize(),
+                    "enqueued" : self.enqueued,
+                    "deduplicated" : self.deduplicated,
+                    "dropped" : self.dropped,
+                    "flushes" : self.flushes,
+                    "flushed_rows" : self.flushed_rows,
+                    "errors" : self.errors,
+                    "flush_ms_last" : round(self.flush_time_last * 1000, 3),
+                    "flush_ms_avg" : round(self.flush_time_total * 1000 / self.flushes, 3) if self.flushes else 0.0,
+                    "flush_ms_max" : round(self.flush_time_max * 1000, 3)}
+
+
+# Purpose: Creates a write-behind queue that is flushed when the process exits.
+# Author: Ryan
+# Date Written: 10.18.26
+# Last Revised: 10.18.26
+# Called By: main.py
+# System Context: Makes sure rows still waiting in the queue are written on a normal shutdown.
+# Data Structures: N/A
+# Algorithms Used: N/A
+# Inputs: The same arguments as WriteBehindQueue.
+# Outputs: The new WriteBehindQueue.
+# Future Changes: N/A
+def make_write_behind(*args, **kwargs):
+    writer = WriteBehindQueue(*args, **kwargs)
+    atexit.register(writer.close)
+
+    return writer
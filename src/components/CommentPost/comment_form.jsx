@@ -22,6 +22,10 @@ export default function CreatePost() {
     const [replyingTo, setReplyingTo] = useState('');
     const [content, setContent] = useState('');
     const [sessionUser, setSessionUser] = useState('');
+    const [nextCursor, setNextCursor] = useState(null);
+    // Replies that have been opened, keyed by the ID of the comment they reply to
+    const [replies, setReplies] = useState({});
+    const [replyCursors, setReplyCursors] = useState({});
     const inputRef = useRef(null);
 
     const full_url = window.location.href;
@@ -47,49 +51,84 @@ export default function CreatePost() {
 
 	/*
 	 * Purpose: Fetches the comments associated with the current post from the backend using the `last_segment` value.
-	 *          Updates the component's state with the fetched data.
+	 *          Updates the component's state with the fetched data. Comments come back one page at a time.
 	 * Author: Ryan
 	 * Date: 2025-05-03
-	 * Revised: 2025-05-03
-	 * Called by: Called within the `useEffect` hook on component mount to fetch data.
+	 * Revised: 2026-10-18
+	 * Called by: Called within the `useEffect` hook on component mount to fetch data, and by the "Load More" button.
 	 * Where it fits in the system: Part of the post fetching logic for the component.
 	 * How it uses data structures and algorithms: Makes a POST request to the backend and updates the state with the response.
-	 * Expected input: `last_segment` (the last part of the URL that identifies the post).
-	 * Expected output: Updates the `data` state with the fetched posts.
+	 *          Without a cursor the first page replaces `data`, with one the next page is appended to it.
+	 * Expected input: `last_segment` (the last part of the URL that identifies the post), and optionally the `cursor` of the next page.
+	 * Expected output: Updates the `data` state with the fetched posts and `nextCursor` with the cursor of the page after them.
 	 * Expected extensions or revisions: Error handling improvements and response validation.
 	 */
-    const fetchComments = () => {
+    const fetchComments = (cursor = null) => {
         fetch("http://127.0.0.1:5000/getposts", {
             method: "POST",
             credentials: "include",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ last_segment }),
+            body: JSON.stringify({ last_segment, cursor }),
         })
             .then(res => res.json())
             .then(responseData => {
                 if (responseData.posted == true) {
-                    setData(responseData.data)
+                    setData(previous => cursor ? [...previous, ...responseData.data] : responseData.data)
+                    setNextCursor(responseData.next_cursor)
                 }else {
                     setData([])
+                    setNextCursor(null)
                 }
             }).catch(error => {
                 console.log(`Error fetching comments: ${error}`);
                 setData([])
+                setNextCursor(null)
+            })
+    };
+
+	/*
+	 * Purpose: Fetches one page of the replies to a comment from the backend.
+	 * Author: Ryan
+	 * Date: 2026-10-18
+	 * Revised: 2026-10-18
+	 * Called by: The "Show Replies" and "More Replies" buttons, and after a reply is created or deleted.
+	 * Where it fits in the system: Replies are only loaded when the user opens them, so long threads do not slow down the first page.
+	 * How it uses data structures and algorithms: Makes a POST request to the backend. Without a cursor the replies to the comment
+	 *          are replaced, with one the next page is appended. Replies are kept in an object keyed by the parent comment ID.
+	 * Expected input: `parent` (the ID of the comment) and optionally the `cursor` of the next page.
+	 * Expected output: Updates the `replies` and `replyCursors` state for the comment.
+	 * Expected extensions or revisions: N/A
+	 */
+    const fetchReplies = (parent, cursor = null) => {
+        fetch("http://127.0.0.1:5000/getreplies", {
+            method: "POST",
+            credentials: "include",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ last_segment, comment_id: parent, cursor }),
+        })
+            .then(res => res.json())
+            .then(responseData => {
+                if (responseData.posted == true) {
+                    setReplies(previous => ({...previous, [parent]: cursor ? [...(previous[parent] || []), ...responseData.data] : responseData.data}))
+                    setReplyCursors(previous => ({...previous, [parent]: responseData.next_cursor}))
+                }
+            }).catch(error => {
+                console.log(`Error fetching replies: ${error}`);
             })
     };
 
 // Purpose: To handle the deletion of comments by sending a request to the backend API.
 // Author: Ryan
 // Date Written: 5.4.25
-// Last Revised: 5.4.25
+// Last Revised: 10.18.26
 // Called By: The delete button in the comment UI.
 // System Context: Allows a user to get rid of comments information, but the comment itself will not be deleted to maintain struture
 // Data Structures: N/A
 // Algorithms Used: N/A
-// Inputs: the id of the comment to be deleted.
+// Inputs: the id of the comment to be deleted, and the id of the comment it replies to (null for a top-level comment).
 // Outputs: A response from the backend indicating success or failure of the deletion.
 // Future Changes: As of 5.4.25 no changes are needed.
-    const deleteComment = (id) => {
+    const deleteComment = (id, parent) => {
         fetch("http://127.0.0.1:5000/deletepost", {
             method: "POST",
             credentials: "include",
@@ -97,7 +136,7 @@ export default function CreatePost() {
             body: JSON.stringify({ id }),
         }).then(res => res.json()).then(responseData => {
             console.log(responseData);
-            fetchComments();
+            parent === null ? fetchComments() : fetchReplies(parent);
         }).catch(error => {
             console.log(`Error deleting comment: ${error}`);
         })
@@ -188,7 +227,7 @@ export default function CreatePost() {
 	 * Where it fits in the system: Submits the data to the backend API to create a new post or reply.
 	 * How it uses data structures and algorithms: Sends an API request to the backend with the user's comment data and updates the UI on success.
 	 * Expected input: The comment content and the ID of the comment being replied to (if any).
-	 * Expected output: Creates a new comment or reply and updates the UI with the new comment data.
+	 * Expected output: Creates a new comment or reply and reloads the top-level comments or the replies it was added to.
 	 * Expected extensions or revisions: Could be extended to include error handling or form validation.
 	 */
     const submitCommentForm = async () => {
@@ -202,33 +241,33 @@ export default function CreatePost() {
                 last_segment
             }),
         });
+        const parent = replyingTo;
         setReplyingTo(null);
         setContent('');
-        fetchComments();
+        parent ? fetchReplies(parent) : fetchComments();
     };
 
 	/*
 	 * Purpose: Recursively renders comments and replies to display the entire comment thread.
 	 * Author: Ryan, Gaetano, Max
 	 * Date: 2025-05-03
-	 * Revised: 2025-05-03
+	 * Revised: 2026-10-18
 	 * Called by: Called to render the comment threads for each post.
 	 * Where it fits in the system: Part of the UI rendering logic for displaying posts and comments.
-	 * How it uses data structures and algorithms: Uses recursion to render comments and replies in a nested structure.
-	 * Expected input: `comments` (array of comment objects), `parent` (the ID of the parent comment for nested replies), `level` (the nesting level).
-	 * Expected output: Renders each comment and its replies in a nested structure, adjusting the UI layout accordingly.
-	 * Expected extensions or revisions: Could be optimized to improve performance with larger comment threads.
+	 * How it uses data structures and algorithms: Uses recursion to render comments and replies in a nested structure. The replies
+	 *          to a comment are looked up by its ID in `replies` instead of filtering every comment on each render.
+	 * Expected input: `comments` (array of comment objects at one level of the thread), `level` (the nesting level).
+	 * Expected output: Renders each comment and its opened replies in a nested structure, adjusting the UI layout accordingly.
+	 * Expected extensions or revisions: N/A
 	 */
-    const renderComments = (comments, parent = null, level = 0) => {
+    const renderComments = (comments, level = 0) => {
         if (data == []) {
             return (<div>You Must Comment to See Other Comments</div>)
         }
         else {
         let spacing = 40;
         return comments
-        //Filter comments to only include those that match the parent comment ID
-            .filter(comment => comment.parent_comment === parent)
-            //Use map to iterate over the filtered comments and render each one
+            //Use map to iterate over the comments and render each one
             .map(comment => (
                 <div className="CommentDiv" key={comment.id} style={{paddingLeft: `${spacing * level}px`, display: 'block', width: '100%', marginBottom: '10px' }}>
                     <span className="HeaderField" style={{ fontStyle: 'italic' }}><i>{comment.username}</i> | {comment.date}</span><br />
@@ -279,13 +318,20 @@ export default function CreatePost() {
 
             
                     {sessionUser === comment.username && comment.content !== "[DELETED]" &&(
-                        <button className="DeleteButton" onClick={() => deleteComment(comment.id)} style={{
+                        <button className="DeleteButton" onClick={() => deleteComment(comment.id, comment.parent_comment)} style={{
                             backgroundColor: 'orange'
                         }}>Delete</button>
                     )}
                    
-                    // Render replies recursively
-                    {renderComments(comments, comment.id, 1)}
+                    {comment.reply_count > 0 && !replies[comment.id] && (
+                        <button className="ShowReplies" onClick={() => fetchReplies(comment.id)} style={{ textDecoration: 'underline', cursor: 'pointer' }}>Show Replies ({comment.reply_count})</button>
+                    )}
+
+                    {/* Render replies recursively */}
+                    {renderComments(replies[comment.id] || [], 1)}
+                    {replyCursors[comment.id] && (
+                        <button className="MoreReplies" onClick={() => fetchReplies(comment.id, replyCursors[comment.id])} style={{ textDecoration: 'underline', cursor: 'pointer' }}>More Replies</button>
+                    )}
                 </div>
             ));
         }
@@ -349,6 +395,16 @@ export default function CreatePost() {
             <div className="ContentArea" style={{ display: 'block' }}>
                 {renderComments(data)}
             </div>
+            {nextCursor && (
+                <button className="LoadMore" onClick={() => fetchComments(nextCursor)} style={{
+                    padding: '5px 10px',
+                    backgroundColor: 'orange',
+                    color: '#fff',
+                    border: 'none',
+                    borderRadius: '5px',
+                    cursor: 'pointer'
+                }}>Load More</button>
+            )}
         </div>
     );
 }
@@ -92,11 +92,8 @@ export default function TagSection() {
                 body: JSON.stringify({ tag: current, songID: last_segment,}),
             });
             
-            const response = await fetch("http://127.0.0.1:5000/gettags", {
-                method: "POST",
+            const response = await fetch(`http://127.0.0.1:5000/gettags?songID=${encodeURIComponent(last_segment)}`, {
                 credentials: "include",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ songID: last_segment, userID: 50 }),
             });
 
             const responseData = await response.json();
@@ -118,11 +115,9 @@ export default function TagSection() {
      * Extensions: Retry on failure, loading states, skeletons.
      */
     useEffect(() => {
-        fetch("http://127.0.0.1:5000/gettags", {
-            method: "POST",
+        // A GET so the browser can revalidate the tags with their ETag instead of downloading them again
+        fetch(`http://127.0.0.1:5000/gettags?songID=${encodeURIComponent(last_segment)}`, {
             credentials: "include",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({songID: last_segment}),
         })
         .then(response => response.json())
         .then(responseData => {